@@ -0,0 +1,256 @@
+"""
+Contraste automático de las guías según el fondo
+
+En lugar de un único color para las guías, cada tramo se tiñe de blanco o de
+negro según lo que tenga debajo. El fondo se muestrea solo junto a la
+geometría de las guías, con muestras dispersas a ambos lados de cada
+segmento, así que el coste depende de la longitud de las guías y no del
+tamaño de la pantalla.
+
+La pantalla se divide en celdas de RUN_TILE px; cada celda con guías es un
+tramo, y su color es el que más contraste da con la luminancia media de sus
+muestras (con histéresis para que no parpadee). Las celdas solo cambian la
+vista con que se compone la máscara de las guías (GuideLayer.set_runs), así
+que nada se vuelve a rasterizar.
+
+Las muestras se copian de la pantalla por grupos: una copia por segmento
+horizontal o vertical largo (una franja estrecha) y una por celda para los
+oblicuos y las curvas. Cada actualización copia grupos por turnos hasta
+gastar CONTRAST_BUDGET_MS y sigue en la siguiente.
+"""
+import time
+
+from PyQt5.QtCore import QRect
+from PyQt5.QtGui import QColor, QImage, QRegion
+
+from capture import excluded_from_capture
+from guide_geometry import AA_MARGIN, GUIDE_TINT
+
+
+# Intervalo entre actualizaciones (ms) y tiempo máximo de cada una
+CONTRAST_INTERVAL_MS = 500
+CONTRAST_BUDGET_MS = 4
+
+# Lado (px) de las celdas que se tiñen por separado
+RUN_TILE = 64
+
+# Distancia (px) entre muestras a lo largo de cada segmento
+SAMPLE_SPACING = 8
+
+# Luminancia relativa con la que blanco y negro dan el mismo contraste
+# (razón de contraste WCAG) y margen para cambiar de uno a otro
+CONTRAST_THRESHOLD = 0.179
+CONTRAST_HYSTERESIS = 0.03
+
+LIGHT_COLOR = QColor(255, 255, 255)
+DARK_COLOR = QColor(0, 0, 0)
+
+
+def segment_list(strokes, line_width):
+    """Segmentos (x1, y1, x2, y2, distancia de las muestras) de los trazos"""
+    segments = []
+    for stroke in strokes:
+        offset = max(stroke.pen_width(line_width), 1) / 2 + AA_MARGIN + 1
+        for line in stroke.lines:
+            segments.append((line.x1(), line.y1(), line.x2(), line.y2(), offset))
+        for rect in stroke.rects:
+            left, top = rect.x(), rect.y()
+            right, bottom = left + rect.width(), top + rect.height()
+            segments += [(left, top, right, top, offset), (right, top, right, bottom, offset),
+                         (right, bottom, left, bottom, offset), (left, bottom, left, top, offset)]
+        if stroke.path is not None:
+            for polygon in stroke.path.toSubpathPolygons():
+                for i in range(polygon.count() - 1):
+                    p1, p2 = polygon.at(i), polygon.at(i + 1)
+                    segments.append((p1.x(), p1.y(), p2.x(), p2.y(), offset))
+    return segments
+
+
+def srgb_to_linear():
+    """Tabla de niveles sRGB de 8 bits a intensidad lineal"""
+    import numpy as np
+    c = np.arange(256) / 255
+    return np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+
+
+class AutoContrast:
+    """Color por celda de las guías de un OverlayWindow"""
+
+    def __init__(self, overlay):
+        self.overlay = overlay
+        self.layout_key = None
+        self.error = None
+        self.linear = None
+
+        # Muestras (arrays de numpy, se crean en build_layout)
+        self.xs = None
+        self.ys = None
+        self.sample_runs = None  # Tramo (índice en cells) de cada muestra
+        self.luminance = None    # Última luminancia de cada muestra (NaN = sin medir)
+        self.cells = []          # Celda (columna, fila) de cada tramo
+        self.chunks = []         # (QRect que se copia, índices de sus muestras)
+        self.next_chunk = 0
+
+        self.light = {}  # Celda -> True (guía clara) o False (oscura)
+        self._runs = None
+        self._runs_key = None
+        self.version = 0
+        self.tick_ms = 0.0
+
+    def build_layout(self, width, height):
+        """Reparte las muestras a lo largo de las guías si cambiaron"""
+        import numpy as np
+
+        key = (width, height, self.overlay.layer_key())
+        if key == self.layout_key:
+            return
+        self.layout_key = key
+        self.chunks = []
+        self.next_chunk = 0
+
+        state = self.overlay.state
+        strokes = [stroke for name, enabled in state.guides.items() if enabled
+                   for stroke in self.overlay.renderer.guide_strokes(name, width, height)
+                   if stroke.tint() == GUIDE_TINT]
+        # Las líneas de encuadre van en el color de las guías
+        strokes += self.overlay.renderer.frame_line_strokes(width, height)
+        segments = np.array(segment_list(strokes, state.line_width), float).reshape(-1, 5)
+        x1, y1, x2, y2, offset = segments.T
+        dx, dy = x2 - x1, y2 - y1
+        length = np.hypot(dx, dy)
+        keep = length > 0
+        x1, y1, dx, dy, offset, length = (a[keep] for a in (x1, y1, dx, dy, offset, length))
+
+        # Muestras a SAMPLE_SPACING px a lo largo de cada segmento...
+        counts = np.maximum(1, (length // SAMPLE_SPACING).astype(np.intp))
+        segment = np.repeat(np.arange(len(length)), counts)
+        step = np.arange(len(segment)) - np.repeat(np.cumsum(counts) - counts, counts)
+        t = (step + 0.5) / counts[segment]
+        base_x = x1[segment] + dx[segment] * t
+        base_y = y1[segment] + dy[segment] * t
+        # ...desplazadas a cada lado, fuera del trazo
+        normal_x = -dy[segment] / length[segment] * offset[segment]
+        normal_y = dx[segment] / length[segment] * offset[segment]
+        xs = np.concatenate([base_x + normal_x, base_x - normal_x])
+        ys = np.concatenate([base_y + normal_y, base_y - normal_y])
+        segment = np.concatenate([segment, segment])
+        cell_x = (np.concatenate([base_x, base_x]) // RUN_TILE).astype(np.intp)
+        cell_y = (np.concatenate([base_y, base_y]) // RUN_TILE).astype(np.intp)
+
+        # Fuera de la pantalla o sobre otra guía (cruces, marcas) no valen
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        layer = self.overlay.ensure_layer()
+        inside[inside] = ~layer.covered(xs[inside], ys[inside])
+        xs, ys, segment = xs[inside], ys[inside], segment[inside]
+        cell_x, cell_y = cell_x[inside], cell_y[inside]
+
+        columns = width // RUN_TILE + 1
+        cells, self.sample_runs = np.unique(cell_y * columns + cell_x, return_inverse=True)
+        self.cells = [(int(c % columns), int(c // columns)) for c in cells]
+        self.xs, self.ys = xs, ys
+        self.luminance = np.full(len(xs), np.nan)
+
+        # Grupos de copia: los segmentos rectos largos enteros, el resto por celda
+        straight = ((dx == 0) | (dy == 0)) & (length > RUN_TILE)
+        groups = np.where(straight[segment], segment, len(length) + self.sample_runs)
+        groups = np.unique(groups, return_inverse=True)[1]
+        order = np.argsort(groups, kind='stable')
+        bounds = np.cumsum(np.bincount(groups))[:-1]
+        for indices in np.split(order, bounds):
+            if not len(indices):
+                continue
+            left, top = int(xs[indices].min()), int(ys[indices].min())
+            right, bottom = int(xs[indices].max()), int(ys[indices].max())
+            self.chunks.append((QRect(left, top, right - left + 1, bottom - top + 1), indices))
+
+    def update(self, width, height):
+        """Mide otro turno de grupos; devuelve la región cuyo color cambió
+
+        Si el sistema no deja copiar la pantalla, deja el motivo en error.
+        """
+        import numpy as np
+
+        start = time.perf_counter()
+        self.build_layout(width, height)
+        if not self.chunks:
+            return QRegion()
+        if self.linear is None:
+            self.linear = srgb_to_linear()
+        # Solo durante las copias: el resto del tiempo el overlay se ve en las grabaciones
+        with excluded_from_capture(self.overlay):
+            screen = self.overlay.screen()
+            for _ in range(len(self.chunks)):
+                rect, indices = self.chunks[self.next_chunk]
+                self.next_chunk = (self.next_chunk + 1) % len(self.chunks)
+                pixmap = screen.grabWindow(0, rect.x(), rect.y(), rect.width(), rect.height())
+                if pixmap.isNull():
+                    self.error = "No se pudo copiar la pantalla"
+                    return QRegion()
+                image = pixmap.toImage().convertToFormat(QImage.Format_RGB32)
+                bits = image.constBits()
+                bits.setsize(image.byteCount())
+                pixels = np.frombuffer(bits, np.uint8).reshape(image.height(), image.bytesPerLine())
+                scale = image.width() / rect.width()
+                cols = np.minimum(((self.xs[indices] - rect.x()) * scale).astype(np.intp),
+                                  image.width() - 1) * 4
+                rows = np.minimum(((self.ys[indices] - rect.y()) * scale).astype(np.intp),
+                                  image.height() - 1)
+                # RGB32 en memoria: B, G, R, A
+                linear = self.linear
+                self.luminance[indices] = (0.0722 * linear[pixels[rows, cols]]
+                                           + 0.7152 * linear[pixels[rows, cols + 1]]
+                                           + 0.2126 * linear[pixels[rows, cols + 2]])
+                if (time.perf_counter() - start) * 1000 >= CONTRAST_BUDGET_MS:
+                    break
+
+        damaged = self.decide()
+        elapsed = (time.perf_counter() - start) * 1000
+        self.tick_ms = elapsed if not self.tick_ms else 0.8 * self.tick_ms + 0.2 * elapsed
+        return damaged
+
+    def decide(self):
+        """Elige el color de cada tramo medido; devuelve las celdas que cambian"""
+        import numpy as np
+
+        measured = ~np.isnan(self.luminance)
+        runs = len(self.cells)
+        counts = np.bincount(self.sample_runs[measured], minlength=runs)
+        sums = np.bincount(self.sample_runs[measured], self.luminance[measured], minlength=runs)
+        mean = sums / np.maximum(counts, 1)
+        previous = np.array([self.light.get(cell, -1) for cell in self.cells], float)
+        # Para cambiar de color la luminancia tiene que pasar el umbral con margen
+        limit = CONTRAST_THRESHOLD + CONTRAST_HYSTERESIS * np.where(
+            previous == 1, 1, np.where(previous == 0, -1, 0))
+        light = mean < limit
+
+        damaged = QRegion()
+        for run in np.flatnonzero((counts > 0) & (light != previous)):
+            column, row = cell = self.cells[run]
+            self.light[cell] = bool(light[run])
+            # Con las vecinas que toman su color (ver runs)
+            damaged = damaged.united(QRect((column - 1) * RUN_TILE, (row - 1) * RUN_TILE,
+                                           3 * RUN_TILE, 3 * RUN_TILE))
+        if not damaged.isEmpty():
+            self.version += 1
+        return damaged
+
+    def runs(self, guide_color):
+        """Zonas de color para GuideLayer.set_runs, con el alfa de las guías"""
+        key = (self.version, guide_color.alpha())
+        if key != self._runs_key:
+            # Un trazo junto al borde de una celda invade la vecina, que puede
+            # no tener muestras propias: las vecinas sin medir toman su color
+            cells = dict(self.light)
+            for (column, row), light in self.light.items():
+                for neighbour in ((column + dc, row + dr) for dc in (-1, 0, 1) for dr in (-1, 0, 1)):
+                    cells.setdefault(neighbour, light)
+            regions = {True: QRegion(), False: QRegion()}
+            for (column, row), light in cells.items():
+                regions[light] = regions[light].united(
+                    QRect(column * RUN_TILE, row * RUN_TILE, RUN_TILE, RUN_TILE))
+            light_color, dark_color = QColor(LIGHT_COLOR), QColor(DARK_COLOR)
+            light_color.setAlpha(guide_color.alpha())
+            dark_color.setAlpha(guide_color.alpha())
+            self._runs = [(light_color, regions[True]), (dark_color, regions[False])]
+            self._runs_key = key
+        return self._runs
@@ -0,0 +1,205 @@
+"""
+Renderizado por lotes de plantillas de guías (sin ventana)
+
+Lee un manifiesto JSON con tamaños, conjuntos de guías y estilos, y escribe
+un PNG/SVG/PDF por combinación usando un pool de procesos. Cada proceso
+trabaja con la plataforma Qt 'offscreen', así que funciona en máquinas sin
+pantalla.
+
+Formato del manifiesto:
+
+    {
+      "output_dir": "plantillas",
+      "sizes": ["1920x1080", [3840, 2160]],
+      "formats": ["png", "svg"],
+      "guide_sets": {"tercios": ["rule_of_thirds"],
+                     "aureo": ["golden_ratio", "golden_spiral"]},
+      "styles": {"blanco": {"color": {"r": 255, "g": 255, "b": 255, "a": 180},
+                            "line_width": 2}},
+      "background": "#000000"
+    }
+
+También admite una lista explícita "jobs" con entradas
+{"size", "guides", "style", "format", "output"}.
+"""
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Formatos de salida soportados
+FORMATS = ('png', 'svg', 'pdf')
+
+# Aplicación Qt y renderizadores del proceso actual (uno por configuración)
+_app = None
+_renderers = {}
+
+
+def parse_size(size):
+    """Acepta "1920x1080" o [1920, 1080]; ValueError si el ancho o el alto no son >= 1"""
+    try:
+        width, height = size.lower().split('x') if isinstance(size, str) else size
+        width, height = int(width), int(height)
+    except (TypeError, ValueError):
+        raise ValueError(f"Tamaño no válido: {size!r} (se espera \"WxH\" o [ancho, alto])")
+    if width < 1 or height < 1:
+        raise ValueError(f"Tamaño no válido: {size!r} (ancho y alto deben ser >= 1)")
+    return width, height
+
+
+def build_jobs(manifest, base_dir='.'):
+    """Expande el manifiesto en una lista de trabajos independientes"""
+    output_dir = os.path.join(base_dir, manifest.get('output_dir', 'render_output'))
+    background = manifest.get('background')
+
+    if 'jobs' in manifest:
+        jobs = []
+        for job in manifest['jobs']:
+            width, height = parse_size(job['size'])
+            fmt = job.get('format', 'png').lower()
+            output = job.get('output') or f"guides_{width}x{height}.{fmt}"
+            jobs.append({
+                'width': width,
+                'height': height,
+                'format': fmt,
+                'config': dict(job.get('style', {}), guides=job['guides']),
+                'background': job.get('background', background),
+                'output': os.path.join(output_dir, output),
+            })
+        return jobs
+
+    sizes = [parse_size(size) for size in manifest['sizes']]
+    formats = [fmt.lower() for fmt in manifest.get('formats', ['png'])]
+    guide_sets = manifest.get('guide_sets', {'tercios': ['rule_of_thirds']})
+    styles = manifest.get('styles', {'default': {}})
+
+    jobs = []
+    for set_name, guides in guide_sets.items():
+        for style_name, style in styles.items():
+            for width, height in sizes:
+                for fmt in formats:
+                    jobs.append({
+                        'width': width,
+                        'height': height,
+                        'format': fmt,
+                        'config': dict(style, guides=guides),
+                        'background': background,
+                        'output': os.path.join(
+                            output_dir,
+                            f"{set_name}_{style_name}_{width}x{height}.{fmt}"
+                        ),
+                    })
+    return jobs
+
+
+def ensure_app():
+    """Crea la QGuiApplication del proceso (offscreen salvo que se indique otra)"""
+    global _app
+    if _app is None:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PyQt5.QtGui import QGuiApplication
+        _app = QGuiApplication.instance() or QGuiApplication([sys.argv[0]])
+    return _app
+
+
+def render_job(job):
+    """Renderiza un trabajo y devuelve (ruta, segundos)"""
+    ensure_app()
+    from PyQt5.QtGui import QColor
+    from guide_renderer import GuideRenderer
+    from overlay_state import OverlayState
+
+    start = time.perf_counter()
+
+    # Reutilizar el renderizador (y su geometría cacheada) entre trabajos
+    key = json.dumps(job['config'], sort_keys=True)
+    renderer = _renderers.get(key)
+    if renderer is None:
+        renderer = GuideRenderer(OverlayState.from_dict(job['config']))
+        _renderers[key] = renderer
+
+    background = QColor(job['background']) if job.get('background') else None
+    width, height = job['width'], job['height']
+    os.makedirs(os.path.dirname(job['output']) or '.', exist_ok=True)
+
+    if job['format'] == 'png':
+        image = renderer.render_image(width, height, background=background)
+        if not image.save(job['output'], 'PNG'):
+            raise IOError(f"No se pudo escribir {job['output']}")
+    elif job['format'] == 'svg':
+        renderer.render_svg(job['output'], width, height, background)
+    elif job['format'] == 'pdf':
+        renderer.render_pdf(job['output'], width, height, background)
+    else:
+        raise ValueError(f"Formato no soportado: {job['format']}")
+
+    return job['output'], time.perf_counter() - start
+
+
+def run_batch(manifest_path, workers=None, log=print):
+    """Ejecuta todos los trabajos de un manifiesto; devuelve el número de errores
+
+    Lanza OSError o ValueError si el manifiesto no se puede leer o no es
+    válido (KeyError o TypeError si le faltan campos o tienen otro tipo).
+    Todo se comprueba antes de renderizar nada: un tamaño o una guía mal
+    escritos no dan plantillas vacías o sin esa guía.
+    """
+    from overlay_state import GUIDE_NAMES
+
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, dict):
+        raise ValueError("El manifiesto debe ser un objeto JSON")
+
+    jobs = build_jobs(manifest, os.path.dirname(os.path.abspath(manifest_path)))
+    for job in jobs:
+        if job['format'] not in FORMATS:
+            raise ValueError(f"Formato no soportado: {job['format']}")
+        guides = job['config']['guides']
+        if not isinstance(guides, (list, dict)):
+            raise ValueError(f"Las guías de {os.path.basename(job['output'])} "
+                             f"deben ser una lista")
+        unknown = [name for name in guides if name not in GUIDE_NAMES]
+        if unknown:
+            raise ValueError(f"Guía desconocida en {os.path.basename(job['output'])}: "
+                             f"{', '.join(map(str, unknown))}")
+
+    workers = workers or manifest.get('workers') or os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs)))
+    start = time.perf_counter()
+    errors = 0
+
+    if workers == 1:
+        results = map(_safe_render_job, jobs)
+        errors = _report(results, log)
+    else:
+        # Trabajos por bloque para repartir el arranque de Qt de cada proceso
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            errors = _report(executor.map(_safe_render_job, jobs, chunksize=chunksize), log)
+
+    log(f"{len(jobs) - errors}/{len(jobs)} plantillas en "
+        f"{time.perf_counter() - start:.2f}s con {workers} proceso(s)")
+    return errors
+
+
+def _safe_render_job(job):
+    """Como render_job pero devolviendo el error en lugar de lanzarlo"""
+    try:
+        path, seconds = render_job(job)
+        return path, seconds, None
+    except Exception as e:
+        return job['output'], 0.0, str(e)
+
+
+def _report(results, log):
+    errors = 0
+    for path, seconds, error in results:
+        if error:
+            errors += 1
+            log(f"Error en {path}: {error}")
+        else:
+            log(f"{path} ({seconds * 1000:.1f} ms)")
+    return errors
@@ -0,0 +1,165 @@
+"""
+Benchmark del quemado de guías en vídeo (--burn-in)
+
+Pasa frames sintéticos (y4m 4:2:0 y RGB crudo) por burn_in() y mide los
+frames por segundo con distinto número de procesos. La entrada se genera en
+memoria y la salida se descarta, así que se mide la composición y el paso
+de frames entre procesos, no el disco ni el códec.
+
+Uso:
+    python benchmarks/bench_burn_in.py --resolutions 4k --frames 240
+    python benchmarks/bench_burn_in.py --workers 1,2,4 --output resultados.json
+
+Termina con código 1 si algún caso no llega al tiempo real (--fps).
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from burn_in import burn_in
+
+
+RESOLUTIONS = {
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+}
+FORMATS = ('y4m', 'rgb24')
+
+# Guías de la prueba: las que más muestras cubren
+CONFIG = {
+    'guides': ['rule_of_thirds', 'golden_spiral', 'diagonals', 'safe_areas'],
+    'line_width': 2,
+}
+
+
+class SyntheticSource(io.RawIOBase):
+    """Stream de solo lectura: cabecera y frames repetidos sin guardarlos en memoria"""
+
+    def __init__(self, header, frame_header, frame, count):
+        self.chunks = [header] + [frame_header, frame] * count
+        self.chunk = 0
+        self.offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        written = 0
+        while written < len(view) and self.chunk < len(self.chunks):
+            data = self.chunks[self.chunk]
+            count = min(len(view) - written, len(data) - self.offset)
+            view[written:written + count] = data[self.offset:self.offset + count]
+            written += count
+            self.offset += count
+            if self.offset == len(data):
+                self.chunk += 1
+                self.offset = 0
+        return written
+
+
+class NullSink(io.RawIOBase):
+    """Salida que solo cuenta los bytes"""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.bytes += len(data)
+        return len(data)
+
+
+def synthetic_source(fmt, width, height, frames):
+    # Un gris medio con algo de variación, para no componer sobre ceros
+    if fmt == 'y4m':
+        size = width * height + 2 * ((width + 1) // 2) * ((height + 1) // 2)
+        frame = bytes(range(256)) * (size // 256) + bytes(size % 256)
+        header = f"YUV4MPEG2 W{width} H{height} F30:1 Ip A1:1 C420jpeg\n".encode('ascii')
+        return io.BufferedReader(SyntheticSource(header, b'FRAME\n', frame, frames),
+                                 buffer_size=1 << 20)
+    frame = bytes(range(256)) * (width * height * 3 // 256) + bytes(width * height * 3 % 256)
+    return io.BufferedReader(SyntheticSource(b'', b'', frame, frames), buffer_size=1 << 20)
+
+
+def run(resolutions, formats, worker_counts, frames, log):
+    results = []
+    for res_name in resolutions:
+        width, height = RESOLUTIONS[res_name]
+        for fmt in formats:
+            for workers in worker_counts:
+                source = synthetic_source(fmt, width, height, frames)
+                sink = NullSink()
+                start = time.perf_counter()
+                count = burn_in(source, sink, CONFIG, (width, height), workers)
+                seconds = time.perf_counter() - start
+                results.append({
+                    'resolution': res_name,
+                    'format': fmt,
+                    'workers': workers,
+                    'frames': count,
+                    'seconds': seconds,
+                    'fps': count / seconds,
+                    'mb_per_s': sink.bytes / seconds / 1e6,
+                })
+                log(f"{res_name:>6} {fmt:<6} {workers} proceso(s): "
+                    f"{results[-1]['fps']:7.1f} fps ({results[-1]['mb_per_s']:.0f} MB/s)")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del quemado de guías en vídeo")
+    parser.add_argument('--resolutions', default='1080p,4k')
+    parser.add_argument('--formats', default=','.join(FORMATS))
+    parser.add_argument('--workers', default=None,
+                        help="Lista de procesos a probar (por defecto 1 y uno por CPU)")
+    parser.add_argument('--frames', type=int, default=120)
+    parser.add_argument('--fps', type=float, default=30.0,
+                        help="Tiempo real que debe superar cada caso")
+    parser.add_argument('--output', help="Archivo JSON de resultados")
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    log = (lambda *a: None) if args.quiet else (lambda msg: print(msg, file=sys.stderr))
+    resolutions = [r.strip().lower() for r in args.resolutions.split(',') if r.strip()]
+    formats = [f.strip().lower() for f in args.formats.split(',') if f.strip()]
+    if args.workers:
+        worker_counts = [int(w) for w in args.workers.split(',') if w.strip()]
+    else:
+        worker_counts = sorted({1, os.cpu_count() or 1})
+    results = run(resolutions, formats, worker_counts, args.frames, log)
+
+    slow = [r for r in results if r['fps'] < args.fps]
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'frames': args.frames,
+            'realtime_fps': args.fps,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+        'below_realtime': len(slow),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    return 1 if slow else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
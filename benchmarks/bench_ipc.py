@@ -0,0 +1,216 @@
+"""
+Benchmark del canal de control (--control-server)
+
+Mide la latencia de ida y vuelta de los comandos del canal de control desde
+otro proceso: peticiones sueltas (ping, cambio de guías, cambio de preset),
+peticiones encadenadas sin esperar respuesta y un batch con los mismos
+comandos.
+
+Uso:
+    python benchmarks/bench_ipc.py --output resultados.json
+    python benchmarks/bench_ipc.py --server composition-overlay
+
+Sin --server arranca la aplicación en un proceso aparte (plataforma Qt
+'offscreen', en un directorio temporal) y la cierra al terminar. Termina con
+código 1 si el p95 de alguna petición suelta supera el presupuesto de un
+frame (--budget-ms).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from PyQt5.QtCore import QCoreApplication, QT_VERSION_STR, PYQT_VERSION_STR
+
+from control_server import ControlClient, ControlError
+
+
+# Presupuesto de una petición suelta: un frame a 60 Hz (ms)
+FRAME_BUDGET_MS = 1000 / 60
+
+# Conjuntos de guías que se alternan, como en un cambio de plano
+SHOT_GUIDES = (['rule_of_thirds', 'center_lines'], ['golden_ratio', 'golden_spiral'])
+
+# Presets predefinidos que se alternan
+SHOT_PRESETS = ("Fotografía - Tercios", "Video - Safe Areas")
+
+# Tiempo máximo de espera a que arranque la aplicación (s)
+STARTUP_TIMEOUT = 15
+
+
+def percentile(values, fraction):
+    """Percentil por el método del rango más cercano"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(times, commands=1):
+    """Estadísticas en ms; con commands > 1, también por comando"""
+    summary = {
+        'mean_ms': statistics.fmean(times) * 1000,
+        'p50_ms': percentile(times, 0.50) * 1000,
+        'p95_ms': percentile(times, 0.95) * 1000,
+        'max_ms': max(times) * 1000,
+        'iterations': len(times),
+    }
+    if commands > 1:
+        summary['commands'] = commands
+        summary['per_command_ms'] = summary['mean_ms'] / commands
+    return summary
+
+
+def start_server(name, workdir, log):
+    """Arranca la aplicación con el canal de control y espera a que responda"""
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'main.py'), '--control-server', name],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while True:
+        try:
+            client = ControlClient(name, timeout_ms=500).connect()
+            client.request('ping')
+            log(f"Aplicación lista en {STARTUP_TIMEOUT - (deadline - time.monotonic()):.1f}s")
+            return process, client
+        except ControlError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise
+            time.sleep(0.1)
+
+
+def time_requests(client, commands, iterations):
+    """Ida y vuelta de peticiones sueltas, alternando los comandos dados"""
+    times = []
+    for i in range(iterations):
+        command = commands[i % len(commands)]
+        start = time.perf_counter()
+        response = client.pipeline([command])[0]
+        times.append(time.perf_counter() - start)
+        if not response['ok']:
+            raise ControlError(response['error'])
+    return times
+
+
+def time_pipelined(client, commands, iterations):
+    """Todos los comandos enviados de una vez, hasta la última respuesta"""
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        responses = client.pipeline(commands)
+        times.append(time.perf_counter() - start)
+        failed = [r for r in responses if not r['ok']]
+        if failed:
+            raise ControlError(failed[0]['error'])
+    return times
+
+
+def run(client, iterations, depth, log):
+    shots = [{'cmd': 'set_guides', 'guides': guides} for guides in SHOT_GUIDES]
+    toggles = [{'cmd': 'toggle_guide', 'guide': 'diagonals'}]
+    presets = [{'cmd': 'preset', 'name': name} for name in SHOT_PRESETS]
+    burst = [shots[i % len(shots)] for i in range(depth)]
+
+    cases = [
+        ('request', 'ping', [{'cmd': 'ping'}]),
+        ('request', 'get_state', [{'cmd': 'get_state'}]),
+        ('request', 'toggle_guide', toggles),
+        ('request', 'set_guides', shots),
+        ('request', 'preset', presets),
+    ]
+
+    results = []
+    for kind, name, commands in cases:
+        times = time_requests(client, commands, iterations)
+        results.append(dict(summarize(times), kind=kind, name=name))
+        log(f"{name:<14} p50 {results[-1]['p50_ms']:7.3f} ms  "
+            f"p95 {results[-1]['p95_ms']:7.3f} ms")
+
+    times = time_pipelined(client, burst, iterations)
+    results.append(dict(summarize(times, depth), kind='pipeline', name='set_guides'))
+    log(f"{'pipeline':<14} {depth} comandos en {results[-1]['mean_ms']:7.3f} ms "
+        f"({results[-1]['per_command_ms']:.3f} ms/comando)")
+
+    batch = [{'cmd': 'batch', 'commands': burst}]
+    times = time_requests(client, batch, iterations)
+    results.append(dict(summarize(times, depth), kind='batch', name='set_guides'))
+    log(f"{'batch':<14} {depth} comandos en {results[-1]['mean_ms']:7.3f} ms "
+        f"({results[-1]['per_command_ms']:.3f} ms/comando)")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del canal de control")
+    parser.add_argument('--server', help="Nombre de un canal ya abierto (si no, se arranca la aplicación)")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--depth', type=int, default=32,
+                        help="Comandos por ráfaga encadenada y por batch")
+    parser.add_argument('--budget-ms', type=float, default=FRAME_BUDGET_MS,
+                        help="Presupuesto del p95 de una petición suelta")
+    parser.add_argument('--output', help="Archivo JSON de resultados")
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    log = (lambda *a: None) if args.quiet else (lambda msg: print(msg, file=sys.stderr))
+    app = QCoreApplication.instance() or QCoreApplication([sys.argv[0]])
+
+    # La aplicación arrancada por el benchmark guarda sus presets aquí
+    with tempfile.TemporaryDirectory(prefix='bench-ipc-') as workdir:
+        process = None
+        if args.server:
+            client = ControlClient(args.server).connect()
+        else:
+            process, client = start_server(f"bench-ipc-{os.getpid()}", workdir, log)
+
+        try:
+            initial = client.request('get_state')['state']
+            results = run(client, args.iterations, args.depth, log)
+            client.request('apply_state', state=initial)
+        finally:
+            client.close()
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    over_budget = [r['name'] for r in results
+                   if r['kind'] == 'request' and r['p95_ms'] > args.budget_ms]
+    for name in over_budget:
+        log(f"{name}: p95 por encima del presupuesto de {args.budget_ms:.1f} ms")
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'qt': QT_VERSION_STR,
+            'pyqt': PYQT_VERSION_STR,
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'depth': args.depth,
+            'budget_ms': args.budget_ms,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+        'over_budget': over_budget,
+    }
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    del app
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
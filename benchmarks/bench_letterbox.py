@@ -0,0 +1,175 @@
+"""
+Benchmark del encuadre de entrega
+
+Mide, sin ventana, lo que cuesta el encuadre (líneas de encuadre y sombreado
+fuera de él) a 1080p y 4K con la regla de tercios activa: cambiar de aspecto
+(re-rasterizar las líneas de encuadre antigua y nueva y recomponer lo que
+cambia), exponer toda la pantalla con y sin encuadre, y comparar el
+sombreado relleno directamente con el que habría que componer si fuera una
+máscara más de la capa.
+
+Uso:
+    python benchmarks/bench_letterbox.py --resolutions 4k
+    python benchmarks/bench_letterbox.py --output resultados.json
+
+Termina con código 1 si cambiar de aspecto supera el presupuesto de un
+frame (--budget-ms).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtGui import QGuiApplication, QImage, QPainter, QRegion
+
+from frame_regions import LETTERBOX_ASPECTS
+from guide_layer import GuideLayer, color_table
+from guide_renderer import GuideRenderer
+from overlay_state import OverlayState
+
+
+RESOLUTIONS = {
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+}
+
+# Aspectos entre los que se alterna (los de la lista, sin "Sin encuadre")
+ASPECTS = [aspect for _, aspect in LETTERBOX_ASPECTS if aspect]
+
+
+def time_ms(function, iterations):
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def bench_resolution(width, height, iterations):
+    state = OverlayState()
+    renderer = GuideRenderer(state)
+    layer = GuideLayer()
+    target = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+
+    def update_layer():
+        layer.get(width, height, 1.0, state.coverage_key(), renderer.paint_mask,
+                  renderer.tints(width, height))
+
+    def compose(region):
+        painter = QPainter(target)
+        painter.setClipRegion(region)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.fillRect(region.boundingRect(), Qt.transparent)
+        painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+        renderer.paint_shade(painter, width, height, region)
+        layer.blit(painter, region)
+        painter.end()
+
+    screen = QRegion(0, 0, width, height)
+    state.set_letterbox(ASPECTS[0])
+    update_layer()
+    result = {}
+
+    # Cambiar de aspecto: lo mismo que hace OverlayWindow.state_changed
+    def switch(step=[0]):
+        step[0] += 1
+        old = state.letterbox
+        old_shade = renderer.shade_region(width, height)
+        state.set_letterbox(ASPECTS[step[0] % len(ASPECTS)])
+        lines = renderer.frame_lines_region(width, height, old).united(
+            renderer.frame_lines_region(width, height, state.letterbox))
+        layer.invalidate(lines)
+        update_layer()
+        compose(lines.united(old_shade.xored(renderer.shade_region(width, height))))
+    result['switch_ms'] = statistics.median(time_ms(switch, iterations * len(ASPECTS)))
+
+    state.set_letterbox(2.39)
+    update_layer()
+    result['expose_ms'] = statistics.median(time_ms(lambda: compose(screen), iterations))
+    state.set_letterbox(None)
+    update_layer()
+    result['expose_without_ms'] = statistics.median(
+        time_ms(lambda: compose(screen), iterations))
+
+    # El mismo sombreado compuesto como una máscara Alpha8 teñida
+    state.set_letterbox(2.39)
+    shade = renderer.shade_region(width, height)
+    mask = QImage(width, height, QImage.Format_Alpha8)
+    mask.fill(0)
+    painter = QPainter(mask)
+    for rect in shade.rects():
+        painter.fillRect(rect, Qt.white)
+    painter.end()
+    view = QImage(mask.bits(), width, height, mask.bytesPerLine(), QImage.Format_Indexed8)
+    view.setColorTable(color_table(renderer.shade_color()))
+
+    def fill():
+        painter = QPainter(target)
+        renderer.paint_shade(painter, width, height)
+        painter.end()
+
+    def blit():
+        painter = QPainter(target)
+        for rect in shade.rects():
+            painter.drawImage(QRectF(rect), view, QRectF(rect))
+        painter.end()
+    result['shade_fill_ms'] = statistics.median(time_ms(fill, iterations))
+    result['shade_mask_ms'] = statistics.median(time_ms(blit, iterations))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del encuadre de entrega")
+    parser.add_argument('--resolutions', default='1080p,4k')
+    parser.add_argument('--iterations', type=int, default=7)
+    parser.add_argument('--budget-ms', type=float, default=1000 / 60,
+                        help="Presupuesto de un frame para cambiar de aspecto (ms)")
+    parser.add_argument('--output', help="Archivo JSON de resultados")
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    app = QGuiApplication.instance() or QGuiApplication(sys.argv[:1])
+    log = (lambda *a: None) if args.quiet else (lambda msg: print(msg, file=sys.stderr))
+
+    results = []
+    for res_name in [r.strip().lower() for r in args.resolutions.split(',') if r.strip()]:
+        width, height = RESOLUTIONS[res_name]
+        result = bench_resolution(width, height, args.iterations)
+        result['resolution'] = res_name
+        results.append(result)
+        log(f"{res_name:>6}: cambiar de aspecto {result['switch_ms']:.2f} ms, "
+            f"exposición {result['expose_ms']:.1f} ms (sin encuadre "
+            f"{result['expose_without_ms']:.1f} ms), sombreado relleno "
+            f"{result['shade_fill_ms']:.2f} ms / como máscara {result['shade_mask_ms']:.2f} ms")
+
+    over = [r for r in results if r['switch_ms'] > args.budget_ms]
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'budget_ms': args.budget_ms,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+        'over_budget': len(over),
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    del app
+    return 1 if over else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
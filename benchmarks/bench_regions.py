@@ -0,0 +1,174 @@
+"""
+Benchmark de las guías por regiones
+
+Mide, sin ventana, lo que cuesta rasterizar en la capa las guías de muchas
+regiones (tercios y espiral en cada una) a 1080p y 4K: una hoja de
+contactos (todas las regiones del mismo tamaño, una sola baldosa) y regiones
+de tamaños distintos (como dibujadas a mano, una baldosa por región). Para
+cada caso se mide la rasterización completa en frío (baldosas nuevas) y en
+caliente, mover una región (solo se rasteriza lo que cubría y lo que cubre)
+y copiar la capa en una exposición de toda la pantalla.
+
+Uso:
+    python benchmarks/bench_regions.py --regions 100 --resolutions 4k
+    python benchmarks/bench_regions.py --output resultados.json
+
+Termina con código 1 si la rasterización en caliente o el movimiento de una
+región superan el presupuesto de un frame (--budget-ms).
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QGuiApplication, QImage, QPainter, QRegion
+
+from guide_layer import GuideLayer
+from guide_renderer import GuideRenderer
+from overlay_state import OverlayState
+
+
+RESOLUTIONS = {
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+}
+
+REGION_GUIDES = ('rule_of_thirds', 'golden_spiral')
+
+# Separación (px) entre las celdas de la hoja de contactos
+GAP = 8
+
+
+def layouts(count, width, height):
+    """Casos: hoja de contactos uniforme y regiones de tamaños distintos"""
+    columns = math.ceil(math.sqrt(count * width / height))
+    rows = math.ceil(count / columns)
+    cell_w, cell_h = width // columns, height // rows
+    sheet, mixed = [], []
+    for i in range(count):
+        x, y = (i % columns) * cell_w, (i // columns) * cell_h
+        sheet.append((x + GAP // 2, y + GAP // 2, cell_w - GAP, cell_h - GAP,
+                      REGION_GUIDES, 16 / 9))
+        # Cada región unos píxeles distinta: ninguna comparte baldosa
+        mixed.append((x + GAP // 2, y + GAP // 2, cell_w - GAP - i % 7 - i // 7 % 5,
+                      cell_h - GAP - i % 11, REGION_GUIDES, None))
+    return {'hoja de contactos': sheet, 'tamaños distintos': mixed}
+
+
+def layer_get(layer, renderer, width, height):
+    state = renderer.config
+    layer.get(width, height, 1.0, state.coverage_key(), renderer.paint_mask,
+              renderer.tints(width, height))
+
+
+def time_ms(function, iterations):
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def bench_case(regions, width, height, iterations):
+    state = OverlayState()
+    state.guides = dict.fromkeys(state.guides, False)
+    renderer = GuideRenderer(state)
+    layer = GuideLayer()
+
+    def full(cold):
+        if cold:
+            renderer.region_tiles.clear()
+        renderer._instances.clear()
+        renderer._region_areas.clear()
+        state.set_regions(regions)
+        layer.invalidate()
+        layer_get(layer, renderer, width, height)
+
+    result = {'cold_ms': statistics.median(time_ms(lambda: full(True), iterations)),
+              'warm_ms': statistics.median(time_ms(lambda: full(False), iterations))}
+
+    # Mover una región: se rasteriza lo que cubría y lo que cubre ahora
+    def move(step=[0]):
+        step[0] += 1
+        old = state.regions
+        index = len(old) // 2
+        x, y, w, h, guides, aspect = old[index]
+        moved = (x + (1 if step[0] % 2 else -1), y, w, h, guides, aspect)
+        state.set_regions(old[:index] + (moved,) + old[index + 1:])
+        damage = renderer.regions_region(regions=(old[index],)).united(
+            renderer.regions_region(regions=(moved,)))
+        layer.invalidate(damage)
+        layer_get(layer, renderer, width, height)
+    result['move_one_ms'] = statistics.median(time_ms(move, iterations))
+
+    # Exposición de toda la pantalla: copia de la capa teñida
+    target = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+
+    def expose():
+        target.fill(Qt.transparent)
+        painter = QPainter(target)
+        layer.blit(painter, QRegion(0, 0, width, height))
+        painter.end()
+    result['expose_ms'] = statistics.median(time_ms(expose, iterations))
+    result['tiles'] = len({id(tile) for _, tile in renderer.region_instances()})
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de las guías por regiones")
+    parser.add_argument('--regions', type=int, default=100)
+    parser.add_argument('--resolutions', default='1080p,4k')
+    parser.add_argument('--iterations', type=int, default=7)
+    parser.add_argument('--budget-ms', type=float, default=1000 / 60,
+                        help="Presupuesto de un frame para rasterizar (ms)")
+    parser.add_argument('--output', help="Archivo JSON de resultados")
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    app = QGuiApplication.instance() or QGuiApplication(sys.argv[:1])
+    log = (lambda *a: None) if args.quiet else (lambda msg: print(msg, file=sys.stderr))
+
+    results = []
+    for res_name in [r.strip().lower() for r in args.resolutions.split(',') if r.strip()]:
+        width, height = RESOLUTIONS[res_name]
+        for case, regions in layouts(args.regions, width, height).items():
+            result = bench_case(tuple(regions), width, height, args.iterations)
+            result.update({'resolution': res_name, 'case': case, 'regions': len(regions)})
+            results.append(result)
+            log(f"{res_name:>6} {case:<18} {len(regions)} regiones, {result['tiles']} baldosas: "
+                f"frío {result['cold_ms']:.1f} ms, caliente {result['warm_ms']:.1f} ms, "
+                f"mover una {result['move_one_ms']:.2f} ms, exposición {result['expose_ms']:.1f} ms")
+
+    over = [r for r in results
+            if max(r['warm_ms'], r['move_one_ms']) > args.budget_ms]
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'budget_ms': args.budget_ms,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+        'over_budget': len(over),
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    del app
+    return 1 if over else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
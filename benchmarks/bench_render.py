@@ -0,0 +1,254 @@
+"""
+Benchmark de renderizado de guías
+
+Renderiza cada guía, cada preset predefinido y varios grids densos en QImages
+fuera de pantalla a 1080p, 4K y 8K, barriendo grosores de línea y
+antialiasing, y mide también la copia de la capa cacheada (lo que cuesta un
+repintado por exposición).
+
+Uso:
+    python benchmarks/bench_render.py --output resultados.json
+    python benchmarks/bench_render.py --baseline base.json --tolerance 0.15
+
+Con --baseline compara la media de cada caso contra la referencia y termina
+con código 1 si alguno empeora más de la tolerancia.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import Qt, QT_VERSION_STR, PYQT_VERSION_STR
+from PyQt5.QtGui import QGuiApplication, QImage, QPainter, QRegion
+
+from guide_geometry import DEFAULT_GRID
+from guide_layer import GuideLayer
+from guide_renderer import GuideRenderer
+from overlay_state import GUIDE_NAMES, OverlayState
+from preset_store import BUILTIN_PRESETS
+
+
+RESOLUTIONS = {
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+    '8k': (7680, 4320),
+}
+LINE_WIDTHS = [1, 2, 5]
+
+# Grids configurables densos: (filas, columnas, medianil, margen, línea base)
+DENSE_GRIDS = {
+    'Grid 12 columnas': (1, 12, 24, 64, 0),
+    'Línea base 8px': (1, 1, 0, 0, 8),
+    'Grid 200x200': (200, 200, 0, 0, 0),
+}
+
+
+def percentile(values, fraction):
+    """Percentil por el método del rango más cercano"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def bench_cases():
+    """Casos: cada guía por separado, cada preset predefinido y los grids densos
+
+    Cada caso es (tipo, nombre, guías, grid_params).
+    """
+    cases = [('guide', name, [name], DEFAULT_GRID) for name in GUIDE_NAMES]
+    for preset_name, guides in BUILTIN_PRESETS.items():
+        if guides == []:
+            continue  # Preset vacío: no dibuja nada
+        cases.append(('preset', preset_name, GUIDE_NAMES if guides is None else guides,
+                      DEFAULT_GRID))
+    for grid_name, grid in DENSE_GRIDS.items():
+        cases.append(('grid', grid_name, ['custom_grid'], grid))
+    return cases
+
+
+def time_paint(renderer, image, width, height, antialias, iterations):
+    """Mide iteraciones de pintado en frío (geometría nueva) y en caliente"""
+    def paint_once():
+        image.fill(Qt.transparent)
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.Antialiasing, antialias)
+        renderer.paint(painter, width, height)
+        painter.end()
+
+    renderer.geometry.clear()
+    start = time.perf_counter()
+    paint_once()
+    cold = time.perf_counter() - start
+
+    times = []
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        paint_once()
+        times.append(time.perf_counter() - start)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, 'filename')
+    alloc_bytes = sum(max(0, stat.size_diff) for stat in stats)
+    alloc_blocks = sum(max(0, stat.count_diff) for stat in stats)
+    return cold, times, alloc_bytes, alloc_blocks, peak
+
+
+def time_blit(layer, target, iterations):
+    """Mide la copia completa de la capa cacheada (repintado por exposición)"""
+    region = QRegion(0, 0, target.width(), target.height())
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        painter = QPainter(target)
+        layer.blit(painter, region)
+        painter.end()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summarize(times):
+    return {
+        'mean_ms': statistics.fmean(times) * 1000,
+        'p95_ms': percentile(times, 0.95) * 1000,
+        'min_ms': min(times) * 1000,
+        'iterations': len(times),
+    }
+
+
+def run(resolutions, line_widths, iterations, log):
+    results = []
+    config = OverlayState()
+    renderer = GuideRenderer(config)
+
+    for res_name in resolutions:
+        width, height = RESOLUTIONS[res_name]
+        image = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+
+        for kind, name, guides, grid in bench_cases():
+            config.guides = {guide: guide in guides for guide in GUIDE_NAMES}
+            config.grid_params = grid
+            for line_width in line_widths:
+                config.line_width = line_width
+                for antialias in (True, False):
+                    cold, times, alloc_bytes, alloc_blocks, peak = time_paint(
+                        renderer, image, width, height, antialias, iterations
+                    )
+                    result = {
+                        'kind': kind,
+                        'case': name,
+                        'resolution': res_name,
+                        'line_width': line_width,
+                        'antialias': antialias,
+                        'cold_ms': cold * 1000,
+                        'alloc_bytes': alloc_bytes,
+                        'alloc_blocks': alloc_blocks,
+                        'peak_bytes': peak,
+                    }
+                    result.update(summarize(times))
+                    results.append(result)
+                    log(f"{res_name:>5} {kind:<6} {name:<26} lw={line_width} "
+                        f"aa={'on ' if antialias else 'off'} "
+                        f"media={result['mean_ms']:7.2f} ms  p95={result['p95_ms']:7.2f} ms")
+
+        # Coste de un repintado por exposición con todas las guías activas
+        config.guides = {guide: True for guide in GUIDE_NAMES}
+        config.grid_params = DEFAULT_GRID
+        config.line_width = 2
+        layer = GuideLayer()
+        layer.get(width, height, 1.0, None, renderer.paint_mask,
+                  renderer.tints(width, height))
+        times = time_blit(layer, image, iterations)
+        result = {'kind': 'blit', 'case': 'layer', 'resolution': res_name,
+                  'line_width': 2, 'antialias': True}
+        result.update(summarize(times))
+        results.append(result)
+        log(f"{res_name:>5} blit   capa completa                  "
+            f"media={result['mean_ms']:7.2f} ms  p95={result['p95_ms']:7.2f} ms")
+    return results
+
+
+def case_key(result):
+    return (result['kind'], result['case'], result['resolution'],
+            result['line_width'], result['antialias'])
+
+
+def compare(results, baseline, tolerance, log):
+    """Devuelve la lista de casos cuya media empeora más que la tolerancia"""
+    reference = {case_key(r): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        base = reference.get(case_key(result))
+        if base is None or base['mean_ms'] <= 0:
+            continue
+        ratio = result['mean_ms'] / base['mean_ms']
+        result['baseline_mean_ms'] = base['mean_ms']
+        result['ratio'] = ratio
+        if ratio > 1 + tolerance:
+            regressions.append(result)
+            log(f"REGRESIÓN {case_key(result)}: {base['mean_ms']:.2f} -> "
+                f"{result['mean_ms']:.2f} ms (x{ratio:.2f})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de renderizado de guías")
+    parser.add_argument('--resolutions', default='1080p,4k,8k',
+                        help="Lista separada por comas (1080p, 4k, 8k)")
+    parser.add_argument('--line-widths', default=','.join(map(str, LINE_WIDTHS)))
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--output', help="Archivo JSON de resultados")
+    parser.add_argument('--baseline', help="Resultados de referencia para comparar")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="Empeoramiento relativo admitido (0.15 = 15%%)")
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    log = (lambda *a: None) if args.quiet else (lambda msg: print(msg, file=sys.stderr))
+    app = QGuiApplication.instance() or QGuiApplication([sys.argv[0]])
+
+    resolutions = [r.strip().lower() for r in args.resolutions.split(',') if r.strip()]
+    line_widths = [int(w) for w in args.line_widths.split(',') if w.strip()]
+    results = run(resolutions, line_widths, args.iterations, log)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'qt': QT_VERSION_STR,
+            'pyqt': PYQT_VERSION_STR,
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance, log)
+        report['regressions'] = len(regressions)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    del app
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,6 +4,16 @@ echo   Construyendo Composition Overlay
 echo ========================================
 echo.
 
+REM Modo de empaquetado: onefile (por defecto) u onedir
+REM   build_exe.bat         -> un solo .exe (se extrae a una carpeta temporal en cada arranque)
+REM   build_exe.bat onedir  -> carpeta con el .exe y sus librerias (arranca mas rapido)
+set BUILD_MODE=--onefile
+set EXE_PATH=dist\CompositionOverlay.exe
+if /i "%~1"=="onedir" (
+    set BUILD_MODE=--onedir
+    set EXE_PATH=dist\CompositionOverlay\CompositionOverlay.exe
+)
+
 REM Verificar que estamos en el entorno virtual
 if exist ".venv\Scripts\activate.bat" (
     call .venv\Scripts\activate.bat
@@ -28,22 +38,21 @@ if exist "*.spec" del /q *.spec
 
 REM Crear ejecutable con PyInstaller
 pyinstaller ^
-    --onefile ^
+    %BUILD_MODE% ^
     --windowed ^
     --name="CompositionOverlay" ^
-    --add-data="presets.json;." ^
     --noconsole ^
     main.py
 
 echo.
 echo ========================================
-if exist "dist\CompositionOverlay.exe" (
+if exist "%EXE_PATH%" (
     echo   Exito! Ejecutable creado
-    echo   Ubicacion: dist\CompositionOverlay.exe
+    echo   Ubicacion: %EXE_PATH%
     echo ========================================
     echo.
     echo Puedes ejecutar el programa desde:
-    echo   dist\CompositionOverlay.exe
+    echo   %EXE_PATH%
 ) else (
     echo   Error: No se pudo crear el ejecutable
     echo ========================================
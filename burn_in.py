@@ -0,0 +1,388 @@
+"""
+Guías quemadas en secuencias de vídeo (--burn-in)
+
+Lee frames sin comprimir de un archivo o de stdin, uno a uno, compone encima
+las guías y los escribe en el mismo formato. Formatos:
+
+  - y4m (YUV4MPEG2) de 8 bits con croma 420, 422, 444 o mono, tal como lo
+    escribe ffmpeg: ffmpeg -i clip.mov -f yuv4mpegpipe - | ...
+  - RGB crudo (rgb24), indicando el tamaño del frame.
+
+Las guías se dibujan una sola vez por resolución con el mismo renderizador
+que el overlay (plataforma Qt 'offscreen') y se convierten en una lista
+dispersa de muestras: índice en el frame, valor premultiplicado y cuánto se
+conserva del original. Componer un frame solo toca esas muestras, así que el
+coste depende de las guías y no del tamaño del frame.
+
+Con varios procesos, los frames viven en unos pocos buffers de memoria
+compartida (dos por proceso): el proceso principal lee en un buffer libre,
+un proceso del pool compone en el sitio y el principal escribe los frames en
+orden. La memoria no crece con la duración del clip.
+"""
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Buffers de frame por proceso del pool
+SLOTS_PER_WORKER = 2
+
+# Procesos por defecto: componer es barato frente a leer y escribir cada
+# frame (lo hace el proceso principal), así que más no acelera y solo suma
+# buffers
+DEFAULT_MAX_WORKERS = 4
+
+# Submuestreo del croma en y4m: nombre -> (divisor horizontal, divisor vertical)
+Y4M_CHROMA = {'420': (2, 2), '422': (2, 1), '444': (1, 1), 'mono': None}
+
+# Coeficientes (Kr, Kb) de cada matriz YCbCr
+MATRICES = {'601': (0.299, 0.114), '709': (0.2126, 0.0722)}
+
+# Estado de cada proceso del pool: guías dispersas y buffers compartidos
+_worker = {}
+
+
+def parse_size(size):
+    """Acepta "1920x1080"; ValueError si no es WxH con ancho y alto >= 1"""
+    width, sep, height = size.lower().partition('x')
+    try:
+        if not sep:
+            raise ValueError
+        width, height = int(width), int(height)
+    except ValueError:
+        raise ValueError(f"Tamaño no válido: {size!r} (se espera WxH, p. ej. 1920x1080)")
+    if width < 1 or height < 1:
+        raise ValueError(f"Tamaño no válido: {size!r} (ancho y alto deben ser >= 1)")
+    return width, height
+
+
+# Lectura y escritura de frames
+
+def read_exact(stream, view):
+    """Llena view desde stream; devuelve False si el stream termina antes"""
+    filled = 0
+    while filled < len(view):
+        count = stream.readinto(view[filled:])
+        if not count:
+            if filled:
+                raise ValueError("El último frame está incompleto")
+            return False
+        filled += count
+    return True
+
+
+class Y4MStream:
+    """Frames de un stream YUV4MPEG2"""
+
+    def __init__(self, header):
+        self.header = header
+        tokens = header.decode('ascii').split()
+        params = {token[0]: token[1:] for token in tokens[1:]}
+        self.width = int(params['W'])
+        self.height = int(params['H'])
+        colorspace = params.get('C', '420jpeg')
+        self.chroma = next((name for name in Y4M_CHROMA if colorspace.startswith(name)), None)
+        if self.chroma is None or colorspace[len(self.chroma):] not in ('', 'jpeg', 'paldv', 'mpeg2'):
+            raise ValueError(f"Espacio de color y4m no soportado: C{colorspace} (solo 8 bits)")
+        self.full_range = 'XCOLORRANGE=FULL' in tokens
+
+        luma = self.width * self.height
+        self.chroma_size = self.chroma_plane_size()
+        self.frame_size = luma + 2 * self.chroma_size[0] * self.chroma_size[1]
+        self.layout = ('y4m', self.width, self.height, self.chroma, self.full_range)
+
+    def chroma_plane_size(self):
+        divisors = Y4M_CHROMA[self.chroma]
+        if divisors is None:
+            return 0, 0
+        return -(-self.width // divisors[0]), -(-self.height // divisors[1])
+
+    def write_header(self, output):
+        output.write(self.header)
+
+    def read_frame(self, source, view):
+        """Lee la cabecera y los datos de un frame; devuelve la cabecera o None"""
+        line = source.readline()
+        if not line:
+            return None
+        if not line.startswith(b'FRAME'):
+            raise ValueError("Cabecera de frame y4m no válida")
+        if not read_exact(source, view):
+            raise ValueError("El último frame está incompleto")
+        return line
+
+
+class RawRGBStream:
+    """Frames RGB crudos (rgb24) de tamaño fijo"""
+
+    def __init__(self, width, height, prefix=b''):
+        self.width = width
+        self.height = height
+        self.frame_size = width * height * 3
+        self.layout = ('rgb24', width, height)
+        self.prefix = prefix  # Bytes ya leídos al detectar el formato
+
+    def write_header(self, output):
+        pass
+
+    def read_frame(self, source, view):
+        prefix, self.prefix = self.prefix, b''
+        view[:len(prefix)] = prefix
+        if len(prefix) == len(view):
+            return b''
+        if not read_exact(source, view[len(prefix):]):
+            if prefix:
+                raise ValueError("El último frame está incompleto")
+            return None
+        return b''
+
+
+def open_stream(source, size=None):
+    """Detecta el formato por la cabecera: y4m, o RGB crudo del tamaño indicado"""
+    head = source.read(9)
+    if head == b'YUV4MPEG2':
+        return Y4MStream(head + source.readline())
+    if size is None:
+        raise ValueError("La entrada no es y4m: indica el tamaño de los frames RGB (--size)")
+    return RawRGBStream(*size, prefix=head)
+
+
+def load_config(preset=None, presets_dir="presets"):
+    """Configuración de las guías: archivo JSON, preset de la biblioteca o el último usado"""
+    import json
+    from preset_store import PresetStore
+
+    if preset is not None and os.path.isfile(preset):
+        with open(preset, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    store = PresetStore(presets_dir)
+    name = preset if preset is not None else store.last_used
+    if name is None:
+        return {}
+    if name not in store:
+        raise ValueError(f"Preset desconocido: {name}")
+    return store.load(name)
+
+
+# Guías dispersas
+
+def guide_coverage(config, width, height):
+    """Guías en RGBA premultiplicado (array alto×ancho×4 de uint8)"""
+    import numpy as np
+    from PyQt5.QtGui import QImage
+    from batch_render import ensure_app
+    from guide_renderer import GuideRenderer
+    from overlay_state import OverlayState
+
+    ensure_app()
+    renderer = GuideRenderer(OverlayState.from_dict(config))
+    image = renderer.render_image(width, height).convertToFormat(
+        QImage.Format_RGBA8888_Premultiplied
+    )
+    bits = image.constBits()
+    bits.setsize(image.byteCount())
+    return np.frombuffer(bits, np.uint8).reshape(height, width, 4).copy()
+
+
+def downsample(plane, divisors):
+    """Media de cada bloque de divisores (horizontal, vertical) píxeles"""
+    import numpy as np
+    dx, dy = divisors
+    height, width = plane.shape
+    padded = np.zeros((-(-height // dy) * dy, -(-width // dx) * dx), np.float64)
+    padded[:height, :width] = plane
+    return padded.reshape(padded.shape[0] // dy, dy, padded.shape[1] // dx, dx).mean(axis=(1, 3))
+
+
+def sparse_guides(rgba, layout, matrix=None):
+    """Muestras de las guías para un formato de frame: (índices, suma, conserva)
+
+    Cada muestra cubierta se compone como
+    salida = suma + entrada * conserva / 255.
+    """
+    import numpy as np
+
+    alpha = rgba[..., 3].astype(np.float64)
+    if layout[0] == 'rgb24':
+        pixels = np.flatnonzero(alpha)
+        indices = (pixels[:, None] * 3 + np.arange(3)).ravel()
+        add = rgba[..., :3].reshape(-1, 3)[pixels].ravel()
+        keep = np.repeat(255 - rgba[..., 3].ravel()[pixels], 3)
+        return indices, add.astype(np.uint16), keep.astype(np.uint16)
+
+    _, width, height, chroma, full_range = layout
+    if matrix is None:
+        matrix = '709' if height >= 720 else '601'
+    kr, kb = MATRICES[matrix]
+    # Componentes premultiplicadas (0-1 por el alfa): R', G', B'
+    r, g, b = (rgba[..., i].astype(np.float64) / 255 for i in range(3))
+    a = alpha / 255
+    y = kr * r + (1 - kr - kb) * g + kb * b
+    cb = (b - y) / (2 * (1 - kb))
+    cr = (r - y) / (2 * (1 - kr))
+    if full_range:
+        luma, u, v = 255 * y, 128 * a + 255 * cb, 128 * a + 255 * cr
+    else:
+        luma, u, v = 16 * a + 219 * y, 128 * a + 224 * cb, 128 * a + 224 * cr
+
+    # (valor premultiplicado, cobertura) de cada plano, en orden en el frame
+    planes = [(luma, a)]
+    if chroma != 'mono':
+        divisors = Y4M_CHROMA[chroma]
+        chroma_alpha = downsample(a, divisors)
+        planes += [(downsample(u, divisors), chroma_alpha),
+                   (downsample(v, divisors), chroma_alpha)]
+
+    parts = []
+    offset = 0
+    for value, coverage in planes:
+        covered = np.flatnonzero(coverage)
+        parts.append((
+            covered + offset,
+            np.rint(value.ravel()[covered]),
+            np.rint(255 * (1 - coverage.ravel()[covered])),
+        ))
+        offset += coverage.size
+    indices = np.concatenate([p[0] for p in parts])
+    add = np.clip(np.concatenate([p[1] for p in parts]), 0, 255).astype(np.uint16)
+    keep = np.concatenate([p[2] for p in parts]).astype(np.uint16)
+    return indices, add, keep
+
+
+def blend(frame, guides):
+    """Compone las guías dispersas sobre un frame (array plano de uint8) en el sitio"""
+    import numpy as np
+    indices, add, keep = guides
+    values = frame[indices].astype(np.uint16)
+    values *= keep
+    values += 127
+    values //= 255
+    values += add
+    np.minimum(values, 255, out=values)
+    frame[indices] = values
+
+
+# Pool de procesos
+
+def _init_worker(guides, names, frame_size):
+    import numpy as np
+    from multiprocessing import shared_memory
+    # Los buffers los crea y los libera el proceso principal
+    blocks = [shared_memory.SharedMemory(name=name) for name in names]
+    _worker['blocks'] = blocks
+    _worker['frames'] = [np.ndarray(frame_size, np.uint8, block.buf) for block in blocks]
+    _worker['guides'] = guides
+
+
+def _blend_slot(slot):
+    blend(_worker['frames'][slot], _worker['guides'])
+    return slot
+
+
+def burn_in(source, output, config, size=None, workers=1, matrix=None, log=None):
+    """Compone las guías en todos los frames de source y los escribe en output
+
+    source y output son archivos binarios. Devuelve el número de frames.
+    """
+    stream = open_stream(source, size)
+    start = time.perf_counter()
+    guides = sparse_guides(guide_coverage(config, stream.width, stream.height),
+                           stream.layout, matrix)
+    if log:
+        log(f"{stream.width}x{stream.height} {stream.layout[0]}: "
+            f"{len(guides[0])} muestras con guías "
+            f"({(time.perf_counter() - start) * 1000:.0f} ms)")
+
+    stream.write_header(output)
+    workers = max(1, workers or 1)
+    start = time.perf_counter()
+    if workers == 1:
+        frames = _burn_in_serial(stream, source, output, guides)
+    else:
+        frames = _burn_in_pool(stream, source, output, guides, workers)
+    output.flush()
+
+    if log:
+        seconds = time.perf_counter() - start
+        log(f"{frames} frames en {seconds:.2f}s ({frames / max(seconds, 1e-9):.1f} fps) "
+            f"con {workers} proceso(s)")
+    return frames
+
+
+def _burn_in_serial(stream, source, output, guides):
+    import numpy as np
+    buffer = bytearray(stream.frame_size)
+    view = memoryview(buffer)
+    frame = np.frombuffer(buffer, np.uint8)
+    frames = 0
+    while True:
+        header = stream.read_frame(source, view)
+        if header is None:
+            return frames
+        blend(frame, guides)
+        output.write(header)
+        output.write(view)
+        frames += 1
+
+
+def _burn_in_pool(stream, source, output, guides, workers):
+    from multiprocessing import shared_memory
+    blocks = [shared_memory.SharedMemory(create=True, size=stream.frame_size)
+              for _ in range(workers * SLOTS_PER_WORKER)]
+    views = []
+    try:
+        views.extend(block.buf[:stream.frame_size] for block in blocks)
+        free = list(range(len(blocks)))
+        pending = deque()  # (futuro, buffer, cabecera) en orden de entrada
+        frames = 0
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(guides, [b.name for b in blocks],
+                                           stream.frame_size)) as executor:
+            def write_oldest():
+                future, slot, header = pending.popleft()
+                future.result()
+                output.write(header)
+                output.write(views[slot])
+                free.append(slot)
+
+            while True:
+                if not free:
+                    write_oldest()
+                slot = free.pop()
+                header = stream.read_frame(source, views[slot])
+                if header is None:
+                    break
+                pending.append((executor.submit(_blend_slot, slot), slot, header))
+                frames += 1
+            while pending:
+                write_oldest()
+        return frames
+    finally:
+        # Las vistas se sueltan también si hubo un error: con vistas vivas
+        # close() lanza BufferError y taparía el error real
+        for view in views:
+            view.release()
+        for block in blocks:
+            try:
+                block.close()
+            finally:
+                block.unlink()
+
+
+def run_burn_in(input_path, output_path, config, size=None, workers=None, matrix=None,
+                log=None):
+    """Como burn_in, con rutas ('-' = stdin/stdout)"""
+    log = log or (lambda msg: print(msg, file=sys.stderr))
+    workers = workers or min(os.cpu_count() or 1, DEFAULT_MAX_WORKERS)
+    source = sys.stdin.buffer if input_path == '-' else open(input_path, 'rb')
+    output = sys.stdout.buffer if output_path == '-' else open(output_path, 'wb')
+    try:
+        return burn_in(source, output, config, size, workers, matrix, log)
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        if output is not sys.stdout.buffer:
+            output.close()
@@ -0,0 +1,320 @@
+"""
+Captura de la pantalla con las guías (snapshot y ráfaga)
+
+Cada captura copia la pantalla que hay bajo el overlay y compone encima la
+capa de guías ya rasterizada (la misma que copia paintEvent, con el
+sombreado del encuadre si lo hay), así que no se vuelve a trazar ninguna
+guía. En el hilo de la interfaz solo se hacen la copia de pantalla y la
+composición; la codificación PNG/JPEG va a un QThreadPool propio y avisa con
+saved/failed al terminar.
+
+La ráfaga captura N frames a intervalo fijo en un anillo de QImage reservado
+antes de empezar: cada frame se compone en un buffer libre del anillo, que
+vuelve a estar libre cuando su archivo termina de escribirse. Si el
+codificador va por detrás y no queda ninguno libre, ese frame usa una imagen
+nueva en lugar de esperar.
+
+En Windows (10 2004 o posterior) el overlay se excluye de las capturas de
+pantalla con SetWindowDisplayAffinity solo mientras se copia la pantalla
+(excluded_from_capture), para que la copia no incluya ya las guías; el resto
+del tiempo OBS, las videollamadas y demás herramientas de grabación lo ven
+como siempre. En otras plataformas, si el sistema incluye el overlay en la
+copia, las guías se componen encima de sí mismas en el mismo sitio.
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from PyQt5.QtCore import QObject, QRunnable, QThread, QThreadPool, QTimer, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QPainter, QRegion
+
+
+# Formatos de captura: extensión -> formato de QImage.save
+CAPTURE_FORMATS = {'png': 'PNG', 'jpg': 'JPG'}
+
+# Calidad JPEG (0-100); PNG usa la compresión por defecto
+JPEG_QUALITY = 92
+
+# Buffers del anillo de la ráfaga (por tamaño de pantalla; ~33 MB cada uno a 4K)
+RING_SIZE = 4
+
+# Límites de la ráfaga
+BURST_MAX_FRAMES = 120
+BURST_MIN_INTERVAL_MS = 33
+
+# SetWindowDisplayAffinity
+WDA_NONE = 0x00
+WDA_EXCLUDEFROMCAPTURE = 0x11
+
+
+def exclude_from_capture(widget, excluded=True):
+    """Excluye (o vuelve a incluir) una ventana de las capturas de pantalla
+
+    Solo tiene efecto en Windows; devuelve si se pudo aplicar.
+    """
+    if sys.platform != 'win32':
+        return False
+    import ctypes
+    affinity = WDA_EXCLUDEFROMCAPTURE if excluded else WDA_NONE
+    return bool(ctypes.windll.user32.SetWindowDisplayAffinity(int(widget.winId()), affinity))
+
+
+@contextmanager
+def excluded_from_capture(widget):
+    """Excluye una ventana de las capturas solo durante el bloque
+
+    Al salir vuelve a WDA_NONE: el overlay tiene que seguir viéndose en las
+    grabaciones y videollamadas entre una copia de pantalla y la siguiente.
+    """
+    excluded = exclude_from_capture(widget)
+    try:
+        yield excluded
+    finally:
+        if excluded:
+            exclude_from_capture(widget, False)
+
+
+def timestamp_name(prefix):
+    """Nombre base único por milisegundo: prefijo_AAAAMMDD-HHMMSS-mmm"""
+    now = time.time()
+    return (f"{prefix}_{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}"
+            f"-{int(now * 1000) % 1000:03d}")
+
+
+class EncodeSignals(QObject):
+    # (tarea, ms de codificación)
+    finished = pyqtSignal(object, float)
+    # (tarea, mensaje)
+    failed = pyqtSignal(object, str)
+
+
+class EncodeTask(QRunnable):
+    """Escribe una imagen a disco en un hilo del pool"""
+
+    def __init__(self, image, path, image_format, quality, burst=False):
+        super().__init__()
+        self.image = image
+        self.path = path
+        self.image_format = image_format
+        self.quality = quality
+        self.burst = burst
+        self.signals = EncodeSignals()
+
+    def run(self):
+        start = time.perf_counter()
+        if self.image.save(self.path, self.image_format, self.quality):
+            self.signals.finished.emit(self, (time.perf_counter() - start) * 1000)
+        else:
+            self.signals.failed.emit(self, f"No se pudo escribir {self.path}")
+
+
+class CaptureRing:
+    """Buffers reservados de antemano para los frames de una ráfaga
+
+    Un buffer está ocupado desde que se compone en él hasta que su archivo
+    termina de escribirse.
+    """
+
+    def __init__(self, size, width, height):
+        self.images = [QImage(width, height, QImage.Format_RGB32) for _ in range(size)]
+        self.busy = set()
+        self.next = 0
+
+    def acquire(self):
+        """Siguiente buffer libre (en orden circular), o None si no hay"""
+        for i in range(len(self.images)):
+            index = (self.next + i) % len(self.images)
+            if index not in self.busy:
+                self.busy.add(index)
+                self.next = index + 1
+                return self.images[index]
+        return None
+
+    def release(self, image):
+        for index, ring_image in enumerate(self.images):
+            if ring_image is image:
+                self.busy.discard(index)
+                return
+
+
+class CaptureManager(QObject):
+    # Ruta de cada archivo escrito
+    saved = pyqtSignal(str)
+    # Mensaje de error de una captura o de su escritura
+    failed = pyqtSignal(str)
+    # Frames de una ráfaga, cuando se han escrito todos
+    burst_finished = pyqtSignal(int)
+
+    def __init__(self, overlay, directory="capturas", image_format='png'):
+        super().__init__()
+        self.overlay = overlay
+        self.directory = directory
+        self.image_format = image_format
+        self.quality = JPEG_QUALITY
+
+        # Codificación fuera del hilo de la interfaz; se deja un núcleo libre
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, QThread.idealThreadCount() - 1))
+        self.tasks = set()  # EncodeTask en curso (mantiene vivas sus señales)
+
+        self.rings = {}  # (ancho, alto) en píxeles -> CaptureRing
+
+        # Ráfaga en curso
+        self.burst_timer = QTimer(self)
+        self.burst_timer.setTimerType(Qt.PreciseTimer)
+        self.burst_timer.timeout.connect(self.capture_burst_frame)
+        self.burst_name = None  # Prefijo de los archivos de la ráfaga
+        self.burst_frames = 0
+        self.burst_captured = 0
+        self.burst_pending = 0
+        self.burst_overflows = 0
+
+    # Captura (hilo de la interfaz)
+
+    def grab(self, overlay, image=None):
+        """Pantalla bajo el overlay con las guías compuestas encima
+
+        Compone en image si tiene el tamaño adecuado; si no, en una imagen
+        nueva. Lanza OSError si el sistema no deja copiar la pantalla.
+        """
+        with excluded_from_capture(overlay):
+            pixmap = overlay.screen().grabWindow(0)
+        if pixmap.isNull():
+            raise OSError("No se pudo copiar la pantalla")
+        # Escala real de la copia respecto a la ventana (coordenadas lógicas)
+        dpr = pixmap.width() / max(1, overlay.width())
+        pixmap.setDevicePixelRatio(dpr)
+
+        if image is None or image.size() != pixmap.size():
+            image = QImage(pixmap.size(), QImage.Format_RGB32)
+        image.setDevicePixelRatio(dpr)
+        painter = QPainter(image)
+        painter.drawPixmap(0, 0, pixmap)
+        if overlay.isVisible():
+            overlay.compose(painter, QRegion(overlay.rect()))
+        painter.end()
+        return image
+
+    def capture_path(self, name, overlay_index, frame=None):
+        """Ruta de un archivo; con varias pantallas lleva el número de pantalla"""
+        parts = [name]
+        if len(self.overlay.targets()) > 1:
+            parts.append(f"pantalla{overlay_index + 1}")
+        if frame is not None:
+            parts.append(f"{frame + 1:03d}")
+        return os.path.join(self.directory, '_'.join(parts) + '.' + self.image_format)
+
+    def snapshot(self):
+        """Captura una vez cada pantalla afectada; devuelve las rutas que se escribirán"""
+        name = timestamp_name("captura")
+        paths = []
+        for index, overlay in enumerate(self.overlay.targets()):
+            try:
+                image = self.grab(overlay)
+            except OSError as e:
+                self.failed.emit(str(e))
+                continue
+            path = self.capture_path(name, index)
+            self.encode(image, path)
+            paths.append(path)
+        return paths
+
+    def start_burst(self, frames, interval_ms):
+        """Empieza una ráfaga de frames capturas cada interval_ms ms
+
+        Devuelve False si la anterior todavía no ha terminado.
+        """
+        if self.is_bursting():
+            return False
+        self.burst_frames = max(1, min(frames, BURST_MAX_FRAMES))
+        self.burst_captured = 0
+        self.burst_pending = 0
+        self.burst_overflows = 0
+        self.burst_name = timestamp_name("rafaga")
+
+        # Reservar los buffers antes del primer frame
+        for overlay in self.overlay.targets():
+            dpr = overlay.devicePixelRatioF()
+            size = (round(overlay.width() * dpr), round(overlay.height() * dpr))
+            if size not in self.rings:
+                self.rings[size] = CaptureRing(RING_SIZE, *size)
+
+        self.burst_timer.start(max(BURST_MIN_INTERVAL_MS, interval_ms))
+        self.capture_burst_frame()
+        return True
+
+    def stop_burst(self):
+        self.burst_timer.stop()
+        self.check_burst_done()
+
+    def check_burst_done(self):
+        """Avisa del final de la ráfaga cuando ya no captura ni escribe nada"""
+        if self.burst_name is not None and not self.burst_timer.isActive() \
+                and self.burst_pending == 0:
+            self.burst_name = None
+            self.burst_finished.emit(self.burst_captured)
+
+    def is_bursting(self):
+        """Hay una ráfaga capturando o escribiendo sus frames"""
+        return self.burst_name is not None
+
+    def capture_burst_frame(self):
+        """Compone un frame de la ráfaga en buffers del anillo"""
+        frame = self.burst_captured
+        for index, overlay in enumerate(self.overlay.targets()):
+            dpr = overlay.devicePixelRatioF()
+            ring = self.rings.get((round(overlay.width() * dpr), round(overlay.height() * dpr)))
+            image = ring.acquire() if ring is not None else None
+            if image is None:
+                self.burst_overflows += 1
+            try:
+                captured = self.grab(overlay, image)
+            except OSError as e:
+                if ring is not None and image is not None:
+                    ring.release(image)
+                self.failed.emit(str(e))
+                self.stop_burst()
+                return
+            if captured is not image and ring is not None and image is not None:
+                # La pantalla cambió de tamaño: el buffer no sirvió
+                ring.release(image)
+            self.burst_pending += 1
+            self.encode(captured, self.capture_path(self.burst_name, index, frame), burst=True)
+
+        self.burst_captured += 1
+        if self.burst_captured >= self.burst_frames:
+            self.stop_burst()
+
+    # Codificación (pool de hilos)
+
+    def encode(self, image, path, burst=False):
+        """Escribe la imagen en un hilo del pool"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        quality = self.quality if self.image_format == 'jpg' else -1
+        task = EncodeTask(image, path, CAPTURE_FORMATS[self.image_format], quality, burst)
+        task.setAutoDelete(False)
+        task.signals.finished.connect(self.encoded)
+        task.signals.failed.connect(self.encoded)
+        self.tasks.add(task)
+        self.pool.start(task)
+
+    def encoded(self, task, result):
+        """Fin de una escritura (result son los ms o el mensaje de error)"""
+        self.tasks.discard(task)
+        for ring in self.rings.values():
+            ring.release(task.image)
+        if isinstance(result, str):
+            self.failed.emit(result)
+        else:
+            self.saved.emit(task.path)
+
+        if task.burst:
+            self.burst_pending -= 1
+            self.check_burst_done()
+
+    def close(self):
+        """Detiene la ráfaga, espera a las escrituras pendientes y libera el anillo"""
+        self.burst_timer.stop()
+        self.pool.waitForDone()
+        self.rings = {}
@@ -0,0 +1,409 @@
+"""
+Análisis de composición en tiempo real sobre la pantalla
+
+Mide dónde está la energía visual (bordes y detalle) del contenido que hay
+bajo el overlay y la compara con los puntos fuertes y las líneas de la regla
+de tercios, la proporción áurea y la espiral áurea activas. Cada punto
+fuerte lleva un indicador de calor (de azul, sin detalle, a rojo, mucho más
+detalle que la media de la pantalla) y una esquina muestra la puntuación de
+cada guía.
+
+Para llegar a 10 análisis por segundo a 4K sin ocupar un núcleo:
+
+  - Solo se copian regiones pequeñas (sondas) alrededor de cada punto
+    fuerte, de unos pocos tramos de cada línea y de una rejilla de
+    referencia; nunca la pantalla entera.
+  - Cada sonda se reduce a ROI_SAMPLES×ROI_SAMPLES muestras en gris y la
+    energía de todas se calcula a la vez con numpy (|dx| + |dy| ponderado).
+  - Solo se recalculan las sondas cuya muestra cambió; la rejilla de
+    referencia, que cambia despacio, se renueva por turnos; y las sondas,
+    sus pesos y sus máscaras solo se reconstruyen al cambiar las guías o el
+    tamaño.
+  - Si aun así un análisis tarda demasiado, el intervalo se alarga para no
+    pasar de MAX_CPU_SHARE de un núcleo.
+
+Las guías y los propios indicadores aparecerían en la copia de pantalla (en
+Windows el overlay se excluye de las capturas mientras se copian las sondas,
+ver capture.py), así que sus píxeles se excluyen del cálculo.
+"""
+import time
+
+from PyQt5.QtCore import Qt, QPointF, QRect, QRectF
+from PyQt5.QtGui import QColor, QFont, QImage, QPainter, QPen, QRegion
+
+from capture import excluded_from_capture
+from guide_geometry import (golden_positions, spiral_eye, spiral_transform,
+                            spiral_unit_paths, thirds_positions)
+
+
+# Intervalo entre análisis (ms)
+ANALYSIS_INTERVAL_MS = 100
+
+# Fracción máxima de un núcleo que puede ocupar el análisis
+MAX_CPU_SHARE = 0.25
+
+# Lado de cada sonda (fracción del lado corto de la pantalla) y muestras por lado
+ROI_FRACTION = 0.08
+ROI_SAMPLES = 32
+
+# Posición de las sondas a lo largo de cada línea (mitad de cada tramo entre
+# intersecciones) y de la curva de la espiral
+LINE_FRACTIONS = (1 / 6, 1 / 2, 5 / 6)
+SPIRAL_FRACTIONS = (0.15, 0.35, 0.55, 0.75)
+
+# Rejilla de sondas de referencia (columnas, filas) y cuántas se renuevan por análisis
+REFERENCE_GRID = (5, 4)
+REFERENCE_PER_TICK = 5
+
+# Energía mínima de referencia (niveles de gris), para pantallas casi planas
+ENERGY_FLOOR = 2.0
+
+# Energía (respecto a la referencia) con la que un indicador llega al máximo
+HEAT_SATURATION = 2.0
+
+# Niveles de calor distintos (un cambio menor no repinta el indicador)
+HEAT_STEPS = 32
+
+# Dispersión del peso de las sondas de los puntos fuertes (fracción del lado)
+POINT_SIGMA = 0.25
+
+# Peso del mejor punto fuerte en la puntuación (el resto, las líneas)
+POINT_WEIGHT = 0.6
+
+# Indicadores de los puntos fuertes
+INDICATOR_RADIUS = 18
+INDICATOR_PEN = 4
+
+# Recuadro de puntuaciones (esquina superior derecha)
+SCORE_SIZE = (210, 84)
+SCORE_MARGIN = 12
+
+# Guías que se analizan, con su nombre en el recuadro
+ANALYZED_GUIDES = (
+    ('rule_of_thirds', "Tercios"),
+    ('golden_ratio', "Áurea"),
+    ('golden_spiral', "Espiral"),
+)
+
+
+def heat_color(heat):
+    """Color de un indicador: azul (0) a rojo (1)"""
+    return QColor.fromHsvF(0.66 * (1 - heat), 0.9, 1.0, 0.9)
+
+
+class Probe:
+    """Región de pantalla que se muestrea: un punto fuerte, un tramo de línea
+    o una celda de referencia"""
+    __slots__ = ('guide', 'kind', 'center', 'rect')
+
+    def __init__(self, guide, kind, center, rect):
+        self.guide = guide
+        self.kind = kind  # 'point', 'line' o 'reference'
+        self.center = center
+        self.rect = rect
+
+
+class CompositionAnalyzer:
+    """Puntuación de composición de lo que hay bajo un OverlayWindow"""
+
+    def __init__(self, overlay):
+        self.overlay = overlay
+        self.layout_key = None
+        self.probes = []
+        self.region = QRegion()  # Indicadores y recuadro, para repintar y la máscara
+        self.error = None
+
+        # Arrays por sonda (se crean en build_layout)
+        self.thumbs = None    # Última muestra en gris (P×n×n, uint8)
+        self.weights = None   # Peso de cada muestra de energía (P×(n-1)×(n-1))
+        self.energies = None  # Energía ponderada de cada sonda
+        self.heats = None     # Calor cuantizado de cada sonda
+        self.live = None      # Sondas que se muestrean en cada análisis
+        self.references = None
+        self.reference_next = 0
+        self.reference = ENERGY_FLOOR
+
+        self.scores = {}  # guía -> puntuación 0-100
+        self.tick_ms = 0.0  # Media móvil del tiempo de un análisis
+
+    # Disposición de las sondas
+
+    def build_layout(self, width, height):
+        """Reconstruye las sondas si cambiaron el tamaño o las guías
+
+        Devuelve si cambiaron.
+        """
+        import numpy as np
+
+        state = self.overlay.state
+        key = (width, height, self.overlay.layer_key())
+        if key == self.layout_key:
+            return False
+        self.layout_key = key
+
+        side = max(8, int(min(width, height) * ROI_FRACTION))
+        bounds = QRect(0, 0, width, height)
+
+        def probe(guide, kind, x, y):
+            center = QPointF(x, y)
+            rect = QRect(int(x - side / 2), int(y - side / 2), side, side).intersected(bounds)
+            # Una sonda recortada a menos de la mitad no es representativa
+            if rect.width() >= side / 2 and rect.height() >= side / 2:
+                self.probes.append(Probe(guide, kind, center, rect))
+
+        self.probes = []
+        for guide, _ in ANALYZED_GUIDES:
+            if not state.guides.get(guide):
+                continue
+            if guide == 'golden_spiral':
+                eye = spiral_eye(width, height, state.spiral)
+                probe(guide, 'point', eye.x(), eye.y())
+                curve = spiral_transform(width, height, state.spiral).map(spiral_unit_paths()[1])
+                for fraction in SPIRAL_FRACTIONS:
+                    point = curve.pointAtPercent(fraction)
+                    probe(guide, 'line', point.x(), point.y())
+                continue
+            positions = thirds_positions if guide == 'rule_of_thirds' else golden_positions
+            xs, ys = positions(width, height)
+            for y in ys:
+                for x in xs:
+                    probe(guide, 'point', x, y)
+            for fraction in LINE_FRACTIONS:
+                for x in xs:
+                    probe(guide, 'line', x, height * fraction)
+                for y in ys:
+                    probe(guide, 'line', width * fraction, y)
+
+        if self.probes:
+            cols, rows = REFERENCE_GRID
+            for row in range(rows):
+                for col in range(cols):
+                    probe(None, 'reference', width * (col + 0.5) / cols,
+                          height * (row + 0.5) / rows)
+
+        # Indicadores y recuadro
+        self.region = QRegion()
+        rings = QRegion()
+        for p in self.probes:
+            if p.kind == 'point':
+                self.region = self.region.united(self.indicator_rect(p.center))
+                rings = rings.united(self.ring_region(p.center))
+        if self.probes:
+            self.region = self.region.united(self.score_rect(width, height))
+            rings = rings.united(self.score_rect(width, height))
+
+        count = len(self.probes)
+        n = ROI_SAMPLES
+        self.thumbs = np.zeros((count, n, n), np.uint8)
+        self.energies = np.zeros(count, np.float32)
+        self.heats = np.full(count, -1)
+        self.weights = self.build_weights(self.overlay.active_region().united(rings))
+        kinds = np.array([p.kind for p in self.probes], dtype=object)
+        self.references = np.flatnonzero(kinds == 'reference')
+        self.live = np.flatnonzero(kinds != 'reference')
+        self.reference_next = 0
+        self.scores = {}
+        return True
+
+    def build_weights(self, excluded):
+        """Peso de cada muestra de energía de cada sonda
+
+        Se excluyen las muestras que tocan la región excluded (guías e
+        indicadores), con una muestra más de margen por el suavizado del
+        escalado. Las sondas de los puntos fuertes pesan más en el centro.
+        """
+        import numpy as np
+
+        n = ROI_SAMPLES
+        centers = (np.arange(n - 1) + 1.0) / n - 0.5
+        gaussian = np.exp(-(centers[:, None] ** 2 + centers[None, :] ** 2)
+                          / (2 * POINT_SIGMA ** 2))
+        weights = np.zeros((len(self.probes), n - 1, n - 1), np.float32)
+        for index, p in enumerate(self.probes):
+            rect = p.rect
+            scale_x, scale_y = n / rect.width(), n / rect.height()
+            mask = np.zeros((n + 2, n + 2), bool)  # Con un borde para dilatar
+            for r in excluded.intersected(rect).rects():
+                left = int((r.left() - rect.left()) * scale_x)
+                right = int(np.ceil((r.right() + 1 - rect.left()) * scale_x))
+                top = int((r.top() - rect.top()) * scale_y)
+                bottom = int(np.ceil((r.bottom() + 1 - rect.top()) * scale_y))
+                mask[top + 1:bottom + 1, left + 1:right + 1] = True
+            # Dilatar una muestra en cada dirección
+            dilated = np.zeros((n, n), bool)
+            for dy in range(3):
+                for dx in range(3):
+                    dilated |= mask[dy:dy + n, dx:dx + n]
+            mask = dilated
+            valid = ~(mask[:-1, :-1] | mask[:-1, 1:] | mask[1:, :-1])
+            weight = valid * (gaussian if p.kind == 'point' else 1.0)
+            total = weight.sum()
+            if total > 0:
+                weights[index] = weight / total
+        return weights
+
+    # Análisis
+
+    def sample(self, indices):
+        """Copia y reduce las sondas indicadas; devuelve las que cambiaron"""
+        import numpy as np
+
+        screen = self.overlay.screen()
+        n = ROI_SAMPLES
+        changed = []
+        with excluded_from_capture(self.overlay):
+            for index in indices:
+                rect = self.probes[index].rect
+                pixmap = screen.grabWindow(0, rect.x(), rect.y(), rect.width(), rect.height())
+                if pixmap.isNull():
+                    raise OSError("No se pudo copiar la pantalla")
+                image = pixmap.toImage().scaled(
+                    n, n, Qt.IgnoreAspectRatio, Qt.SmoothTransformation
+                ).convertToFormat(QImage.Format_Grayscale8)
+                bits = image.constBits()
+                bits.setsize(image.byteCount())
+                thumb = np.frombuffer(bits, np.uint8).reshape(n, image.bytesPerLine())[:, :n]
+                if not np.array_equal(thumb, self.thumbs[index]):
+                    self.thumbs[index] = thumb
+                    changed.append(index)
+        return np.array(changed, dtype=np.intp)
+
+    def energy(self, indices):
+        """Energía ponderada (|dx| + |dy|) de las sondas indicadas, de una vez"""
+        import numpy as np
+
+        gray = self.thumbs[indices].astype(np.float32)
+        gradient = np.abs(np.diff(gray, axis=2))[:, :-1, :] + np.abs(np.diff(gray, axis=1))[:, :, :-1]
+        return np.einsum('pij,pij->p', gradient, self.weights[indices])
+
+    def update(self, width, height):
+        """Un análisis; devuelve la región que hay que repintar
+
+        Si el sistema no deja copiar la pantalla, deja el motivo en error
+        (se muestra en el recuadro).
+        """
+        import numpy as np
+
+        start = time.perf_counter()
+        damaged = QRegion(self.region)
+        layout_changed = self.build_layout(width, height)
+        if layout_changed:
+            damaged = damaged.united(self.region)
+        if not self.probes:
+            return damaged
+
+        # Todas las sondas de las guías y un turno de las de referencia
+        if layout_changed:
+            references = self.references
+        else:
+            count = len(self.references)
+            turn = (self.reference_next + np.arange(min(REFERENCE_PER_TICK, count))) % count
+            self.reference_next = (self.reference_next + REFERENCE_PER_TICK) % count
+            references = self.references[turn]
+        try:
+            changed = self.sample(np.concatenate([self.live, references]))
+        except OSError as e:
+            self.error = str(e)
+            return damaged.united(self.score_rect(width, height))
+        if changed.size:
+            self.energies[changed] = self.energy(changed)
+        self.reference = max(ENERGY_FLOOR, float(self.energies[self.references].mean()))
+
+        # Repintar solo los indicadores cuyo calor cambió
+        heat = np.minimum(1.0, self.energies / (self.reference * HEAT_SATURATION))
+        heats = np.round(heat * HEAT_STEPS).astype(int)
+        for index in np.flatnonzero(heats != self.heats):
+            probe = self.probes[index]
+            if probe.kind == 'point':
+                damaged = damaged.united(self.indicator_rect(probe.center))
+        self.heats = heats
+
+        scores = self.score(heat)
+        if scores != self.scores:
+            self.scores = scores
+            damaged = damaged.united(self.score_rect(width, height))
+
+        elapsed = (time.perf_counter() - start) * 1000
+        self.tick_ms = elapsed if not self.tick_ms else 0.8 * self.tick_ms + 0.2 * elapsed
+        return damaged
+
+    def score(self, heat):
+        """Puntuación 0-100 de cada guía: su mejor punto fuerte y sus líneas"""
+        scores = {}
+        for guide, _ in ANALYZED_GUIDES:
+            points = [heat[i] for i, p in enumerate(self.probes)
+                      if p.guide == guide and p.kind == 'point']
+            lines = [heat[i] for i, p in enumerate(self.probes)
+                     if p.guide == guide and p.kind == 'line']
+            if points or lines:
+                best = max(points, default=0.0)
+                along = sum(lines) / len(lines) if lines else best
+                scores[guide] = round(100 * (POINT_WEIGHT * best + (1 - POINT_WEIGHT) * along))
+        return scores
+
+    def interval_ms(self):
+        """Intervalo hasta el próximo análisis sin pasar de MAX_CPU_SHARE"""
+        return max(ANALYSIS_INTERVAL_MS, round(self.tick_ms / MAX_CPU_SHARE))
+
+    # Indicadores
+
+    def indicator_rect(self, center):
+        size = INDICATOR_RADIUS + INDICATOR_PEN
+        return QRect(int(center.x()) - size, int(center.y()) - size, 2 * size + 1, 2 * size + 1)
+
+    def ring_region(self, center):
+        """Anillo que ocupa un indicador (lo que se excluye del cálculo)"""
+        x, y = int(center.x()), int(center.y())
+        outer = INDICATOR_RADIUS + INDICATOR_PEN // 2 + 1
+        inner = INDICATOR_RADIUS - INDICATOR_PEN // 2 - 1
+        return QRegion(QRect(x - outer, y - outer, 2 * outer + 1, 2 * outer + 1), QRegion.Ellipse).subtracted(
+            QRegion(QRect(x - inner, y - inner, 2 * inner + 1, 2 * inner + 1), QRegion.Ellipse))
+
+    def score_rect(self, width, height):
+        score_w, score_h = SCORE_SIZE
+        return QRect(width - score_w - SCORE_MARGIN, SCORE_MARGIN, score_w, score_h)
+
+    def paint(self, painter, region, width, height):
+        """Dibuja los indicadores y el recuadro que toquen la región"""
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing, True)
+        for index, p in enumerate(self.probes):
+            if p.kind != 'point' or not region.intersects(self.indicator_rect(p.center)):
+                continue
+            painter.setPen(QPen(QColor(0, 0, 0, 110), INDICATOR_PEN))
+            painter.drawEllipse(p.center, INDICATOR_RADIUS, INDICATOR_RADIUS)
+            heat = max(0, self.heats[index]) / HEAT_STEPS
+            if heat > 0:
+                painter.setPen(QPen(heat_color(heat), INDICATOR_PEN, Qt.SolidLine, Qt.FlatCap))
+                ring = QRectF(p.center.x() - INDICATOR_RADIUS, p.center.y() - INDICATOR_RADIUS,
+                              2 * INDICATOR_RADIUS, 2 * INDICATOR_RADIUS)
+                # Arco proporcional al calor, desde arriba en sentido horario
+                painter.drawArc(ring, 90 * 16, -round(heat * 360 * 16))
+
+        rect = self.score_rect(width, height)
+        if (self.probes or self.error) and region.intersects(rect):
+            self.paint_scores(painter, rect)
+        painter.restore()
+
+    def paint_scores(self, painter, rect):
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        painter.fillRect(rect, QColor(0, 0, 0, 170))
+        font = QFont('Consolas')
+        font.setStyleHint(QFont.Monospace)
+        font.setPixelSize(12)
+        painter.setFont(font)
+
+        if self.error:
+            lines = [(self.error, None)]
+        else:
+            lines = [(f"{label:<8} {self.scores[guide]:3d}", self.scores[guide])
+                     for guide, label in ANALYZED_GUIDES if guide in self.scores]
+            lines.append((f"análisis {self.tick_ms:.1f} ms / {self.interval_ms()} ms", None))
+        line_h = 16
+        y = rect.top() + 6
+        for text, score in lines:
+            painter.setPen(heat_color(score / 100) if score is not None
+                           else QColor(255, 255, 255, 230))
+            painter.drawText(QRectF(rect.left() + 8, y, rect.width() - 16, line_h),
+                             Qt.AlignLeft | Qt.AlignVCenter, text)
+            y += line_h
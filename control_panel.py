@@ -3,23 +3,70 @@ Panel de Control para configurar el Overlay
 """
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGroupBox, 
                              QCheckBox, QPushButton, QLabel, QSlider, 
-                             QColorDialog, QComboBox, QSpinBox, QMessageBox)
-from PyQt5.QtCore import Qt, pyqtSignal
-from PyQt5.QtGui import QColor, QKeySequence
+                             QColorDialog, QComboBox, QSpinBox, QDoubleSpinBox,
+                             QMessageBox, QFileDialog, QInputDialog)
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 import json
 import os
 
+from capture import BURST_MAX_FRAMES, BURST_MIN_INTERVAL_MS, CAPTURE_FORMATS, CaptureManager
+from frame_regions import LETTERBOX_ASPECTS, REGION_ASPECTS, load_regions
+from overlay_state import DEFAULT_GUIDES, GUIDE_DEFINITIONS
+from preset_store import PresetStore
+from preset_watcher import PresetWatcher
+
+
+# Pasos del slider por unidad de desplazamiento de la espiral
+SPIRAL_OFFSET_STEPS = 10
+
+# Límites del aspecto personalizado del encuadre (ancho:1)
+CUSTOM_ASPECT_RANGE = (0.2, 5.0)
+
+
+def set_silently(widget, setter, value):
+    """Cambia un control sin emitir sus señales (no vuelve a aplicar el valor)"""
+    widget.blockSignals(True)
+    getattr(widget, setter)(value)
+    widget.blockSignals(False)
 
 class ControlPanel(QWidget):
     closed = pyqtSignal()
+    # Se emite cuando el panel está completo (opciones avanzadas y presets)
+    ready = pyqtSignal()
     
-    def __init__(self, overlay_window):
+    def __init__(self, overlay_window, presets=None, deferred=False, capture=None):
         super().__init__()
         self.overlay = overlay_window
-        self.presets_file = "presets.json"
+        self.presets = presets if presets is not None else PresetStore()
+        self.capture = capture if capture is not None else CaptureManager(overlay_window)
+        self.advanced_group = None
+        self.preset_watcher = None  # Se crea al abrir la biblioteca (load_presets)
         
         self.init_ui()
+        
+        # Cada control sigue solo a su campo del estado de la pantalla mostrada
+        self.overlay.subscribe('guides', self.sync_guides)
+        self.overlay.subscribe('color', self.sync_color)
+        self.overlay.subscribe('line_width', self.sync_line_width)
+        self.overlay.subscribe('opacity', self.sync_opacity)
+        self.overlay.subscribe('spiral', self.sync_spiral)
+        self.overlay.subscribe('grid', self.sync_grid)
+        self.overlay.subscribe('regions', self.sync_regions)
+        self.overlay.subscribe(('letterbox', 'fill_opacity'), self.sync_letterbox)
+        self.overlay.visibility_changed.connect(self.sync_visibility)
+        
+        if deferred:
+            # Lo poco usado y la biblioteca de presets, en cuanto el panel se
+            # haya mostrado
+            QTimer.singleShot(0, self.finish_ui)
+        else:
+            self.finish_ui()
+    
+    def finish_ui(self):
+        """Construye las opciones avanzadas y abre la biblioteca de presets"""
+        self.ensure_advanced_group()
         self.load_presets()
+        self.ready.emit()
     
     def setup_theme(self):
         """Configura el tema de colores de la interfaz"""
@@ -143,7 +190,8 @@ class ControlPanel(QWidget):
         main_layout = QVBoxLayout()
         main_layout.setSpacing(10)
         
-        
+        # Pantalla a configurar
+        main_layout.addLayout(self.create_screen_selector())
         
         # Grupo: Guías de Composición
         guides_group = self.create_guides_group()
@@ -153,9 +201,8 @@ class ControlPanel(QWidget):
         appearance_group = self.create_appearance_group()
         main_layout.addWidget(appearance_group)
         
-        # Grupo: Opciones Avanzadas
-        advanced_group = self.create_advanced_group()
-        main_layout.addWidget(advanced_group)
+        # Grupo: Opciones Avanzadas (lo construye ensure_advanced_group)
+        self.advanced_slot = main_layout.count()
         
         # Grupo: Presets
         presets_group = self.create_presets_group()
@@ -182,6 +229,27 @@ class ControlPanel(QWidget):
         main_layout.addStretch()
         self.setLayout(main_layout)
     
+    def ensure_advanced_group(self):
+        """Construye las opciones avanzadas la primera vez que hacen falta"""
+        if self.advanced_group is None:
+            self.advanced_group = self.create_advanced_group()
+            self.layout().insertWidget(self.advanced_slot, self.advanced_group)
+        return self.advanced_group
+    
+    def create_screen_selector(self):
+        """Crea el selector de pantalla (cada pantalla tiene su overlay)"""
+        layout = QHBoxLayout()
+        layout.addWidget(QLabel("🖥️ Pantalla:"))
+        self.screen_combo = QComboBox()
+        self.screen_combo.setToolTip(
+            "Pantalla cuyas guías se editan (Todas aplica los cambios a cada una)"
+        )
+        self.update_screen_combo()
+        self.screen_combo.currentIndexChanged.connect(self.select_screen)
+        self.overlay.screens_changed.connect(self.update_screen_combo)
+        layout.addWidget(self.screen_combo, 1)
+        return layout
+    
     def create_guides_group(self):
         """Crea el grupo de guías de composición"""
         group = QGroupBox("Guías de Composición")
@@ -189,23 +257,12 @@ class ControlPanel(QWidget):
         
         self.guide_checkboxes = {}
         
-        guides = [
-            ('rule_of_thirds', '📐 Regla de Tercios', 'Grid 3×3 clásico'),
-            ('golden_ratio', '✨ Proporción Áurea', 'Ratio φ (1.618)'),
-            ('center_lines', '➕ Líneas Centrales', 'Cruz central'),
-            ('diagonals', '📏 Diagonales', 'Líneas diagonales'),
-            ('golden_spiral', '🌀 Espiral Áurea', 'Espiral de Fibonacci'),
-            ('grid_4x4', '▦ Grid 4×4', 'Cuadrícula 4 filas × 4 columnas'),
-            ('grid_5x5', '▦ Grid 5×5', 'Cuadrícula 5 filas × 5 columnas'),
-            ('safe_areas', '📺 Áreas Seguras', 'Action/Title safe para video')
-        ]
-        
-        for guide_id, label, tooltip in guides:
-            checkbox = QCheckBox(label)
+        for guide_id, icon, label, tooltip in GUIDE_DEFINITIONS:
+            checkbox = QCheckBox(f"{icon} {label}")
             checkbox.setToolTip(tooltip)
             checkbox.setChecked(self.overlay.guides[guide_id])
             checkbox.stateChanged.connect(
-                lambda state, g=guide_id: self.toggle_guide(g)
+                lambda state, g=guide_id: self.overlay.set_guide(g, state == Qt.Checked)
             )
             self.guide_checkboxes[guide_id] = checkbox
             layout.addWidget(checkbox)
@@ -214,15 +271,89 @@ class ControlPanel(QWidget):
         spiral_offset_layout = QHBoxLayout()
         spiral_offset_label = QLabel("   ↔️ Desplazamiento Espiral:")
         self.spiral_offset_slider = QSlider(Qt.Horizontal)
-        self.spiral_offset_slider.setRange(0, 14)
+        # Desplazamiento continuo: el slider trabaja en décimas de unidad
+        self.spiral_offset_slider.setRange(0, 14 * SPIRAL_OFFSET_STEPS)
         self.spiral_offset_slider.setValue(0)
         self.spiral_offset_slider.valueChanged.connect(self.change_spiral_offset)
-        self.spiral_offset_value_label = QLabel("0")
+        self.spiral_offset_value_label = QLabel("0.0")
         spiral_offset_layout.addWidget(spiral_offset_label)
         spiral_offset_layout.addWidget(self.spiral_offset_slider)
         spiral_offset_layout.addWidget(self.spiral_offset_value_label)
         layout.addLayout(spiral_offset_layout)
         
+        # Orientación de la espiral
+        spiral_orientation_layout = QHBoxLayout()
+        spiral_orientation_layout.addWidget(QLabel("   🔄 Orientación:"))
+        self.spiral_rotation_combo = QComboBox()
+        self.spiral_rotation_combo.addItems(["0°", "90°", "180°", "270°"])
+        self.spiral_rotation_combo.currentIndexChanged.connect(self.change_spiral_orientation)
+        self.spiral_flip_h_checkbox = QCheckBox("↔ Voltear H")
+        self.spiral_flip_h_checkbox.stateChanged.connect(self.change_spiral_orientation)
+        self.spiral_flip_v_checkbox = QCheckBox("↕ Voltear V")
+        self.spiral_flip_v_checkbox.stateChanged.connect(self.change_spiral_orientation)
+        spiral_orientation_layout.addWidget(self.spiral_rotation_combo)
+        spiral_orientation_layout.addWidget(self.spiral_flip_h_checkbox)
+        spiral_orientation_layout.addWidget(self.spiral_flip_v_checkbox)
+        layout.addLayout(spiral_orientation_layout)
+        
+        # Medidas del grid configurable
+        self.grid_spinboxes = []
+        grid_fields = [
+            ("   ▦ Filas:", 1, 2000, "Número de filas"),
+            ("Columnas:", 1, 2000, "Número de columnas"),
+            ("   ↔ Medianil:", 0, 500, "Separación entre celdas (px)"),
+            ("Margen:", 0, 2000, "Margen exterior (px)"),
+            ("Línea base:", 0, 500, "Interlineado de la línea base (px, 0 = sin línea base)"),
+        ]
+        grid_layout = None
+        for i, (label, minimum, maximum, tooltip) in enumerate(grid_fields):
+            if i in (0, 2):
+                grid_layout = QHBoxLayout()
+                layout.addLayout(grid_layout)
+            spinbox = QSpinBox()
+            spinbox.setRange(minimum, maximum)
+            spinbox.setValue(self.overlay.grid_params[i])
+            spinbox.setToolTip(tooltip)
+            spinbox.valueChanged.connect(self.change_grid)
+            grid_layout.addWidget(QLabel(label))
+            grid_layout.addWidget(spinbox)
+            self.grid_spinboxes.append(spinbox)
+        grid_layout.addStretch()
+        
+        # Encuadre de entrega: líneas de encuadre y sombreado de lo que queda fuera
+        letterbox_layout = QHBoxLayout()
+        letterbox_layout.addWidget(QLabel("🎞️ Encuadre:"))
+        self.letterbox_combo = QComboBox()
+        self.letterbox_combo.addItems([label for label, _ in LETTERBOX_ASPECTS]
+                                      + ["Personalizado"])
+        self.letterbox_combo.setToolTip(
+            "Líneas de encuadre de un aspecto de entrega; lo que queda fuera se sombrea"
+        )
+        self.letterbox_combo.currentIndexChanged.connect(self.change_letterbox)
+        self.letterbox_spinbox = QDoubleSpinBox()
+        self.letterbox_spinbox.setRange(*CUSTOM_ASPECT_RANGE)
+        self.letterbox_spinbox.setDecimals(2)
+        self.letterbox_spinbox.setSingleStep(0.01)
+        self.letterbox_spinbox.setValue(2.0)
+        self.letterbox_spinbox.setSuffix(":1")
+        self.letterbox_spinbox.setToolTip("Aspecto personalizado (ancho por cada unidad de alto)")
+        self.letterbox_spinbox.valueChanged.connect(self.change_letterbox)
+        letterbox_layout.addWidget(self.letterbox_combo)
+        letterbox_layout.addWidget(self.letterbox_spinbox)
+        letterbox_layout.addStretch()
+        layout.addLayout(letterbox_layout)
+        
+        fill_layout = QHBoxLayout()
+        fill_layout.addWidget(QLabel("   ▒ Sombreado:"))
+        self.fill_opacity_slider = QSlider(Qt.Horizontal)
+        self.fill_opacity_slider.setRange(0, 100)
+        self.fill_opacity_slider.valueChanged.connect(self.change_fill_opacity)
+        self.fill_opacity_value_label = QLabel()
+        fill_layout.addWidget(self.fill_opacity_slider)
+        fill_layout.addWidget(self.fill_opacity_value_label)
+        layout.addLayout(fill_layout)
+        self.sync_letterbox()
+        
         group.setLayout(layout)
         return group
     
@@ -241,6 +372,15 @@ class ControlPanel(QWidget):
         color_layout.addWidget(self.color_button)
         layout.addLayout(color_layout)
         
+        # Contraste automático (blanco o negro por tramo según el fondo)
+        self.auto_contrast_checkbox = QCheckBox("🌓 Contraste automático")
+        self.auto_contrast_checkbox.setToolTip(
+            "Tiñe cada tramo de las guías de blanco o negro según el fondo que tiene debajo"
+        )
+        self.auto_contrast_checkbox.setChecked(self.overlay.auto_contrast)
+        self.auto_contrast_checkbox.stateChanged.connect(self.toggle_auto_contrast)
+        layout.addWidget(self.auto_contrast_checkbox)
+        
         # Grosor de línea
         width_layout = QHBoxLayout()
         width_label = QLabel("Grosor de Línea:")
@@ -288,12 +428,144 @@ class ControlPanel(QWidget):
         self.clickthrough_checkbox.stateChanged.connect(self.toggle_clickthrough)
         layout.addWidget(self.clickthrough_checkbox)
         
+        # Ventana dispersa
+        self.sparse_checkbox = QCheckBox("🕸️ Ventana dispersa (solo las líneas)")
+        self.sparse_checkbox.setToolTip(
+            "Recorta el overlay a las guías: los clics entre líneas pasan a las "
+            "ventanas de debajo y el compositor mezcla menos píxeles"
+        )
+        self.sparse_checkbox.stateChanged.connect(self.toggle_sparse)
+        layout.addWidget(self.sparse_checkbox)
+        
         # Visibilidad del overlay
         self.visibility_checkbox = QCheckBox("👁️ Mostrar Overlay")
-        self.visibility_checkbox.setChecked(True)
+        self.visibility_checkbox.setChecked(self.overlay.visible)
         self.visibility_checkbox.stateChanged.connect(self.toggle_visibility)
         layout.addWidget(self.visibility_checkbox)
         
+        # Perfilado de repintados
+        profiling_layout = QHBoxLayout()
+        self.profiling_checkbox = QCheckBox("📊 Perfilado de pintado (HUD)")
+        self.profiling_checkbox.setToolTip(
+            "Mide cada guía y cada repintado y muestra los datos en el overlay"
+        )
+        self.profiling_checkbox.setChecked(self.overlay.profiler.enabled)
+        self.profiling_checkbox.stateChanged.connect(self.toggle_profiling)
+        export_profile_btn = QPushButton("Exportar")
+        export_profile_btn.setToolTip("Guarda las medidas del perfilado en JSON")
+        export_profile_btn.clicked.connect(self.export_profile)
+        profiling_layout.addWidget(self.profiling_checkbox)
+        profiling_layout.addWidget(export_profile_btn)
+        layout.addLayout(profiling_layout)
+        
+        # Análisis de composición del contenido bajo el overlay
+        self.analysis_checkbox = QCheckBox("🔥 Análisis de composición")
+        self.analysis_checkbox.setToolTip(
+            "Mide el detalle de la pantalla en los puntos fuertes y las líneas de "
+            "tercios, proporción áurea y espiral, y lo muestra con indicadores de calor"
+        )
+        self.analysis_checkbox.setChecked(self.overlay.analysis)
+        self.analysis_checkbox.stateChanged.connect(self.toggle_analysis)
+        layout.addWidget(self.analysis_checkbox)
+        
+        # Regiones con guías propias (hojas de contactos, multicámara, storyboards)
+        regions_layout = QHBoxLayout()
+        self.region_drawing_checkbox = QCheckBox("🔲 Dibujar regiones")
+        self.region_drawing_checkbox.setToolTip(
+            "Arrastra sobre el overlay para enmarcar una región con sus propias guías; "
+            "clic derecho sobre una región para borrarla"
+        )
+        self.region_drawing_checkbox.stateChanged.connect(self.toggle_region_drawing)
+        self.region_aspect_combo = QComboBox()
+        self.region_aspect_combo.addItems([label for label, _ in REGION_ASPECTS])
+        self.region_aspect_combo.setToolTip("Aspecto del marco de las regiones nuevas")
+        self.region_aspect_combo.currentIndexChanged.connect(self.change_region_style)
+        regions_layout.addWidget(self.region_drawing_checkbox)
+        regions_layout.addWidget(self.region_aspect_combo)
+        layout.addLayout(regions_layout)
+        
+        region_guides_layout = QHBoxLayout()
+        region_guides_layout.addWidget(QLabel("   Guías:"))
+        self.region_guide_checkboxes = {}
+        for guide_id, icon, label, _ in GUIDE_DEFINITIONS:
+            checkbox = QCheckBox(icon)
+            checkbox.setToolTip(f"{label} en las regiones nuevas")
+            checkbox.setChecked(guide_id in DEFAULT_GUIDES)
+            checkbox.stateChanged.connect(self.change_region_style)
+            self.region_guide_checkboxes[guide_id] = checkbox
+            region_guides_layout.addWidget(checkbox)
+        region_guides_layout.addStretch()
+        layout.addLayout(region_guides_layout)
+        
+        region_buttons = QHBoxLayout()
+        load_regions_btn = QPushButton("📂 Cargar lista")
+        load_regions_btn.setToolTip(
+            "Sustituye las regiones por las de un JSON: [{\"rect\": [x, y, ancho, alto], "
+            "\"guides\": [...], \"aspect\": \"16:9\"}, ...]"
+        )
+        load_regions_btn.clicked.connect(self.load_regions_dialog)
+        clear_regions_btn = QPushButton("🗑️ Borrar")
+        clear_regions_btn.setToolTip("Borra todas las regiones")
+        clear_regions_btn.clicked.connect(self.overlay.clear_regions)
+        self.regions_label = QLabel(f"{len(self.overlay.regions)} regiones")
+        region_buttons.addWidget(load_regions_btn)
+        region_buttons.addWidget(clear_regions_btn)
+        region_buttons.addWidget(self.regions_label)
+        layout.addLayout(region_buttons)
+        
+        # Límite de frames para los controles continuos
+        fps_layout = QHBoxLayout()
+        fps_label = QLabel("⏱️ FPS máx. al arrastrar:")
+        self.max_fps_spinbox = QSpinBox()
+        self.max_fps_spinbox.setRange(0, 240)
+        self.max_fps_spinbox.setSpecialValueText("Refresco")
+        self.max_fps_spinbox.setToolTip(
+            "Límite de actualizaciones por segundo (Refresco = frecuencia de la pantalla)"
+        )
+        self.max_fps_spinbox.valueChanged.connect(self.overlay.set_max_fps)
+        fps_layout.addWidget(fps_label)
+        fps_layout.addWidget(self.max_fps_spinbox)
+        fps_layout.addStretch()
+        layout.addLayout(fps_layout)
+        
+        # Captura de pantalla con las guías
+        capture_layout = QHBoxLayout()
+        self.capture_format_combo = QComboBox()
+        self.capture_format_combo.addItems([fmt.upper() for fmt in CAPTURE_FORMATS])
+        self.capture_format_combo.setCurrentText(self.capture.image_format.upper())
+        self.capture_format_combo.currentTextChanged.connect(self.change_capture_format)
+        snapshot_btn = QPushButton("📸 Capturar")
+        snapshot_btn.setToolTip("Guarda la pantalla con las guías en la carpeta 'capturas'")
+        snapshot_btn.clicked.connect(self.take_snapshot)
+        capture_layout.addWidget(snapshot_btn)
+        capture_layout.addWidget(self.capture_format_combo)
+        layout.addLayout(capture_layout)
+        
+        burst_layout = QHBoxLayout()
+        self.burst_frames_spinbox = QSpinBox()
+        self.burst_frames_spinbox.setRange(2, BURST_MAX_FRAMES)
+        self.burst_frames_spinbox.setValue(10)
+        self.burst_frames_spinbox.setSuffix(" frames")
+        self.burst_interval_spinbox = QSpinBox()
+        self.burst_interval_spinbox.setRange(BURST_MIN_INTERVAL_MS, 10000)
+        self.burst_interval_spinbox.setSingleStep(50)
+        self.burst_interval_spinbox.setValue(250)
+        self.burst_interval_spinbox.setSuffix(" ms")
+        self.burst_btn = QPushButton("🎞️ Ráfaga")
+        self.burst_btn.setToolTip("Captura varios frames seguidos a intervalo fijo")
+        self.burst_btn.clicked.connect(self.toggle_burst)
+        burst_layout.addWidget(self.burst_btn)
+        burst_layout.addWidget(self.burst_frames_spinbox)
+        burst_layout.addWidget(self.burst_interval_spinbox)
+        layout.addLayout(burst_layout)
+        
+        self.capture_status_label = QLabel("")
+        self.capture_status_label.setWordWrap(True)
+        layout.addWidget(self.capture_status_label)
+        self.capture.saved.connect(self.capture_saved)
+        self.capture.failed.connect(self.capture_failed)
+        self.capture.burst_finished.connect(self.burst_finished)
+        
         group.setLayout(layout)
         return group
     
@@ -304,16 +576,8 @@ class ControlPanel(QWidget):
         
         # Selector de preset
         preset_layout = QHBoxLayout()
+        # La lista se rellena al abrir la biblioteca (load_presets)
         self.preset_combo = QComboBox()
-        self.preset_combo.addItems([
-            "Fotografía - Tercios",
-            "Fotografía - Áureo",
-            "Video - Safe Areas",
-            "Diseño - Grid 4x4",
-            "Diseño - Grid 5x5",
-            "Completo - Todo visible",
-            "Personalizado"
-        ])
         self.preset_combo.currentTextChanged.connect(self.apply_preset)
         
         preset_layout.addWidget(QLabel("Preset:"))
@@ -324,16 +588,26 @@ class ControlPanel(QWidget):
         preset_buttons = QHBoxLayout()
         save_preset_btn = QPushButton("💾 Guardar")
         save_preset_btn.clicked.connect(self.save_current_preset)
-        save_preset_btn.setToolTip("Guarda la configuración actual")
+        save_preset_btn.setToolTip("Guarda la configuración actual con un nombre")
         
-        load_preset_btn = QPushButton("📂 Cargar")
+        load_preset_btn = QPushButton("📂 Importar")
         load_preset_btn.clicked.connect(self.load_preset_dialog)
-        load_preset_btn.setToolTip("Carga un preset guardado")
+        load_preset_btn.setToolTip("Añade a la biblioteca un preset desde un archivo JSON")
+        
+        delete_preset_btn = QPushButton("🗑️ Eliminar")
+        delete_preset_btn.clicked.connect(self.delete_current_preset)
+        delete_preset_btn.setToolTip("Borra el preset guardado seleccionado")
         
         preset_buttons.addWidget(save_preset_btn)
         preset_buttons.addWidget(load_preset_btn)
+        preset_buttons.addWidget(delete_preset_btn)
         layout.addLayout(preset_buttons)
         
+        # Resultado de la última recarga en caliente
+        self.preset_status_label = QLabel("")
+        self.preset_status_label.setWordWrap(True)
+        layout.addWidget(self.preset_status_label)
+        
         group.setLayout(layout)
         return group
     
@@ -382,16 +656,96 @@ class ControlPanel(QWidget):
     
     # Métodos de control
     
-    def toggle_guide(self, guide_name):
-        """Activa/desactiva una guía"""
-        self.overlay.toggle_guide(guide_name)
+    def update_screen_combo(self):
+        """Rellena el selector con las pantallas conectadas"""
+        self.screen_combo.blockSignals(True)
+        self.screen_combo.clear()
+        self.screen_combo.addItem("Todas las pantallas")
+        self.screen_combo.addItems(self.overlay.screen_labels())
+        selected = self.overlay.selected
+        index = 0 if selected is None else self.overlay.overlays.index(selected) + 1
+        self.screen_combo.setCurrentIndex(index)
+        self.screen_combo.blockSignals(False)
+    
+    def select_screen(self, index):
+        """Cambia la pantalla editada y muestra sus valores"""
+        self.overlay.select(index - 1 if index > 0 else None)
+        self.refresh_controls()
+    
+    def refresh_controls(self):
+        """Sincroniza todos los controles con el overlay mostrado"""
+        self.sync_guides()
+        self.sync_color()
+        self.sync_line_width()
+        self.sync_opacity()
+        self.sync_spiral()
+        self.sync_grid()
+        self.sync_letterbox()
+        if self.advanced_group is not None:
+            set_silently(self.profiling_checkbox, 'setChecked', self.overlay.profiler.enabled)
+            set_silently(self.analysis_checkbox, 'setChecked', self.overlay.analysis)
+            self.sync_regions()
+    
+    # Sincronización con el estado: changes es {campo: valor anterior}, o
+    # None para sincronizarlo todo
+    
+    def sync_guides(self, changes=None):
+        old_guides = changes['guides'] if changes else {}
+        for guide_id, enabled in self.overlay.guides.items():
+            if old_guides.get(guide_id) != enabled:
+                set_silently(self.guide_checkboxes[guide_id], 'setChecked', enabled)
+    
+    def sync_color(self, changes=None):
+        self.update_color_button()
+    
+    def sync_line_width(self, changes=None):
+        set_silently(self.width_spinbox, 'setValue', self.overlay.line_width)
+        self.width_value_label.setText(f"{self.overlay.line_width}px")
+    
+    def sync_opacity(self, changes=None):
+        opacity = int(round(self.overlay.window_opacity * 100))
+        set_silently(self.opacity_slider, 'setValue', opacity)
+        self.opacity_value_label.setText(f"{opacity}%")
+    
+    def sync_spiral(self, changes=None):
+        offset, rotation, flip_h, flip_v = self.overlay.spiral_params()
+        set_silently(self.spiral_offset_slider, 'setValue',
+                     int(round(offset * SPIRAL_OFFSET_STEPS)))
+        set_silently(self.spiral_rotation_combo, 'setCurrentIndex', rotation // 90)
+        set_silently(self.spiral_flip_h_checkbox, 'setChecked', flip_h)
+        set_silently(self.spiral_flip_v_checkbox, 'setChecked', flip_v)
+        self.spiral_offset_value_label.setText(f"{offset:.1f}")
+    
+    def sync_grid(self, changes=None):
+        for spinbox, value in zip(self.grid_spinboxes, self.overlay.grid_params):
+            set_silently(spinbox, 'setValue', value)
+    
+    def sync_letterbox(self, changes=None):
+        aspect = self.overlay.letterbox
+        aspects = [value for _, value in LETTERBOX_ASPECTS]
+        # Un aspecto que no está en la lista (de un preset) es personalizado
+        index = aspects.index(aspect) if aspect in aspects else len(aspects)
+        set_silently(self.letterbox_combo, 'setCurrentIndex', index)
+        if index == len(aspects):
+            set_silently(self.letterbox_spinbox, 'setValue', aspect)
+        self.letterbox_spinbox.setEnabled(index == len(aspects))
+        fill_opacity = self.overlay.fill_opacity
+        set_silently(self.fill_opacity_slider, 'setValue', fill_opacity)
+        self.fill_opacity_value_label.setText(f"{fill_opacity}%")
+    
+    def sync_regions(self, changes=None):
+        if self.advanced_group is not None:
+            self.regions_label.setText(f"{len(self.overlay.regions)} regiones")
     
     def select_color(self):
         """Abre diálogo de selección de color"""
         color = QColorDialog.getColor(self.overlay.guide_color, self)
         if color.isValid():
             self.overlay.set_guide_color(color)
-            self.update_color_button()
+    
+    def toggle_auto_contrast(self, state):
+        """Activa/desactiva el contraste automático de las guías"""
+        self.overlay.set_auto_contrast(state == Qt.Checked)
     
     def update_color_button(self):
         """Actualiza el botón de color con el color actual"""
@@ -403,151 +757,282 @@ class ControlPanel(QWidget):
     
     def change_line_width(self, value):
         """Cambia el grosor de las líneas"""
-        self.overlay.set_line_width(value)
+        self.overlay.schedule('set_line_width', value)
         self.width_value_label.setText(f"{value}px")
     
     def change_opacity(self, value):
         """Cambia la opacidad"""
         opacity = value / 100
-        self.overlay.set_opacity(opacity)
+        self.overlay.schedule('set_opacity', opacity)
         self.opacity_value_label.setText(f"{value}%")
     
     def change_spiral_offset(self, value):
         """Cambia el desplazamiento horizontal de la espiral"""
-        self.overlay.set_spiral_offset(value)
-        self.spiral_offset_value_label.setText(f"{value}")
+        offset = value / SPIRAL_OFFSET_STEPS
+        self.overlay.schedule('set_spiral_offset', offset)
+        self.spiral_offset_value_label.setText(f"{offset:.1f}")
+    
+    def change_spiral_orientation(self, *args):
+        """Cambia la rotación y el volteo de la espiral"""
+        self.overlay.set_spiral_orientation(
+            self.spiral_rotation_combo.currentIndex() * 90,
+            self.spiral_flip_h_checkbox.isChecked(),
+            self.spiral_flip_v_checkbox.isChecked()
+        )
+    
+    def change_grid(self, *args):
+        """Cambia las medidas del grid configurable"""
+        self.overlay.schedule('set_grid', *(spinbox.value() for spinbox in self.grid_spinboxes))
+    
+    def change_letterbox(self, *args):
+        """Cambia el aspecto del encuadre (el de la lista o el personalizado)"""
+        index = self.letterbox_combo.currentIndex()
+        custom = index == len(LETTERBOX_ASPECTS)
+        self.letterbox_spinbox.setEnabled(custom)
+        self.overlay.set_letterbox(
+            self.letterbox_spinbox.value() if custom else LETTERBOX_ASPECTS[index][1])
+    
+    def change_fill_opacity(self, value):
+        """Cambia la opacidad del sombreado fuera del encuadre"""
+        self.overlay.schedule('set_fill_opacity', value)
+        self.fill_opacity_value_label.setText(f"{value}%")
     
     def toggle_clickthrough(self, state):
         """Activa/desactiva clic a través"""
         self.overlay.enable_click_through(state == Qt.Checked)
     
+    def toggle_sparse(self, state):
+        """Activa/desactiva el modo de ventana dispersa"""
+        self.overlay.set_sparse(state == Qt.Checked)
+    
+    def toggle_profiling(self, state):
+        """Activa/desactiva el perfilado del overlay"""
+        self.overlay.set_profiling(state == Qt.Checked)
+    
+    def toggle_analysis(self, state):
+        """Activa/desactiva el análisis de composición"""
+        self.overlay.set_analysis(state == Qt.Checked)
+    
+    def toggle_region_drawing(self, state):
+        """Activa/desactiva el dibujo de regiones con el ratón"""
+        self.overlay.set_region_drawing(state == Qt.Checked)
+    
+    def change_region_style(self, *args):
+        """Guías y aspecto de las regiones que se dibujen a partir de ahora"""
+        guides = [guide_id for guide_id, checkbox in self.region_guide_checkboxes.items()
+                  if checkbox.isChecked()]
+        aspect = REGION_ASPECTS[self.region_aspect_combo.currentIndex()][1]
+        self.overlay.set_region_style(guides, aspect)
+    
+    def load_regions_dialog(self):
+        """Sustituye las regiones por las de una lista en JSON"""
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Cargar regiones", "", "JSON (*.json)"
+        )
+        if not path:
+            return
+        try:
+            self.overlay.apply_state({'regions': load_regions(path)})
+        except Exception as e:
+            QMessageBox.warning(self, "Error", f"No se pudieron cargar las regiones:\n{e}")
+    
+    def export_profile(self):
+        """Exporta las medidas del perfilado a un archivo JSON"""
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Exportar perfil", "overlay_profile.json", "JSON (*.json)"
+        )
+        if not path:
+            return
+        try:
+            self.overlay.profiler.export_json(path)
+        except Exception as e:
+            QMessageBox.warning(self, "Error", f"No se pudo exportar el perfil:\n{e}")
+    
+    def change_capture_format(self, text):
+        """Cambia el formato de las capturas (PNG/JPG)"""
+        self.capture.image_format = text.lower()
+    
+    def take_snapshot(self):
+        """Captura la pantalla con las guías (se escribe en segundo plano)"""
+        self.capture.snapshot()
+    
+    def toggle_burst(self):
+        """Empieza o detiene una ráfaga de capturas"""
+        if self.capture.is_bursting():
+            self.capture.stop_burst()
+            return
+        self.capture.start_burst(self.burst_frames_spinbox.value(),
+                                 self.burst_interval_spinbox.value())
+        # Si el primer frame ya falló, la ráfaga ha terminado
+        if self.capture.is_bursting():
+            self.burst_btn.setText("⏹️ Detener")
+    
+    def capture_saved(self, path):
+        self.capture_status_label.setText(f"Guardada: {os.path.basename(path)}")
+    
+    def capture_failed(self, message):
+        self.capture_status_label.setText(f"Error: {message}")
+    
+    def burst_finished(self, frames):
+        self.burst_btn.setText("🎞️ Ráfaga")
+        self.capture_status_label.setText(
+            f"Ráfaga de {frames} frames en {self.capture.directory}"
+        )
+    
     def toggle_visibility(self, state):
         """Muestra/oculta el overlay"""
         if state == Qt.Checked:
             self.overlay.show()
-            self.toggle_overlay_btn.setText("👁️ Ocultar Overlay")
         else:
             self.overlay.hide()
-            self.toggle_overlay_btn.setText("👁️ Mostrar Overlay")
+    
+    def sync_visibility(self, visible):
+        """Refleja la visibilidad del overlay (también si cambia desde fuera)"""
+        if self.advanced_group is not None:
+            set_silently(self.visibility_checkbox, 'setChecked', visible)
+        self.toggle_overlay_btn.setText("👁️ Ocultar Overlay" if visible
+                                        else "👁️ Mostrar Overlay")
     
     def quick_toggle_overlay(self):
         """Toggle rápido del overlay"""
+        self.ensure_advanced_group()
         self.visibility_checkbox.setChecked(not self.visibility_checkbox.isChecked())
     
+    def update_preset_combo(self, current=None):
+        """Rellena el selector con la biblioteca de presets sin aplicar ninguno"""
+        self.preset_combo.blockSignals(True)
+        self.preset_combo.clear()
+        self.preset_combo.addItems(self.presets.names())
+        if current is not None:
+            self.preset_combo.setCurrentText(current)
+        self.preset_combo.blockSignals(False)
+        if self.preset_watcher is not None:
+            self.preset_watcher.watch(self.preset_combo.currentText())
+    
     def apply_preset(self, preset_name):
-        """Aplica un preset predefinido"""
-        # Desactivar todas las guías primero
-        for guide in self.overlay.guides:
-            self.overlay.guides[guide] = False
-        
-        # Aplicar preset específico
-        if preset_name == "Fotografía - Tercios":
-            self.overlay.guides['rule_of_thirds'] = True
-        elif preset_name == "Fotografía - Áureo":
-            self.overlay.guides['golden_ratio'] = True
-            self.overlay.guides['golden_spiral'] = True
-        elif preset_name == "Video - Safe Areas":
-            self.overlay.guides['safe_areas'] = True
-            self.overlay.guides['center_lines'] = True
-        elif preset_name == "Diseño - Grid 4x4":
-            self.overlay.guides['grid_4x4'] = True
-        elif preset_name == "Diseño - Grid 5x5":
-            self.overlay.guides['grid_5x5'] = True
-        elif preset_name == "Completo - Todo visible":
-            for guide in self.overlay.guides:
-                self.overlay.guides[guide] = True
-        
-        # Actualizar checkboxes SIN disparar eventos
-        # Bloquear señales temporalmente para evitar llamadas a toggle_guide()
-        for guide_id, checkbox in self.guide_checkboxes.items():
-            checkbox.blockSignals(True)  # Bloquear señales
-            checkbox.setChecked(self.overlay.guides[guide_id])
-            checkbox.blockSignals(False)  # Desbloquear señales
-        
-        # Forzar actualización visual del overlay
-        self.overlay.update()
+        """Aplica un preset de la biblioteca"""
+        try:
+            config = self.presets.load(preset_name)
+            # La capa del preset anterior queda en caché para volver a él sin
+            # re-rasterizar; el siguiente frame adopta la del nuevo si ya existe
+            self.apply_loaded_preset(config, keep_layer=True)
+        except (KeyError, OSError, ValueError) as e:
+            QMessageBox.warning(self, "Error", f"No se pudo aplicar el preset:\n{e}")
+            return
+        self.presets.mark_used(preset_name)
+        if self.preset_watcher is not None:
+            self.preset_watcher.watch(preset_name, config)
     
     def save_current_preset(self):
-        """Guarda la configuración actual como preset"""
-        config = {
-            'guides': self.overlay.guides.copy(),
-            'color': {
-                'r': self.overlay.guide_color.red(),
-                'g': self.overlay.guide_color.green(),
-                'b': self.overlay.guide_color.blue(),
-                'a': self.overlay.guide_color.alpha()
-            },
-            'line_width': self.overlay.line_width,
-            'opacity': self.overlay.window_opacity
-        }
+        """Guarda la configuración actual como preset con nombre"""
+        current = self.preset_combo.currentText()
+        default = "" if self.presets.is_builtin(current) else current
+        name, ok = QInputDialog.getText(self, "Guardar preset", "Nombre del preset:",
+                                        text=default)
+        name = name.strip()
+        if not ok or not name:
+            return
+        if self.presets.is_builtin(name):
+            QMessageBox.warning(self, "Error",
+                                f"'{name}' es un preset predefinido; elige otro nombre")
+            return
         
         try:
-            with open(self.presets_file, 'w') as f:
-                json.dump(config, f, indent=2)
-            QMessageBox.information(self, "Éxito", "Preset guardado correctamente")
+            self.presets.save(name, self.overlay.current_state())
         except Exception as e:
             QMessageBox.warning(self, "Error", f"No se pudo guardar el preset:\n{e}")
+            return
+        self.update_preset_combo(name)
+    
+    def delete_current_preset(self):
+        """Borra el preset guardado seleccionado"""
+        name = self.preset_combo.currentText()
+        if self.presets.is_builtin(name):
+            QMessageBox.information(self, "Info", "Los presets predefinidos no se pueden borrar")
+            return
+        answer = QMessageBox.question(self, "Eliminar preset", f"¿Borrar el preset '{name}'?")
+        if answer != QMessageBox.Yes:
+            return
+        try:
+            self.presets.delete(name)
+        except Exception as e:
+            QMessageBox.warning(self, "Error", f"No se pudo borrar el preset:\n{e}")
+        self.update_preset_combo()
     
     def load_presets(self):
-        """Carga presets desde archivo"""
-        if os.path.exists(self.presets_file):
+        """Abre la biblioteca de presets y restaura el último usado"""
+        try:
+            self.presets.import_legacy()
+        except OSError:
+            pass  # Sin permisos de escritura: se sigue sin importar
+        # Los cambios que hagan otras herramientas en la biblioteca se
+        # recargan solos
+        self.preset_watcher = PresetWatcher(self.presets, self)
+        self.preset_watcher.index_changed.connect(self.presets_changed)
+        self.preset_watcher.preset_reloaded.connect(self.preset_reloaded)
+        self.preset_watcher.failed.connect(self.preset_reload_failed)
+        last_used = self.presets.last_used
+        self.update_preset_combo(last_used)
+        if last_used is not None:
             try:
-                with open(self.presets_file, 'r') as f:
-                    config = json.load(f)
+                config = self.presets.load(last_used)
                 self.apply_loaded_preset(config)
-            except Exception as e:
-                pass  # Silencioso si no hay preset
+            except (KeyError, OSError, ValueError):
+                pass  # Silencioso si el preset no se puede leer
+            else:
+                self.preset_watcher.watch(last_used, config)
+    
+    def presets_changed(self):
+        """La biblioteca cambió en disco: actualiza la lista conservando la selección"""
+        self.update_preset_combo(self.preset_combo.currentText())
+    
+    def preset_reloaded(self, name, config):
+        """El preset seleccionado cambió en disco: aplica solo lo que difiere"""
+        if name != self.preset_combo.currentText():
+            return
+        try:
+            # Sin keep_layer: la capa actual se invalida solo donde cambian
+            # las guías, sin repintar toda la pantalla
+            changed = self.overlay.apply_state(config)
+        except ValueError as e:
+            self.preset_reload_failed(str(e))
+            return
+        # Sin cambios (p. ej. al guardarlo desde aquí) se borra el último aviso
+        self.preset_status_label.setText(
+            f"Recargado '{name}': {', '.join(sorted(changed))}" if changed else "")
+    
+    def preset_reload_failed(self, message):
+        # Sin diálogo: la herramienta que escribe puede volver a hacerlo enseguida
+        self.preset_status_label.setText(f"Sin recargar: {message}")
     
     def load_preset_dialog(self):
-        """Carga un preset desde archivo"""
-        if os.path.exists(self.presets_file):
-            try:
-                with open(self.presets_file, 'r') as f:
-                    config = json.load(f)
-                self.apply_loaded_preset(config)
-                QMessageBox.information(self, "Éxito", "Preset cargado correctamente")
-            except Exception as e:
-                QMessageBox.warning(self, "Error", f"No se pudo cargar el preset:\n{e}")
-        else:
-            QMessageBox.information(self, "Info", "No hay presets guardados")
-    
-    def apply_loaded_preset(self, config):
-        """Aplica un preset cargado"""
-        # Aplicar guías
-        if 'guides' in config:
-            for guide_id, enabled in config['guides'].items():
-                if guide_id in self.overlay.guides:
-                    self.overlay.guides[guide_id] = enabled
-                    if guide_id in self.guide_checkboxes:
-                        # Bloquear señales para evitar disparar eventos
-                        self.guide_checkboxes[guide_id].blockSignals(True)
-                        self.guide_checkboxes[guide_id].setChecked(enabled)
-                        self.guide_checkboxes[guide_id].blockSignals(False)
-        
-        # Aplicar color
-        if 'color' in config:
-            c = config['color']
-            color = QColor(c['r'], c['g'], c['b'], c['a'])
-            self.overlay.set_guide_color(color)
-            self.update_color_button()
-        
-        # Aplicar grosor
-        if 'line_width' in config:
-            self.overlay.set_line_width(config['line_width'])
-            # Bloquear señales del spinbox también
-            self.width_spinbox.blockSignals(True)
-            self.width_spinbox.setValue(config['line_width'])
-            self.width_spinbox.blockSignals(False)
-        
-        # Aplicar opacidad
-        if 'opacity' in config:
-            self.overlay.set_opacity(config['opacity'])
-            # Bloquear señales del slider
-            self.opacity_slider.blockSignals(True)
-            self.opacity_slider.setValue(int(config['opacity'] * 100))
-            self.opacity_slider.blockSignals(False)
-        
-        self.overlay.update()
+        """Importa un preset desde un archivo JSON a la biblioteca"""
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Importar preset", "", "JSON (*.json)"
+        )
+        if not path:
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+            self.overlay.validate_state(config)
+            name = os.path.splitext(os.path.basename(path))[0]
+            if self.presets.is_builtin(name):
+                name += " (importado)"
+            self.presets.save(name, config)
+        except Exception as e:
+            QMessageBox.warning(self, "Error", f"No se pudo importar el preset:\n{e}")
+            return
+        self.update_preset_combo(name)
+        self.apply_preset(name)
+    
+    def apply_loaded_preset(self, config, keep_layer=False):
+        """Aplica un preset cargado en una sola transacción (un repintado)
+
+        Lanza ValueError si el preset no es válido, sin aplicar nada. Los
+        controles se actualizan solos, cada uno con su campo.
+        """
+        self.overlay.apply_state(config, keep_layer)
     
     def close_application(self):
         """Cierra la aplicación"""
@@ -556,5 +1041,9 @@ class ControlPanel(QWidget):
     
     def closeEvent(self, event):
         """Evento de cierre de ventana"""
+        # Las capturas pendientes terminan de escribirse antes de salir
+        self.capture.close()
+        if self.preset_watcher is not None:
+            self.preset_watcher.close()
         self.closed.emit()
         event.accept()
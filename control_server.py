@@ -0,0 +1,336 @@
+"""
+Canal de control local para manejar el overlay desde otros procesos
+
+ControlServer escucha en un QLocalServer (socket Unix o tubería con nombre en
+Windows) y habla un protocolo de líneas JSON: cada petición es un objeto en
+una línea y cada respuesta otro, en el mismo orden.
+
+    → {"id": 1, "cmd": "set_guides", "guides": ["rule_of_thirds"]}
+    ← {"id": 1, "ok": true, "result": ["guides"], "version": 12}
+    ← {"id": 2, "ok": false, "error": "Guía desconocida: foo"}
+
+Se pueden encadenar peticiones sin esperar respuesta: todas las que llegan
+juntas se ejecutan seguidas y sus respuestas salen en una sola escritura, y
+como el repintado espera a la siguiente vuelta del bucle, una ráfaga de
+cambios produce un solo frame. El comando "batch" ejecuta una lista de
+comandos dentro de overlay.batch() (una transacción por pantalla).
+
+El servidor nunca activa ni sube ventanas, así que manejar el overlay desde
+otro programa no le quita el foco. ControlClient es un cliente bloqueante
+para scripts y para benchmarks/bench_ipc.py.
+"""
+import json
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtNetwork import QLocalServer, QLocalSocket
+
+from overlay_state import GUIDE_NAMES, STATE_FIELDS
+
+
+# Nombre del servidor por defecto (--control-server sin valor)
+DEFAULT_SERVER_NAME = "composition-overlay"
+
+# Una petición más larga que esto cierra la conexión (bytes)
+MAX_LINE_BYTES = 1 << 20
+
+# Espera (ms) para comprobar si otra instancia ya escucha con el mismo nombre
+PROBE_TIMEOUT_MS = 500
+
+
+class ControlServer(QObject):
+    # Se emite al aplicar un preset de la biblioteca desde el canal
+    preset_applied = pyqtSignal(str)
+
+    def __init__(self, overlay, presets, name=DEFAULT_SERVER_NAME):
+        super().__init__()
+        self.overlay = overlay
+        self.presets = presets
+        self.name = name
+        self.buffers = {}  # socket -> bytes recibidos sin línea completa
+
+        # Comandos: nombre -> método que recibe la petición y devuelve el resultado
+        self.commands = {
+            'ping': self.cmd_ping,
+            'get_state': self.cmd_get_state,
+            'apply_state': self.cmd_apply_state,
+            'set_guide': self.cmd_set_guide,
+            'toggle_guide': self.cmd_toggle_guide,
+            'set_guides': self.cmd_set_guides,
+            'preset': self.cmd_preset,
+            'presets': self.cmd_presets,
+            'visible': self.cmd_visible,
+            'batch': self.cmd_batch,
+        }
+
+        self.server = QLocalServer(self)
+        # Solo el usuario actual puede conectarse
+        self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self.accept_connections)
+
+    def listen(self):
+        """Empieza a escuchar; lanza OSError si el nombre no está disponible"""
+        # Si otra instancia responde con este nombre, borrar su socket la
+        # dejaría inaccesible y sus clientes hablarían con esta
+        probe = QLocalSocket()
+        probe.connectToServer(self.name)
+        if probe.waitForConnected(PROBE_TIMEOUT_MS):
+            probe.disconnectFromServer()
+            raise OSError(f"El canal de control '{self.name}' ya está en uso")
+        # Nadie responde: es un socket abandonado por un proceso anterior,
+        # que impediría escuchar
+        QLocalServer.removeServer(self.name)
+        if not self.server.listen(self.name):
+            raise OSError(f"No se pudo abrir el canal de control '{self.name}': "
+                          f"{self.server.errorString()}")
+        return self.server.fullServerName()
+
+    def close(self):
+        for socket in list(self.buffers):
+            socket.disconnectFromServer()
+        self.server.close()
+
+    # Conexiones
+
+    def accept_connections(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            self.buffers[socket] = b''
+            socket.readyRead.connect(lambda s=socket: self.read_requests(s))
+            socket.disconnected.connect(lambda s=socket: self.drop_connection(s))
+
+    def drop_connection(self, socket):
+        self.buffers.pop(socket, None)
+        socket.deleteLater()
+
+    def read_requests(self, socket):
+        """Ejecuta todas las líneas completas recibidas y responde de una vez"""
+        if socket not in self.buffers:
+            return
+        data = self.buffers[socket] + bytes(socket.readAll())
+        *lines, rest = data.split(b'\n')
+        if len(rest) > MAX_LINE_BYTES:
+            socket.write(self.encode({'id': None, 'ok': False,
+                                      'error': "Petición demasiado larga"}))
+            socket.flush()
+            socket.disconnectFromServer()
+            return
+        self.buffers[socket] = rest
+
+        responses = [self.reply(line) for line in lines if line.strip()]
+        if responses:
+            socket.write(b''.join(responses))
+            socket.flush()
+
+    def encode(self, response):
+        return json.dumps(response, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+    # Peticiones
+
+    def reply(self, line):
+        """Respuesta codificada de una línea
+
+        Una excepción en el slot de readyRead terminaría el proceso del
+        overlay, así que ningún error de un cliente sale de aquí.
+        """
+        try:
+            return self.encode(self.handle_line(line))
+        except Exception as e:
+            return self.encode({'id': None, 'ok': False, 'error': f"Error interno: {e}"})
+
+    def handle_line(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return {'id': None, 'ok': False, 'error': f"JSON no válido: {e}"}
+        if not isinstance(request, dict):
+            return {'id': None, 'ok': False, 'error': "La petición debe ser un objeto"}
+        return self.handle(request)
+
+    def handle(self, request):
+        """Ejecuta una petición y devuelve su respuesta (nunca lanza)"""
+        response = {'id': request.get('id')}
+        name = request.get('cmd')
+        if not isinstance(name, str):
+            response.update(ok=False, error="'cmd' debe ser el nombre de un comando")
+            return response
+        try:
+            command = self.commands.get(name)
+            if command is None:
+                response.update(ok=False, error=f"Comando desconocido: {name}")
+                return response
+            result = command(request)
+        except (KeyError, OSError, TypeError, ValueError) as e:
+            message = f"Falta el campo {e}" if isinstance(e, KeyError) else str(e)
+            response.update(ok=False, error=message)
+            return response
+        except Exception as e:
+            response.update(ok=False, error=f"Error interno: {e}")
+            return response
+        response.update(ok=True, result=result, version=self.overlay.state.version)
+        return response
+
+    # Comandos
+
+    def cmd_ping(self, request):
+        return 'pong'
+
+    def cmd_get_state(self, request):
+        """Estado de la pantalla mostrada (solo los campos pedidos, si se indican)"""
+        fields = request.get('fields') or STATE_FIELDS
+        state = self.overlay.state
+        unknown = set(fields) - set(STATE_FIELDS)
+        if unknown:
+            raise ValueError(f"Campos desconocidos: {', '.join(sorted(unknown))}")
+        current = state.to_dict()
+        return {
+            'state': {field: current[field] for field in fields},
+            'versions': {field: state.versions[field] for field in fields},
+        }
+
+    def cmd_apply_state(self, request):
+        """Aplica un estado parcial (formato de los presets); devuelve los campos cambiados"""
+        state = request['state']
+        if not isinstance(state, dict):
+            raise ValueError("'state' debe ser un objeto")
+        return sorted(self.overlay.apply_state(state, request.get('keep_layer', False)))
+
+    def cmd_set_guide(self, request):
+        enabled = request.get('enabled', True)
+        return sorted(self.overlay.apply_state({'guides': {request['guide']: enabled}}))
+
+    def cmd_toggle_guide(self, request):
+        guide = request['guide']
+        if guide not in GUIDE_NAMES:
+            raise ValueError(f"Guía desconocida: {guide}")
+        return sorted(self.overlay.apply_state(
+            {'guides': {guide: not self.overlay.guides[guide]}}
+        ))
+
+    def cmd_set_guides(self, request):
+        """Deja activas exactamente las guías indicadas (p. ej. al cambiar de plano)"""
+        guides = request['guides']
+        if not isinstance(guides, list):
+            raise ValueError("'guides' debe ser una lista de guías")
+        unknown = set(guides) - set(GUIDE_NAMES)
+        if unknown:
+            raise ValueError(f"Guía desconocida: {', '.join(sorted(unknown))}")
+        return sorted(self.overlay.apply_state(
+            {'guides': {name: name in guides for name in GUIDE_NAMES}}
+        ))
+
+    def cmd_preset(self, request):
+        """Aplica un preset de la biblioteca (sin cambiar el último usado)"""
+        name = request['name']
+        if name not in self.presets:
+            raise ValueError(f"Preset desconocido: {name}")
+        # Como en el panel, la capa del preset anterior queda en caché
+        changed = self.overlay.apply_state(self.presets.load(name), keep_layer=True)
+        self.preset_applied.emit(name)
+        return sorted(changed)
+
+    def cmd_presets(self, request):
+        return self.presets.names()
+
+    def cmd_visible(self, request):
+        """Muestra u oculta el overlay (sin activarlo); sin 'visible' solo consulta"""
+        if 'visible' in request:
+            if request['visible']:
+                self.overlay.show()
+            else:
+                self.overlay.hide()
+        return self.overlay.visible
+
+    def cmd_batch(self, request):
+        """Ejecuta una lista de comandos en una transacción; devuelve sus respuestas
+
+        Los comandos se ejecutan en orden y un error no deshace los
+        anteriores: cada uno tiene su respuesta.
+        """
+        commands = request['commands']
+        if not isinstance(commands, list):
+            raise ValueError("'commands' debe ser una lista")
+        responses = []
+        with self.overlay.batch():
+            for command in commands:
+                if not isinstance(command, dict):
+                    responses.append({'id': None, 'ok': False,
+                                      'error': "La petición debe ser un objeto"})
+                elif command.get('cmd') == 'batch':
+                    responses.append({'id': command.get('id'), 'ok': False,
+                                      'error': "Un batch no puede contener otro"})
+                else:
+                    responses.append(self.handle(command))
+        return responses
+
+
+class ControlError(RuntimeError):
+    """Respuesta de error del servidor de control"""
+
+
+class ControlClient:
+    """Cliente bloqueante del canal de control
+
+    request() envía un comando y espera su respuesta; pipeline() envía varios
+    de una vez y después lee todas las respuestas.
+    """
+
+    def __init__(self, name=DEFAULT_SERVER_NAME, timeout_ms=2000):
+        self.name = name
+        self.timeout_ms = timeout_ms
+        self.socket = QLocalSocket()
+        self.buffer = b''
+        self.next_id = 0
+
+    def connect(self):
+        self.socket.connectToServer(self.name)
+        if not self.socket.waitForConnected(self.timeout_ms):
+            raise ControlError(f"No se pudo conectar a '{self.name}': "
+                               f"{self.socket.errorString()}")
+        return self
+
+    def close(self):
+        self.socket.disconnectFromServer()
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def send(self, commands):
+        """Envía comandos ({'cmd': ..., campos}) sin esperar; devuelve sus ids"""
+        ids = []
+        data = []
+        for command in commands:
+            self.next_id += 1
+            ids.append(self.next_id)
+            data.append(json.dumps(dict(command, id=self.next_id),
+                                   separators=(',', ':')).encode('utf-8') + b'\n')
+        self.socket.write(b''.join(data))
+        self.socket.flush()
+        return ids
+
+    def receive(self, count):
+        """Lee count respuestas, en orden"""
+        responses = []
+        while len(responses) < count:
+            while b'\n' not in self.buffer:
+                if not self.socket.bytesAvailable() and \
+                        not self.socket.waitForReadyRead(self.timeout_ms):
+                    raise ControlError("Sin respuesta del servidor de control")
+                self.buffer += bytes(self.socket.readAll())
+            line, self.buffer = self.buffer.split(b'\n', 1)
+            responses.append(json.loads(line))
+        return responses
+
+    def pipeline(self, commands):
+        """Envía varios comandos de una vez; devuelve sus respuestas completas"""
+        self.send(commands)
+        return self.receive(len(commands))
+
+    def request(self, cmd, **fields):
+        """Ejecuta un comando y devuelve su resultado (ControlError si falla)"""
+        response = self.pipeline([dict(fields, cmd=cmd)])[0]
+        if not response['ok']:
+            raise ControlError(response['error'])
+        return response['result']
@@ -0,0 +1,231 @@
+"""
+Regiones con guías propias
+
+Una región es un rectángulo de la pantalla (un fotograma de una hoja de
+contactos, una cámara de una vista multicámara, una viñeta de un storyboard)
+con su propio conjunto de guías y, opcionalmente, una relación de aspecto:
+las guías enmarcan el mayor rectángulo de ese aspecto centrado en la región.
+En el estado cada región es una tupla (x, y, ancho, alto, guías, aspecto),
+con las guías en el orden de GUIDE_NAMES y el aspecto como número o None.
+
+Las guías de una región no se recalculan por región. La geometría de cada
+tamaño de marco se construye una sola vez (la espiral sale de sus caminos
+unitarios con spiral_transform) y se rasteriza una sola vez en una baldosa
+Alpha8; cada región con el mismo tamaño y las mismas guías reutiliza esa
+baldosa desplazada a su posición. Así una hoja de contactos de 100 fotogramas
+iguales cuesta una rasterización y 100 copias. Las copias se combinan con la
+máscara de la capa con un máximo de numpy: no dependen del orden y no borran
+lo que ya había (otras regiones solapadas, las guías de pantalla completa).
+"""
+import json
+import math
+from collections import OrderedDict
+
+from PyQt5.QtCore import QRect
+from PyQt5.QtGui import QImage, QPainter, QRegion
+
+from guide_geometry import GUIDE_BUILDERS, fitted_rect, guide_params
+
+
+# Relaciones de aspecto que ofrece el panel para las regiones nuevas
+REGION_ASPECTS = [
+    ('Libre', None),
+    ('16:9', 16 / 9),
+    ('4:3', 4 / 3),
+    ('3:2', 3 / 2),
+    ('1:1', 1.0),
+    ('2.39:1', 2.39),
+    ('1.85:1', 1.85),
+    ('4:5', 4 / 5),
+    ('9:16', 9 / 16),
+]
+
+# Encuadres de entrega que ofrecen el panel y el menú contextual del overlay
+LETTERBOX_ASPECTS = [
+    ('Sin encuadre', None),
+    ('2.39:1', 2.39),
+    ('1.85:1', 1.85),
+    ('16:9', 16 / 9),
+    ('4:3', 4 / 3),
+    ('1:1', 1.0),
+    ('4:5', 4 / 5),
+    ('9:16', 9 / 16),
+]
+
+# Número máximo de regiones por overlay
+MAX_REGIONS = 1000
+
+# Lado mínimo (px) de una región dibujada con el ratón
+MIN_REGION_SIZE = 16
+
+# Baldosas (tamaño de marco + guías + estilo) que se conservan (LRU)
+REGION_TILE_CACHE = 32
+
+
+def parse_aspect(value):
+    """Relación de aspecto como número, desde 1.85, '16:9', '2.39' o None
+
+    Lanza ValueError si no es un aspecto positivo.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        width, sep, height = value.partition(':')
+        try:
+            value = float(width) / float(height) if sep else float(width)
+        except (ValueError, ZeroDivisionError):
+            raise ValueError(f"Aspecto no válido: {value!r}")
+    elif isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"Aspecto no válido: {value!r}")
+    if not math.isfinite(value) or value <= 0:
+        raise ValueError(f"Aspecto no válido: {value!r}")
+    return float(value)
+
+
+def frame_rect(region):
+    """Marco de las guías de una región: el mayor rectángulo de su aspecto centrado"""
+    x, y, width, height, _, aspect = region
+    if aspect:
+        return fitted_rect(width, height, aspect).translated(x, y)
+    return QRect(x, y, width, height)
+
+
+def region_at(regions, point):
+    """Índice de la región (la última dibujada) que contiene el punto, o None"""
+    for index in range(len(regions) - 1, -1, -1):
+        x, y, width, height = regions[index][:4]
+        if QRect(x, y, width, height).contains(point):
+            return index
+    return None
+
+
+def load_regions(path):
+    """Lee una lista de regiones de un JSON: una lista o {'regions': [...]}
+
+    Cada región es {'rect': [x, y, ancho, alto], 'guides': [...], 'aspect':
+    número, 'W:H' o null}. No se valida aquí (ver OverlayState.validate).
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('regions')
+    if not isinstance(data, list):
+        raise ValueError("El archivo debe contener una lista de regiones")
+    return data
+
+
+def stamp(mask, tile, x, y, clip=None):
+    """Combina una baldosa con la máscara en (x, y) (píxeles del dispositivo)
+
+    Cada píxel se queda con la mayor de las dos coberturas. clip es una
+    lista de QRect del dispositivo a los que se limita la copia, o None.
+    """
+    import numpy as np
+
+    def pixels(image, bits):
+        bits.setsize(image.byteCount())
+        return np.frombuffer(bits, np.uint8).reshape(image.height(), image.bytesPerLine())
+
+    target = pixels(mask, mask.bits())
+    source = pixels(tile, tile.constBits())
+    bounds = QRect(x, y, tile.width(), tile.height()).intersected(
+        QRect(0, 0, mask.width(), mask.height()))
+    for rect in ([bounds] if clip is None else clip):
+        rect = rect.intersected(bounds)
+        if rect.isEmpty():
+            continue
+        left, top = rect.x(), rect.y()
+        right, bottom = left + rect.width(), top + rect.height()
+        area = target[top:bottom, left:right]
+        np.maximum(area, source[top - y:bottom - y, left - x:right - x], out=area)
+
+
+class RegionTile:
+    """Guías de un tamaño de marco: primitivas, regiones y baldosas rasterizadas
+
+    Las coordenadas son locales al marco (origen en su esquina superior
+    izquierda). La región de cada tinte y cada baldosa se calculan la
+    primera vez que se piden.
+    """
+    __slots__ = ('line_width', 'strokes', '_stroke_regions', '_regions', '_images')
+
+    def __init__(self, width, height, guides, line_width, spiral, grid):
+        self.line_width = line_width
+        self.strokes = [stroke for name in guides
+                        for stroke in GUIDE_BUILDERS[name](
+                            width, height, guide_params(name, spiral, grid))]
+        self._stroke_regions = None
+        self._regions = {}
+        self._images = {}
+
+    def tints(self):
+        """Tintes de las guías en orden de dibujado: [(tinte, color fijo o None)]"""
+        tints = {}
+        for stroke in self.strokes:
+            tints.setdefault(stroke.tint(), stroke.color)
+        return list(tints.items())
+
+    def region(self, tint=None):
+        """Región que cubren los trazos (de un tinte si se indica)"""
+        region = self._regions.get(tint)
+        if region is None:
+            # La región de cada trazo se calcula una vez para todos los tintes
+            if self._stroke_regions is None:
+                self._stroke_regions = [stroke.region(self.line_width) for stroke in self.strokes]
+            region = QRegion()
+            for stroke, stroke_region in zip(self.strokes, self._stroke_regions):
+                if tint is None or stroke.tint() == tint:
+                    region = region.united(stroke_region)
+            self._regions[tint] = region
+        return region
+
+    def image(self, tint, dpr, draw_stroke):
+        """Baldosa Alpha8 con la cobertura de un tinte y su origen lógico
+
+        draw_stroke(painter, stroke, pen, snap) es el de GuideRenderer, así
+        que las líneas se alinean a píxeles igual que las de pantalla completa.
+        """
+        key = (tint, dpr)
+        cached = self._images.get(key)
+        if cached is None:
+            bounds = self.region(tint).boundingRect()
+            image = QImage(max(1, math.ceil(bounds.width() * dpr)),
+                           max(1, math.ceil(bounds.height() * dpr)), QImage.Format_Alpha8)
+            image.fill(0)
+            image.setDevicePixelRatio(dpr)
+            painter = QPainter(image)
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.translate(-bounds.x(), -bounds.y())
+            for stroke in self.strokes:
+                if stroke.tint() == tint:
+                    draw_stroke(painter, stroke, stroke.mask_pen(self.line_width), dpr)
+            painter.end()
+            cached = self._images[key] = (image, bounds.topLeft())
+        return cached
+
+
+class RegionTiles:
+    """Caché LRU de RegionTile por tamaño de marco, guías y estilo"""
+
+    def __init__(self, keep=REGION_TILE_CACHE):
+        self.keep = keep
+        self._tiles = OrderedDict()
+
+    def get(self, width, height, guides, line_width, spiral, grid):
+        params = tuple(guide_params(name, spiral, grid) for name in guides)
+        key = (width, height, guides, line_width, params)
+        tile = self._tiles.get(key)
+        if tile is None:
+            tile = self._tiles[key] = RegionTile(width, height, guides, line_width,
+                                                 spiral, grid)
+        else:
+            self._tiles.move_to_end(key)
+        return tile
+
+    def trim(self, in_use=0):
+        """Descarta las más antiguas; se conservan in_use más keep"""
+        while len(self._tiles) > in_use + self.keep:
+            self._tiles.popitem(last=False)
+
+    def clear(self):
+        self._tiles.clear()
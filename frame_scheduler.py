@@ -0,0 +1,79 @@
+"""
+Planificador de frames para cambios de estado del overlay
+
+Los controles continuos (sliders, spinbox) pueden emitir decenas de cambios
+por intervalo de refresco. El planificador guarda solo el último valor de
+cada cambio y los aplica juntos como mucho una vez por frame. Sin cambios
+pendientes no queda ningún temporizador activo.
+"""
+import time
+
+from PyQt5.QtCore import QObject, QTimer
+from PyQt5.QtGui import QGuiApplication
+
+
+# Refresco supuesto si la pantalla no informa el suyo
+DEFAULT_REFRESH_RATE = 60.0
+
+
+class FrameScheduler(QObject):
+    """Aplica cambios pendientes como mucho una vez por frame
+
+    max_fps limita la frecuencia por debajo del refresco de la pantalla;
+    None o 0 usa el refresco de la pantalla.
+    """
+
+    def __init__(self, parent=None, max_fps=None):
+        super().__init__(parent)
+        self.max_fps = max_fps
+        self._pending = {}
+        self._last_flush = 0.0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+
+    def refresh_rate(self):
+        """Refresco de la pantalla donde está el widget padre"""
+        parent = self.parent()
+        screen = None
+        if parent is not None and hasattr(parent, 'screen'):
+            screen = parent.screen()
+        if screen is None:
+            screen = QGuiApplication.primaryScreen()
+        rate = screen.refreshRate() if screen is not None else 0
+        return rate if rate > 0 else DEFAULT_REFRESH_RATE
+
+    def frame_interval(self):
+        """Intervalo mínimo entre aplicaciones, en segundos"""
+        fps = self.refresh_rate()
+        if self.max_fps:
+            fps = min(fps, self.max_fps)
+        return 1.0 / fps
+
+    def schedule(self, key, func, *args):
+        """Programa func(*args); un cambio posterior con la misma clave lo reemplaza"""
+        # Reinsertar para conservar el orden del último cambio
+        self._pending.pop(key, None)
+        self._pending[key] = (func, args)
+        if not self._timer.isActive():
+            elapsed = time.perf_counter() - self._last_flush
+            delay = max(0.0, self.frame_interval() - elapsed)
+            self._timer.start(int(delay * 1000))
+
+    def has_pending(self):
+        return bool(self._pending)
+
+    def cancel(self, key):
+        """Descarta un cambio pendiente"""
+        self._pending.pop(key, None)
+        if not self._pending:
+            self._timer.stop()
+
+    def flush(self):
+        """Aplica ya todos los cambios pendientes"""
+        self._timer.stop()
+        pending = self._pending
+        self._pending = {}
+        self._last_flush = time.perf_counter()
+        for func, args in pending.values():
+            func(*args)
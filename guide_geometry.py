@@ -0,0 +1,785 @@
+"""
+Modelo de geometría precalculada para las guías de composición
+
+Las coordenadas de cada guía se calculan una sola vez por tamaño de ventana
+(o cambio de configuración) y se guardan como listas de QLineF/QRect y
+QPainterPath, de forma que el dibujado se reduce a unas pocas llamadas
+drawLines/drawRects/drawPath por pen. Los grids, que pueden tener miles de
+líneas, se generan con numpy (GridStroke); numpy se importa al construir el
+primer grid, así que no retrasa el arranque si no hay ninguno activo.
+"""
+import math
+
+from PyQt5.QtCore import Qt, QLineF, QPointF, QRect, QRectF
+from PyQt5.QtGui import QPainterPath, QPen, QColor, QRegion, QTransform
+
+
+PHI = 1.618033988749895  # Número áureo
+
+# Secuencia de Fibonacci usada por la espiral
+FIB = [1, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89]
+
+# Longitud máxima (px) de cada tramo al aproximar segmentos oblicuos con
+# rectángulos para las regiones de daño
+REGION_BAND = 32
+
+# Margen extra (px) para el antialiasing alrededor de cada trazo
+AA_MARGIN = 2
+
+# Tamaño del rectángulo áureo de la espiral en unidades de Fibonacci (89+55 x 89)
+SPIRAL_SIZE = (FIB[-1] + FIB[-2], FIB[-1])
+
+# Punto al que converge la espiral, entre los dos cuadrados de 1 (unidades de Fibonacci)
+SPIRAL_EYE = (89 + 13 + 2.5, 55 + 9)
+
+# Orientaciones válidas de la espiral (grados en sentido horario)
+SPIRAL_ROTATIONS = (0, 90, 180, 270)
+
+# Parámetros por defecto de la espiral: (desplazamiento, rotación, volteo H, volteo V)
+DEFAULT_SPIRAL = (0, 0, False, False)
+
+# Parámetros por defecto del grid configurable:
+# (filas, columnas, medianil px, margen px, interlineado base px; 0 = sin línea base)
+DEFAULT_GRID = (4, 4, 0, 0, 0)
+
+# Colores fijos de las áreas seguras
+ACTION_SAFE_COLOR = QColor(255, 200, 0, 150)
+TITLE_SAFE_COLOR = QColor(255, 100, 0, 150)
+
+# Tinte de los trazos que usan el color de las guías (los de color fijo se
+# identifican por su RGBA) y color con el que se rasteriza la cobertura
+GUIDE_TINT = 'guide'
+MASK_COLOR = QColor(255, 255, 255)
+
+# Coordenadas fijas de cada cuadrado en la espiral
+# Formato: (número_fibonacci, x_offset, y_offset)
+# Los offsets son en unidades de Fibonacci, se multiplicarán por 'unit'
+SPIRAL_SQUARES = [
+    # Cuadrado 89: Esquina superior izquierda (base)
+    (89, 0, 0),
+    
+    # Cuadrado 55: A la derecha del 89
+    (55, 89, 0),
+    
+    # Cuadrado 34: Debajo del 55, alineado a la derecha
+    (34, 89+55-34, 55),
+    
+    # Cuadrado 21: A la izquierda del 34, debajo del 89
+    (21, 89, 55+13),
+    
+    # Cuadrado 13: Arriba del 21, a la izquierda
+    (13, 89, 55),
+    
+    # Cuadrado 8: A la derecha del 13
+    (8, 89+ 13, 55),
+    
+    # Cuadrado 5: Arriba del 8
+    (5, 89+3+13, 55+8),
+    
+    # Cuadrado 3: A la izquierda del 5
+    (3, 89+13, 55+8+2),
+    
+    # Cuadrado 2: Debajo del 3
+    (2, 89+13, 55+8),
+
+    #Cuadro 1: Arriba del 2 se supone
+    (1,89+13+2,55+9),
+
+    #Cuaddro 1: A la derecha del 1
+    (1,89+13+2,55+8),
+]
+
+# ===== CURVA DE LA ESPIRAL =====
+# Cada arco es 1/4 de círculo que conecta la esquina de un cuadrado con la esquina del siguiente
+# Formato: (radio_fib, centro_x_offset, centro_y_offset, ángulo_inicio, ángulo_extensión)
+# Los ángulos en Qt: 0° = derecha (3 o'clock), 90° = arriba (12 o'clock)
+# Los ángulos se especifican en 1/16 de grado (por eso se multiplican por 16)
+SPIRAL_ARCS = [
+    # Arco 1: De esquina inferior izquierda del 89 → esquina superior derecha del 55
+    # Centro: esquina inferior derecha del cuadrado 89 en posición (89, 89)
+    # Radio = 89 unidades
+    # Desde la izquierda (180°) hacia arriba (90°) = -90° (sentido antihorario)
+    (89, 89, 89, 180*16, -90*16),
+    
+    # Arco 2: De esquina superior izquierda del 55 → esquina inferior derecha del 34
+    # Cuadrado 55 está en (89, 0), cuadrado 34 está en (110, 55)
+    # Centro: esquina superior derecha del 55 en posición (89+55, 55)
+    # Radio = 55 unidades
+    # Desde arriba (90°) hacia la derecha (0°) = -90° (sentido antihorario)
+    (55, 89, 55, 90*16, -90*16),
+    
+    # Arco 3: De esquina superior derecha del 34 → esquina inferior izquierda del 21
+    # Cuadrado 34 está en (110, 55), cuadrado 21 está en (89, 68)
+    # Centro: esquina superior izquierda del 34 en posición (110, 55)
+    # Radio = 34 unidades
+    # Desde la derecha (0°) hacia abajo (270°) = -90° (sentido antihorario)
+    (34, 110, 55, 0*16, -90*16),
+    
+    # Arco 4: De esquina inferior derecha del 21 → esquina superior izquierda del 13
+    # Cuadrado 21 está en (89, 68), cuadrado 13 está en (89, 55)
+    # Centro: esquina inferior izquierda del 21 en posición (89, 68+21=89)
+    # Radio = 21 unidades
+    # Desde abajo (270°) hacia la izquierda (180°) = -90° (sentido antihorario)
+    (21, 89+21, 55+13, 270*16, -90*16),
+    
+    # Arco 5: De esquina inferior izquierda del 13 → esquina superior derecha del 8
+    # Cuadrado 13 está en (89, 55), cuadrado 8 está en (102, 55)
+    # Centro: esquina inferior derecha del 13 en posición (89+13=102, 55+13=68)
+    # Radio = 13 unidades
+    # Desde la izquierda (180°) hacia arriba (90°) = -90° (sentido antihorario)
+    (13, 102, 68, 180*16, -90*16),
+    
+    # Arco 6: De esquina superior izquierda del 8 → esquina inferior derecha del 5
+    # Cuadrado 8 está en (102, 55), cuadrado 5 está en (105, 63)
+    # Centro: esquina superior derecha del 8 en posición (102+8=110, 55+8=63)
+    # Radio = 8 unidades
+    # Desde arriba (90°) hacia la derecha (0°) = -90° (sentido antihorario)
+    (8, 89+13, 63, 90*16, -90*16),
+    
+    # Arco 7: De esquina superior derecha del 5 → esquina inferior izquierda del 3
+    # Cuadrado 5 está en (105, 63), cuadrado 3 está en (102, 65)
+    # Centro: esquina superior izquierda del 5 en posición (105, 63)
+    # Radio = 5 unidades
+    # Desde la derecha (0°) hacia abajo (270°) = -90° (sentido antihorario)
+    (5, 105, 63, 0*16, -90*16),
+    
+    # Arco 8: De esquina inferior derecha del 3 → esquina superior izquierda del 2
+    # Cuadrado 3 está en (102, 65), cuadrado 2 está en (102, 63)
+    # Centro: esquina inferior izquierda del 3 en posición (102, 65+3=68)
+    # Radio = 3 unidades
+    # Desde abajo (270°) hacia la izquierda (180°) = -90° (sentido antihorario)
+    (3, 89+13+3, 55+10, 270*16, -90*16),
+
+    # Arco 9: esquina inferior izquierda del 2 → esquina superior izquierda del 1
+    # Cuadrado 2 está en (102, 63), cuadrado 1 está en (102, 60)
+    # Centro: esquina inferior izquierda del 2 en posición (102, 63+3=66)
+    # Radio = 3 unidades
+    # Desde abajo (270°) hacia la izquierda (180°) = -90° (sentido antihorario)
+    (2, 89+13+2, 55+8+2, 180*16, -90*16),
+
+    # Arco 10: esquina inferior izquierda del 1 → esquina superior izquierda del 0
+    # Cuadrado 1 está en (102, 60), cuadrado 0 está en (102, 58)
+    # Centro: esquina inferior izquierda del 1 en posición (102, 60+3=63)
+    # Radio = 3 unidades
+    # Desde abajo (270°) hacia la izquierda (180°) = -90° (sentido antihorario)
+    (1, 89+13+2, 55+8+1, 90*16, -90*16),
+
+    # Arco 11: esquina inferior izquierda del 1 → esquina superior izquierda del 0
+    # Cuadrado 1 está en (102, 60), cuadrado 0 está en (102, 58)
+    # Centro: esquina inferior izquierda del 1 en posición (102, 60+3=63)
+    # Radio = 3 unidades
+    # Desde abajo (270°) hacia la izquierda (180°) = -90° (sentido antihorario)
+    (1, 89+13+2, 55+8+1, 0*16, -90*16),
+]
+
+
+class Stroke:
+    """Grupo de primitivas que se dibujan con el mismo pen
+
+    El grosor se expresa relativo al grosor de línea configurado:
+    line_width * width_mul // width_div. Si color es None se usa el color
+    de las guías.
+    """
+    __slots__ = ('width_mul', 'width_div', 'color', 'style',
+                 'lines', 'rects', 'path', '_snapped')
+
+    def __init__(self, width_mul=1, width_div=1, color=None, style=Qt.SolidLine):
+        self.width_mul = width_mul
+        self.width_div = width_div
+        self.color = color
+        self.style = style
+        self.lines = []
+        self.rects = []
+        self.path = None
+        self._snapped = None
+
+    def pen_width(self, line_width):
+        """Grosor del pen para el grosor de línea dado"""
+        return line_width * self.width_mul // self.width_div
+
+    def pen(self, guide_color, line_width):
+        """Construye el pen de este grupo"""
+        color = guide_color if self.color is None else self.color
+        return QPen(color, self.pen_width(line_width), self.style)
+
+    def mask_pen(self, line_width):
+        """Pen opaco para rasterizar solo la cobertura del trazo"""
+        return QPen(MASK_COLOR, self.pen_width(line_width), self.style)
+
+    def snapped(self, line_width, dpr):
+        """Separa las primitivas horizontales y verticales como rellenos
+
+        Devuelve (fills, lines, rects): rectángulos enteros en píxeles del
+        dispositivo (QRect) que cubren lo mismo que el trazo (extremos
+        cuadrados incluidos) y se rellenan sin antialiasing, y las líneas y
+        rectángulos que siguen necesitando el pen. Solo los trazos continuos
+        se convierten; los discontinuos devuelven todo con el pen.
+        """
+        key = (line_width, dpr)
+        if self._snapped is not None and self._snapped[0] == key:
+            return self._snapped[1]
+        if self.style != Qt.SolidLine:
+            result = ([], self.lines, self.rects)
+        else:
+            width = self.device_width(line_width, dpr)
+            fills = []
+            lines = []
+            for line in self.lines:
+                if line.x1() == line.x2() or line.y1() == line.y2():
+                    fills.append(_snapped_segment(line.x1(), line.y1(), line.x2(),
+                                                  line.y2(), width, dpr))
+                else:
+                    lines.append(line)
+            for rect in self.rects:
+                left, top = rect.x(), rect.y()
+                right, bottom = left + rect.width(), top + rect.height()
+                fills.append(_snapped_segment(left, top, right, top, width, dpr))
+                fills.append(_snapped_segment(left, bottom, right, bottom, width, dpr))
+                fills.append(_snapped_segment(left, top, left, bottom, width, dpr))
+                fills.append(_snapped_segment(right, top, right, bottom, width, dpr))
+            result = (fills, lines, [])
+        self._snapped = (key, result)
+        return result
+
+    def device_width(self, line_width, dpr):
+        """Grosor del trazo en píxeles enteros del dispositivo"""
+        # Un pen de grosor 0 es cosmético: 1px del dispositivo
+        pen_width = self.pen_width(line_width)
+        return max(1, round(pen_width * dpr)) if pen_width else 1
+
+    def region(self, line_width):
+        """Región ocupada por el trazo, inflada por la mitad del pen"""
+        # Un pen de grosor 0 es cosmético (1px)
+        margin = max(self.pen_width(line_width), 1) / 2 + AA_MARGIN
+        rects = []
+        for line in self.lines:
+            _segment_rects(line.p1(), line.p2(), margin, rects)
+        for rect in self.rects:
+            rect = QRectF(rect)
+            corners = [rect.topLeft(), rect.topRight(),
+                       rect.bottomRight(), rect.bottomLeft()]
+            for i in range(4):
+                _segment_rects(corners[i], corners[(i + 1) % 4], margin, rects)
+        if self.path is not None:
+            for polygon in self.path.toSubpathPolygons():
+                _polyline_rects(polygon, margin, rects)
+        
+        region = QRegion()
+        for rect in rects:
+            region = region.united(rect.toAlignedRect())
+        return region
+
+    def uses_guide_color(self):
+        """Indica si el trazo se tiñe con el color de las guías"""
+        return self.color is None
+
+    def tint(self):
+        """Tinte de la máscara del trazo: GUIDE_TINT o el RGBA de su color fijo"""
+        return GUIDE_TINT if self.color is None else self.color.rgba()
+
+
+class GridStroke(Stroke):
+    """Líneas horizontales y verticales de un grid, guardadas como arrays
+
+    xs son las x de las verticales, que van de y0 a y1; ys las y de las
+    horizontales, de x0 a x1. Las primitivas alineadas y la región de daño
+    se calculan de una vez con numpy en lugar de línea a línea, así que un
+    grid de miles de líneas sigue siendo interactivo.
+    """
+    __slots__ = ('xs', 'ys', 'x_span', 'y_span')
+
+    def __init__(self, xs, ys, x_span, y_span, **kwargs):
+        super().__init__(**kwargs)
+        self.xs = xs
+        self.ys = ys
+        self.x_span = x_span
+        self.y_span = y_span
+        (x0, x1), (y0, y1) = x_span, y_span
+        # Solo para los dispositivos sin alineado (SVG, PDF): una llamada drawLines
+        self.lines = ([QLineF(x, y0, x, y1) for x in xs.tolist()]
+                      + [QLineF(x0, y, x1, y) for y in ys.tolist()])
+
+    def snapped(self, line_width, dpr):
+        """Rellenos alineados a píxeles de todas las líneas (ver Stroke.snapped)"""
+        key = (line_width, dpr)
+        if self._snapped is not None and self._snapped[0] == key:
+            return self._snapped[1]
+        width = self.device_width(line_width, dpr)
+        half = width / dpr / 2
+        (x0, x1), (y0, y1) = self.x_span, self.y_span
+        import numpy as np
+        
+        def snap(values):
+            return np.floor(np.asarray(values, dtype=float) * dpr + 0.5).astype(np.int64)
+        
+        lefts = snap(self.xs - half)
+        tops = snap(self.ys - half)
+        v_top, v_bottom = snap([y0 - half, y1 + half]).tolist()
+        h_left, h_right = snap([x0 - half, x1 + half]).tolist()
+        fills = ([QRect(x, v_top, width, v_bottom - v_top) for x in lefts.tolist()]
+                 + [QRect(h_left, y, h_right - h_left, width) for y in tops.tolist()])
+        result = (fills, [], [])
+        self._snapped = (key, result)
+        return result
+
+    def region(self, line_width):
+        """Región del grid: una banda por eje, construida sin uniones sucesivas"""
+        margin = max(self.pen_width(line_width), 1) / 2 + AA_MARGIN
+        (x0, x1), (y0, y1) = self.x_span, self.y_span
+        top, bottom = math.floor(y0 - margin), math.ceil(y1 + margin)
+        left, right = math.floor(x0 - margin), math.ceil(x1 + margin)
+        
+        vertical = QRegion()
+        vertical.setRects([QRect(start, top, end - start, bottom - top)
+                           for start, end in _merged_spans(self.xs, margin)])
+        horizontal = QRegion()
+        horizontal.setRects([QRect(left, start, right - left, end - start)
+                             for start, end in _merged_spans(self.ys, margin)])
+        return vertical.united(horizontal)
+
+
+def _merged_spans(positions, margin):
+    """Intervalos enteros [inicio, fin) que cubren las posiciones ± margin
+
+    Los que se solapan se fusionan (grids más densos que el trazo), de modo
+    que el resultado está ordenado y sin solapes, como exige QRegion.setRects.
+    """
+    if not len(positions):
+        return []
+    import numpy as np
+    starts = np.floor(np.sort(positions) - margin).astype(np.int64)
+    ends = np.maximum.accumulate(np.ceil(np.sort(positions) + margin).astype(np.int64))
+    # Empieza un intervalo nuevo donde el inicio supera el final acumulado
+    new = np.ones(len(starts), dtype=bool)
+    new[1:] = starts[1:] > ends[:-1]
+    first = np.flatnonzero(new)
+    last = np.append(first[1:] - 1, len(starts) - 1)
+    return list(zip(starts[first].tolist(), ends[last].tolist()))
+
+
+def _snap(value, dpr):
+    """Píxel del dispositivo en cuyo borde cae (redondeando) una coordenada lógica"""
+    return math.floor(value * dpr + 0.5)
+
+
+def _snapped_segment(x1, y1, x2, y2, width, dpr):
+    """Rectángulo (en píxeles del dispositivo) que cubre un segmento horizontal o vertical
+
+    Equivale al trazo con extremos cuadrados (el pen por defecto) de width
+    píxeles del dispositivo de grosor.
+    """
+    half = width / dpr / 2
+    left = _snap(min(x1, x2) - half, dpr)
+    top = _snap(min(y1, y2) - half, dpr)
+    if y1 == y2:
+        # Horizontal: el grosor ocupa exactamente width píxeles
+        right = _snap(max(x1, x2) + half, dpr)
+        bottom = top + width
+    else:
+        right = left + width
+        bottom = _snap(max(y1, y2) + half, dpr)
+    return QRect(left, top, right - left, bottom - top)
+
+
+def _segment_rects(p1, p2, margin, rects):
+    """Aproxima un segmento con rectángulos de como mucho REGION_BAND px
+
+    Las líneas horizontales y verticales producen un único rectángulo; las
+    oblicuas se parten en tramos para que la región no cubra toda su caja.
+    """
+    dx = p2.x() - p1.x()
+    dy = p2.y() - p1.y()
+    steps = 1
+    if dx and dy:
+        steps = max(1, math.ceil(max(abs(dx), abs(dy)) / REGION_BAND))
+    for i in range(steps):
+        a = QPointF(p1.x() + dx * i / steps, p1.y() + dy * i / steps)
+        b = QPointF(p1.x() + dx * (i + 1) / steps, p1.y() + dy * (i + 1) / steps)
+        rects.append(QRectF(a, b).normalized().adjusted(-margin, -margin, margin, margin))
+
+
+def _polyline_rects(polygon, margin, rects):
+    """Agrupa los vértices consecutivos de una curva aplanada en cajas
+
+    Cada caja crece mientras su lado mayor no supere REGION_BAND; así un arco
+    produce pocas cajas en lugar de una por cada segmento del aplanado.
+    """
+    def flush(x0, y0, x1, y1):
+        rects.append(QRectF(x0 - margin, y0 - margin,
+                            x1 - x0 + 2 * margin, y1 - y0 + 2 * margin))
+    
+    box = None
+    for i in range(polygon.count()):
+        point = polygon.at(i)
+        x, y = point.x(), point.y()
+        if box is None:
+            box = [x, y, x, y]
+            continue
+        grown = [min(box[0], x), min(box[1], y), max(box[2], x), max(box[3], y)]
+        if max(grown[2] - grown[0], grown[3] - grown[1]) <= REGION_BAND:
+            box = grown
+            continue
+        previous = polygon.at(i - 1)
+        if QLineF(previous, point).length() > REGION_BAND:
+            # Tramo recto largo: cerrar la caja y aproximarlo como segmento
+            flush(*box)
+            _segment_rects(previous, point, margin, rects)
+        else:
+            # La caja incluye el vértice nuevo para cubrir el segmento
+            flush(*grown)
+        box = [x, y, x, y]
+    if box is not None:
+        flush(*box)
+
+
+def strokes_region(strokes, line_width, tint=None):
+    """Unión de las regiones de una lista de Stroke (solo las de un tinte si se indica)"""
+    region = QRegion()
+    for stroke in strokes:
+        if tint is not None and stroke.tint() != tint:
+            continue
+        region = region.united(stroke.region(line_width))
+    return region
+
+
+def _points_path(points, radius):
+    """Camino con un círculo por cada punto (se dibuja en una sola llamada)"""
+    path = QPainterPath()
+    for x, y in points:
+        path.addEllipse(QPointF(int(x), int(y)), radius, radius)
+    return path
+
+
+def thirds_positions(width, height):
+    """Posiciones (x, y) de las líneas de la regla de tercios"""
+    return (width / 3, 2 * width / 3), (height / 3, 2 * height / 3)
+
+
+def golden_positions(width, height):
+    """Posiciones (x, y) de las líneas de proporción áurea"""
+    x1 = width / PHI
+    y1 = height / PHI
+    return (x1, width - x1), (y1, height - y1)
+
+
+def build_rule_of_thirds(width, height):
+    """Regla de tercios (grid 3x3) con sus puntos fuertes"""
+    xs, ys = thirds_positions(width, height)
+    lines = Stroke()
+    lines.lines = [
+        # Líneas verticales
+        QLineF(int(xs[0]), 0, int(xs[0]), height),
+        QLineF(int(xs[1]), 0, int(xs[1]), height),
+        # Líneas horizontales
+        QLineF(0, int(ys[0]), width, int(ys[0])),
+        QLineF(0, int(ys[1]), width, int(ys[1])),
+    ]
+    
+    # Puntos de intersección (puntos fuertes)
+    points = Stroke(width_mul=3)
+    points.path = _points_path([(x, y) for y in ys for x in xs], 5)
+    return [lines, points]
+
+
+def build_golden_ratio(width, height):
+    """Líneas de proporción áurea con sus intersecciones"""
+    (x1, x2), (y1, y2) = golden_positions(width, height)
+    
+    lines = Stroke()
+    lines.lines = [
+        QLineF(int(x1), 0, int(x1), height),
+        QLineF(int(x2), 0, int(x2), height),
+        QLineF(0, int(y1), width, int(y1)),
+        QLineF(0, int(y2), width, int(y2)),
+    ]
+    
+    points = Stroke(width_mul=3)
+    points.path = _points_path([(x1, y1), (x2, y1), (x1, y2), (x2, y2)], 5)
+    return [lines, points]
+
+
+def build_center_lines(width, height):
+    """Cruz central con punto en el centro"""
+    lines = Stroke()
+    lines.lines = [
+        QLineF(int(width / 2), 0, int(width / 2), height),
+        QLineF(0, int(height / 2), width, int(height / 2)),
+    ]
+    
+    point = Stroke(width_mul=4)
+    point.path = _points_path([(width / 2, height / 2)], 6)
+    return [lines, point]
+
+
+def build_diagonals(width, height):
+    """Diagonales de esquina a esquina"""
+    lines = Stroke()
+    lines.lines = [
+        QLineF(0, 0, width, height),
+        QLineF(width, 0, 0, height),
+    ]
+    return [lines]
+
+
+_spiral_unit_paths = None
+
+
+def spiral_unit_paths():
+    """Cuadrados y curva de la espiral en unidades de Fibonacci
+
+    Se construyen una sola vez; cada tamaño, desplazamiento y orientación se
+    obtiene aplicando una QTransform (ver spiral_transform).
+    """
+    global _spiral_unit_paths
+    if _spiral_unit_paths is None:
+        squares = QPainterPath()
+        for side_fib, offset_x, offset_y in SPIRAL_SQUARES:
+            squares.addRect(offset_x, offset_y, side_fib, side_fib)
+        
+        # Todos los arcos van en un único camino
+        curve = QPainterPath()
+        for radius_fib, center_x_offset, center_y_offset, start_angle, span_angle in SPIRAL_ARCS:
+            # Rectángulo que contiene el círculo del arco
+            rect = QRectF(center_x_offset - radius_fib, center_y_offset - radius_fib,
+                          radius_fib * 2, radius_fib * 2)
+            curve.arcMoveTo(rect, start_angle / 16)
+            curve.arcTo(rect, start_angle / 16, span_angle / 16)
+        _spiral_unit_paths = (squares, curve)
+    return _spiral_unit_paths
+
+
+def spiral_transform(width, height, spiral=DEFAULT_SPIRAL):
+    """Transformación de unidades de Fibonacci a píxeles de pantalla
+
+    spiral = (desplazamiento, rotación, volteo_h, volteo_v). El rectángulo
+    áureo (ya orientado) se ajusta al área disponible, se centra
+    verticalmente y se desplaza 'desplazamiento' unidades a la derecha.
+    """
+    offset, rotation, flip_h, flip_v = spiral
+    unit_w, unit_h = SPIRAL_SIZE
+    if rotation in (90, 270):
+        box_w, box_h = unit_h, unit_w
+    else:
+        box_w, box_h = unit_w, unit_h
+    
+    # Ajuste al aspecto de la ventana
+    unit = min(width / box_w, height / box_h)
+    start_y = (height - box_h * unit) / 2
+    
+    # Orientar alrededor del centro del rectángulo áureo
+    orient = (QTransform.fromTranslate(-unit_w / 2, -unit_h / 2)
+              * QTransform().rotate(rotation)
+              * QTransform.fromScale(-1 if flip_h else 1, -1 if flip_v else 1)
+              * QTransform.fromTranslate(box_w / 2, box_h / 2))
+    return (orient
+            * QTransform.fromScale(unit, unit)
+            * QTransform.fromTranslate(offset * unit, start_y))
+
+
+def spiral_eye(width, height, spiral=DEFAULT_SPIRAL):
+    """Punto de pantalla al que converge la espiral (su punto fuerte)"""
+    return spiral_transform(width, height, spiral).map(QPointF(*SPIRAL_EYE))
+
+
+def build_golden_spiral(width, height, spiral=DEFAULT_SPIRAL):
+    """Cuadrados de Fibonacci y curva de la espiral áurea"""
+    transform = spiral_transform(width, height, spiral)
+    unit_squares, unit_curve = spiral_unit_paths()
+    
+    squares = Stroke(width_div=2)
+    squares.path = transform.map(unit_squares)
+    
+    curve = Stroke()
+    curve.path = transform.map(unit_curve)
+    return [squares, curve]
+
+
+def grid_edges(length, count, gutter, margin):
+    """Bordes de las celdas a lo largo de un eje (sin los bordes de la pantalla)
+
+    count celdas entre los márgenes, separadas por gutter px; sin medianil
+    los bordes contiguos coinciden en una sola línea.
+    """
+    import numpy as np
+    count = max(1, int(count))
+    inner = length - 2 * margin
+    if inner <= 0:
+        return np.empty(0)
+    cell = (inner - gutter * (count - 1)) / count
+    if cell <= 0:
+        # El medianil no cabe: celdas sin separación
+        gutter, cell = 0, inner / count
+    starts = margin + np.arange(count) * (cell + gutter)
+    edges = np.concatenate([starts, starts + cell])
+    # Truncar como el resto de guías (el épsilon absorbe el error de redondeo)
+    edges = np.unique(np.floor(edges + 1e-6))
+    return edges[(edges > 0) & (edges < length)]
+
+
+def build_grid(width, height, rows, cols, gutter=0, margin=0, baseline=0):
+    """Grid de rows x cols con medianil, márgenes y línea base opcionales
+
+    Las posiciones se calculan con numpy y cada eje se dibuja en una sola
+    llamada, así que admite grids de cientos de filas y columnas.
+    """
+    import numpy as np
+    margin = max(0, min(margin, min(width, height) / 2))
+    xs = grid_edges(width, cols, gutter, margin)
+    ys = grid_edges(height, rows, gutter, margin)
+    if baseline > 0:
+        # Línea base: cada 'baseline' px dentro de los márgenes
+        base = np.floor(np.arange(margin + baseline, height - margin, baseline) + 1e-6)
+        ys = np.union1d(ys, base[(base > 0) & (base < height)])
+    x_span = (margin, width - margin)
+    y_span = (margin, height - margin)
+    return [GridStroke(xs, ys, x_span, y_span)]
+
+
+def build_custom_grid(width, height, grid=DEFAULT_GRID):
+    """Grid configurable: grid = (filas, columnas, medianil, margen, línea base)"""
+    return build_grid(width, height, *grid)
+
+
+def fitted_rect(width, height, aspect):
+    """Mayor rectángulo de la relación de aspecto dada centrado en width x height"""
+    if width > height * aspect:
+        frame_w, frame_h = max(1, round(height * aspect)), height
+    else:
+        frame_w, frame_h = width, max(1, round(width / aspect))
+    return QRect((width - frame_w) // 2, (height - frame_h) // 2, frame_w, frame_h)
+
+
+def build_frame_lines(width, height, aspect):
+    """Líneas de encuadre de un aspecto de entrega (sin aspecto, ninguna)"""
+    if not aspect:
+        return []
+    frame = Stroke()
+    frame.rects = [fitted_rect(width, height, aspect)]
+    return [frame]
+
+
+def letterbox_region(width, height, aspect):
+    """Zona fuera del encuadre: las bandas (arriba/abajo o a los lados) a sombrear"""
+    if not aspect:
+        return QRegion()
+    return QRegion(0, 0, width, height).subtracted(QRegion(fitted_rect(width, height, aspect)))
+
+
+def build_safe_areas(width, height):
+    """Action safe (90%) y title safe (80%)"""
+    action_margin_w = int(width * 0.05)
+    action_margin_h = int(height * 0.05)
+    title_margin_w = int(width * 0.1)
+    title_margin_h = int(height * 0.1)
+    
+    action = Stroke(color=ACTION_SAFE_COLOR)
+    action.rects = [QRect(action_margin_w, action_margin_h,
+                          width - 2 * action_margin_w,
+                          height - 2 * action_margin_h)]
+    
+    title = Stroke(color=TITLE_SAFE_COLOR, style=Qt.DashLine)
+    title.rects = [QRect(title_margin_w, title_margin_h,
+                         width - 2 * title_margin_w,
+                         height - 2 * title_margin_h)]
+    return [action, title]
+
+
+# Constructores por guía; todos reciben (width, height, params), donde params
+# son los parámetros propios de la guía (ver guide_params) o None
+GUIDE_BUILDERS = {
+    'rule_of_thirds': lambda w, h, params: build_rule_of_thirds(w, h),
+    'golden_ratio': lambda w, h, params: build_golden_ratio(w, h),
+    'center_lines': lambda w, h, params: build_center_lines(w, h),
+    'diagonals': lambda w, h, params: build_diagonals(w, h),
+    'golden_spiral': build_golden_spiral,
+    'grid_4x4': lambda w, h, params: build_grid(w, h, 4, 4),
+    'grid_5x5': lambda w, h, params: build_grid(w, h, 5, 5),
+    'custom_grid': build_custom_grid,
+    'safe_areas': lambda w, h, params: build_safe_areas(w, h),
+}
+
+
+def guide_params(guide_name, spiral=DEFAULT_SPIRAL, grid=DEFAULT_GRID):
+    """Parámetros de los que depende la geometría de una guía"""
+    if guide_name == 'golden_spiral':
+        return tuple(spiral)
+    if guide_name == 'custom_grid':
+        return tuple(grid)
+    return None
+
+
+class GuideGeometry:
+    """Caché de primitivas por guía
+
+    Cada guía se recalcula solo cuando cambia el tamaño o sus parámetros
+    propios (desplazamiento y orientación de la espiral, medidas del grid
+    configurable).
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self._regions = {}
+
+    def get(self, guide_name, width, height, spiral=DEFAULT_SPIRAL, grid=DEFAULT_GRID):
+        """Devuelve la lista de Stroke de una guía"""
+        params = guide_params(guide_name, spiral, grid)
+        return self._cached(guide_name, (width, height, params),
+                            lambda: GUIDE_BUILDERS[guide_name](width, height, params))
+
+    def get_frame_lines(self, width, height, aspect):
+        """Devuelve la lista de Stroke de las líneas de encuadre"""
+        return self._cached('frame_lines', (width, height, aspect),
+                            lambda: build_frame_lines(width, height, aspect))
+
+    def get_grid(self, width, height, rows, cols):
+        """Devuelve la lista de Stroke de un grid arbitrario"""
+        return self._cached(('grid', rows, cols), (width, height),
+                            lambda: build_grid(width, height, rows, cols))
+
+    def region(self, guide_name, width, height, line_width, spiral=DEFAULT_SPIRAL,
+               tint=None, grid=DEFAULT_GRID):
+        """Región de daño de una guía: sus primitivas infladas por el pen
+
+        Con tint se limita a los trazos de ese tinte (p. ej. GUIDE_TINT).
+        """
+        params = guide_params(guide_name, spiral, grid)
+        key = (guide_name, width, height, params, line_width, tint)
+        region = self._regions.get(key)
+        if region is None:
+            strokes = self.get(guide_name, width, height, spiral, grid)
+            region = strokes_region(strokes, line_width, tint)
+            # Limitar la caché (p. ej. al arrastrar el desplazamiento)
+            if len(self._regions) > 64:
+                self._regions.clear()
+            self._regions[key] = region
+        return region
+
+    def letterbox(self, width, height, aspect, line_width=None):
+        """Zona a sombrear fuera del encuadre o, con line_width, región de sus líneas
+
+        Se conservan las de los aspectos usados, así que alternar entre
+        ellos no recalcula nada.
+        """
+        key = ('letterbox', width, height, aspect, line_width)
+        region = self._regions.get(key)
+        if region is None:
+            if line_width is None:
+                region = letterbox_region(width, height, aspect)
+            else:
+                region = strokes_region(build_frame_lines(width, height, aspect), line_width)
+            if len(self._regions) > 64:
+                self._regions.clear()
+            self._regions[key] = region
+        return region
+
+    def _cached(self, name, key, build):
+        cached = self._cache.get(name)
+        if cached is None or cached[0] != key:
+            cached = (key, build())
+            self._cache[name] = cached
+        return cached[1]
+
+    def clear(self):
+        """Descarta toda la geometría calculada"""
+        self._cache.clear()
+        self._regions.clear()
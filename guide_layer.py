@@ -0,0 +1,487 @@
+"""
+Capa de guías pre-renderizada para el overlay
+
+Las guías se rasterizan como cobertura en máscaras de 8 bits (Format_Alpha8),
+una por color de tinte, y el color se aplica al copiar la capa. Cambiar el
+color o la opacidad de las guías solo cambia la tabla de colores con la que
+se compone la máscara, sin volver a trazar la geometría.
+
+Componer una vista indexada obliga a convertirla en cada copia, y en una
+exposición grande (4K a pantalla completa) eso no cabe en un frame. En
+cuanto una copia cubre al menos COMPOSITE_MIN_AREA de la máscara, el tinte
+guarda su composición ARGB32 premultiplicada y la usa en todas las copias
+siguientes; solo se rehace al cambiar el color y, al re-rasterizar una
+región, se actualiza solo esa región.
+
+Con el contraste automático, una misma máscara se compone con colores
+distintos por zonas (set_runs): cada color tiene su propia vista indexada de
+los mismos bytes.
+
+Los overlays de pantallas con la misma resolución, escala y guías comparten
+las máscaras a través de SharedLayers; la primera modificación de una capa
+compartida la copia antes de escribir. SharedLayers conserva además las
+últimas capas que dejaron de usarse (p. ej. las de los presets recientes),
+así que volver a ellas no vuelve a rasterizar.
+"""
+import math
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtGui import QImage, QPainter, QRegion, qRgba
+
+
+# Lado (px) de las baldosas con que se agrupan las regiones fragmentadas
+BLIT_TILE = 192
+
+# A partir de cuántos rectángulos se compone por baldosas
+BLIT_MAX_RECTS = 64
+
+# Con más rectángulos por baldosa que esto la región se considera densa (p. ej.
+# un grid fino) y se copia su rectángulo envolvente de una vez
+BLIT_DENSE_RECTS = 16
+
+# Capas sin usar que se conservan para volver a ellas (LRU)
+LAYER_CACHE_SIZE = 8
+
+# Vistas de color alternativo que se conservan por tinte
+MAX_VARIANTS = 4
+
+# Fracción del área de la máscara a partir de la cual una copia crea la
+# composición ARGB32 del tinte (~33 MB a 4K) en vez de convertir la vista
+COMPOSITE_MIN_AREA = 0.25
+
+
+def is_dense(region, tile=BLIT_TILE, per_tile=BLIT_DENSE_RECTS):
+    """Indica si la región tiene tantos rectángulos que agruparla no compensa"""
+    bounds = region.boundingRect()
+    tiles = math.ceil(bounds.width() / tile) * math.ceil(bounds.height() / tile)
+    return region.rectCount() > per_tile * max(1, tiles)
+
+
+def color_table(color):
+    """Tabla de 256 colores: cada nivel de cobertura, el color con el alfa escalado"""
+    r, g, b, a = color.red(), color.green(), color.blue(), color.alpha()
+    return [qRgba(r, g, b, a * i // 255) for i in range(256)]
+
+
+def tile_rects(region, tile=BLIT_TILE):
+    """Rectángulo envolvente de la región dentro de cada baldosa de tile px"""
+    rects = []
+    bounds = region.boundingRect()
+    for y in range(bounds.top() - bounds.top() % tile, bounds.bottom() + 1, tile):
+        # Recortar primero por filas abarata las intersecciones por baldosa
+        row = region.intersected(QRegion(bounds.left(), y, bounds.width(), tile))
+        if row.isEmpty():
+            continue
+        row_bounds = row.boundingRect()
+        for x in range(row_bounds.left() - row_bounds.left() % tile,
+                       row_bounds.right() + 1, tile):
+            rect = row.intersected(QRegion(x, y, tile, tile)).boundingRect()
+            if not rect.isEmpty():
+                rects.append(rect)
+    return rects
+
+
+class LayerData:
+    """Máscaras de cobertura de una capa, una por tinte
+
+    users cuenta las GuideLayer que la usan; con más de una no se puede
+    escribir sin copiarla antes.
+    """
+    __slots__ = ('masks', 'users', 'shared_key')
+
+    def __init__(self, masks=None):
+        self.masks = masks if masks is not None else {}
+        self.users = 0
+        self.shared_key = None
+
+    def copy(self):
+        return LayerData({tint: mask.copy() for tint, mask in self.masks.items()})
+
+
+class SharedLayers:
+    """Capas rasterizadas que pueden compartir varios overlays
+
+    Indexa cada LayerData por (ancho, alto, escala, clave de contenido).
+    Guarda las capas que algún overlay está usando y, en orden LRU, hasta
+    keep capas que ya nadie usa.
+    """
+
+    def __init__(self, keep=LAYER_CACHE_SIZE):
+        self.keep = keep
+        self._layers = {}
+        self._unused = OrderedDict()  # shared_key -> LayerData sin usuarios
+
+    def find(self, shared_key):
+        return self._layers.get(shared_key)
+
+    def publish(self, data, shared_key):
+        """Registra la capa con su clave actual (retira la anterior)"""
+        if data.shared_key == shared_key:
+            return
+        self.withdraw(data)
+        data.shared_key = shared_key
+        self._layers.setdefault(shared_key, data)
+
+    def withdraw(self, data):
+        """Retira la capa del índice (p. ej. al modificarla)"""
+        key = data.shared_key
+        if key is not None and self._layers.get(key) is data:
+            del self._layers[key]
+            self._unused.pop(key, None)
+        data.shared_key = None
+
+    def claim(self, data):
+        """Una capa conservada vuelve a usarse: sale de la LRU"""
+        if data.shared_key is not None and self._unused.get(data.shared_key) is data:
+            del self._unused[data.shared_key]
+
+    def retire(self, data):
+        """La capa se queda sin usuarios: se conserva en la LRU"""
+        key = data.shared_key
+        if key is None or self._layers.get(key) is not data:
+            return
+        self._unused[key] = data
+        self._unused.move_to_end(key)
+        while len(self._unused) > self.keep:
+            _, oldest = self._unused.popitem(last=False)
+            self.withdraw(oldest)
+
+    def unused(self):
+        """Número de capas conservadas sin usuarios"""
+        return len(self._unused)
+
+    def __len__(self):
+        return len(self._layers)
+
+
+class TintView:
+    """Vista indexada de la máscara de un tinte
+
+    La vista Indexed8 comparte los bytes de la máscara; su tabla de 256
+    colores convierte cada nivel de cobertura en el color del tinte con el
+    alfa escalado, de modo que drawImage la compone ya teñida. Cada overlay
+    tiene sus vistas (y su color) aunque comparta las máscaras.
+
+    composite es la vista ya convertida a ARGB32 premultiplicado (o None);
+    stale, la región (lógica) en que la máscara cambió desde que se hizo.
+    """
+    __slots__ = ('mask', 'view', 'rgba', 'content', 'variants', 'composite', 'stale')
+
+    def __init__(self, mask):
+        self.mask = mask
+        self.view = self.indexed_view()
+        self.rgba = None
+        self.content = QRegion()
+        self.variants = {}  # RGBA -> vista con otra tabla (contraste automático)
+        self.composite = None
+        self.stale = QRegion()
+
+    def indexed_view(self):
+        mask = self.mask
+        return QImage(mask.bits(), mask.width(), mask.height(),
+                      mask.bytesPerLine(), QImage.Format_Indexed8)
+
+    def set_color(self, color):
+        """Actualiza la tabla de colores si el tinte cambió"""
+        rgba = color.rgba()
+        if rgba == self.rgba:
+            return
+        self.view.setColorTable(color_table(color))
+        self.rgba = rgba
+        self.composite = None  # Con otro color ya no vale
+
+    def variant(self, color):
+        """Vista de la misma máscara teñida con otro color"""
+        rgba = color.rgba()
+        view = self.variants.get(rgba)
+        if view is None:
+            if len(self.variants) >= MAX_VARIANTS:
+                self.variants.clear()
+            view = self.variants[rgba] = self.indexed_view()
+            view.setColorTable(color_table(color))
+        return view
+
+    def invalidate(self, region=None):
+        """La máscara cambió en la región (lógica), o entera si es None"""
+        if self.composite is None:
+            return
+        if region is None:
+            self.composite = None
+        else:
+            self.stale = self.stale.united(region)
+
+    def composed(self):
+        """Composición ARGB32 premultiplicada de la vista, al día con la máscara"""
+        dpr = self.mask.devicePixelRatio()
+        if self.composite is None:
+            self.composite = self.view.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+            self.composite.setDevicePixelRatio(dpr)
+            self.stale = QRegion()
+        elif not self.stale.isEmpty():
+            stale = self.stale
+            rects = (stale.rects() if stale.rectCount() <= BLIT_MAX_RECTS
+                     else [stale.boundingRect()])
+            painter = QPainter(self.composite)
+            painter.setCompositionMode(QPainter.CompositionMode_Source)
+            for rect in rects:
+                source = QRectF(rect.x() * dpr, rect.y() * dpr,
+                                rect.width() * dpr, rect.height() * dpr)
+                painter.drawImage(QRectF(rect), self.view, source)
+            painter.end()
+            self.stale = QRegion()
+        return self.composite
+
+
+class GuideLayer:
+    """Máscaras con las guías ya rasterizadas.
+
+    Las máscaras se regeneran enteras solo cuando cambia el tamaño o la
+    escala del dispositivo. Los cambios de configuración invalidan únicamente
+    la región afectada, que se vuelve a rasterizar recortada al pedir la
+    capa. Si la clave de contenido cambia sin que se haya declarado ninguna
+    invalidación (p. ej. al modificar los atributos directamente), se
+    regenera todo.
+
+    Con shared (un SharedLayers), antes de rasterizar se busca una capa ya
+    rasterizada por otro overlay, o conservada de un uso reciente, con el
+    mismo tamaño, escala y clave.
+    """
+
+    def __init__(self, shared=None):
+        self._shared = shared
+        self._data = None
+        self._views = {}
+        self._tints = []
+        self._runs = {}
+        self._size_key = None
+        self._key = None
+        self._dirty = QRegion()
+        self._declared = False
+        self._full = True
+
+    def invalidate(self, region=None):
+        """Marca una región (o toda la capa si es None) para re-rasterizar"""
+        if region is None:
+            self._full = True
+        else:
+            self._dirty = self._dirty.united(region)
+            self._declared = True
+
+    def detach(self):
+        """Suelta la capa actual sin modificarla (p. ej. al cambiar de preset)
+
+        La capa queda conservada en el SharedLayers para volver a ella; la
+        siguiente get() adopta una capa ya rasterizada para la nueva clave o
+        rasteriza una nueva entera.
+        """
+        self._release_data()
+        self._full = True
+
+    def get(self, width, height, dpr, key, paint_func, tints):
+        """Prepara la capa para la clave dada, rasterizándola si hace falta
+
+        paint_func(painter, width, height, region, tint) dibuja en
+        coordenadas lógicas la cobertura de las guías de un tinte; region es
+        None en un renderizado completo o la región recortada a actualizar.
+        tints es la lista ordenada de (tinte, QColor, región cubierta) con
+        que se compone cada máscara.
+        """
+        size_key = (width, height, dpr)
+        if (self._data is None or self._size_key != size_key
+                or (self._key != key and not self._declared)):
+            self._full = True
+        needs_render = self._full or not self._dirty.isEmpty()
+
+        shared_key = (size_key, key)
+        if needs_render and self._shared is not None:
+            # Otro overlay idéntico ya la rasterizó
+            data = self._shared.find(shared_key)
+            if data is not None and data is not self._data:
+                self._use(data)
+                needs_render = False
+
+        if needs_render:
+            if self._data is None or (self._data.users > 1 and self._full):
+                self._use(LayerData())
+            elif self._data.users > 1:
+                # Copia al escribir: la capa la siguen usando otros overlays
+                self._use(self._data.copy())
+            elif self._shared is not None:
+                # Se modifica en el sitio: deja de valer para su clave anterior
+                self._shared.withdraw(self._data)
+            region = None if self._full else self._dirty
+            if region is not None and region.rectCount() > BLIT_MAX_RECTS:
+                # Recortar a una región muy fragmentada es más lento que
+                # rasterizar de nuevo todo su rectángulo envolvente
+                region = QRegion(region.boundingRect())
+            self._render(width, height, dpr, paint_func, tints, region)
+            rendered = True
+        else:
+            rendered = False
+        if self._shared is not None:
+            self._shared.publish(self._data, shared_key)
+
+        views = {}
+        for tint, color, content in tints:
+            view = self._views.get(tint)
+            mask = self._data.masks[tint]
+            if view is None or view.mask is not mask:
+                view = TintView(mask)
+            elif rendered:
+                # Re-rasterizada en el sitio: la composición ya no vale ahí
+                view.invalidate(region)
+            view.set_color(color)
+            view.content = content
+            views[tint] = view
+        self._views = views
+        self._tints = [tint for tint, _, _ in tints]
+        self._size_key = size_key
+        self._key = key
+        self._dirty = QRegion()
+        self._declared = False
+        self._full = False
+
+    def _use(self, data):
+        """Pasa a usar otra LayerData, soltando la actual"""
+        self._release_data()
+        if self._shared is not None and data.users == 0:
+            self._shared.claim(data)
+        data.users += 1
+        self._data = data
+
+    def _release_data(self):
+        if self._data is None:
+            return
+        self._data.users -= 1
+        if self._data.users == 0 and self._shared is not None:
+            self._shared.retire(self._data)
+        self._data = None
+
+    def _render(self, width, height, dpr, paint_func, tints, region):
+        """Rasteriza la cobertura en toda la capa o solo en una región"""
+        image_w = max(1, round(width * dpr))
+        image_h = max(1, round(height * dpr))
+
+        masks = {}
+        for tint, _, _ in tints:
+            mask = self._data.masks.get(tint)
+            if mask is None or mask.width() != image_w or mask.height() != image_h:
+                # Máscara nueva: vacía, así que basta con pintar la región
+                mask = QImage(image_w, image_h, QImage.Format_Alpha8)
+                mask.fill(0)
+            elif region is None:
+                # Reutilizar el buffer si el tamaño no cambió
+                mask.fill(0)
+            mask.setDevicePixelRatio(dpr)
+            masks[tint] = mask
+
+            painter = QPainter(mask)
+            if region is not None:
+                # Borrar solo la zona sucia y recortar el dibujado a ella
+                painter.setClipRegion(region)
+                painter.setCompositionMode(QPainter.CompositionMode_Clear)
+                painter.fillRect(region.boundingRect(), Qt.transparent)
+                painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+            painter.setRenderHint(QPainter.Antialiasing)
+            paint_func(painter, width, height, region, tint)
+            painter.end()
+
+        # Los tintes que ya no usa ninguna guía activa se descartan
+        self._data.masks = masks
+
+    def blit(self, painter, region):
+        """Compone sobre el painter, teñida, la región expuesta que tiene guías
+
+        El painter debe estar recortado a la región (como en un paintEvent):
+        con regiones fragmentadas se copia el rectángulo envolvente de cada
+        baldosa, que puede salirse de ella.
+        """
+        for tint in self._tints:
+            tint_view = self._views[tint]
+            area = region.intersected(tint_view.content)
+            if area.isEmpty():
+                continue
+            for color, run_region in self._runs.get(tint, ()):
+                run_area = area.intersected(run_region)
+                if not run_area.isEmpty():
+                    self._blit_area(painter, tint_view.mask, tint_view.variant(color),
+                                    run_area, exact=True)
+                    area = area.subtracted(run_region)
+            if not area.isEmpty():
+                self._blit_area(painter, tint_view.mask, tint_view.view, area,
+                                exact=tint in self._runs, tint_view=tint_view)
+
+    def _blit_area(self, painter, mask, view, area, exact=False, tint_view=None):
+        """Copia una vista en el área; con exact no se sale de ella
+
+        Las zonas de colores distintos de un mismo tinte son contiguas, así
+        que las copias por baldosa o envolventes se recortan a su zona. Con
+        tint_view (la vista principal del tinte) se copia su composición
+        ARGB32 si ya existe o si la copia es lo bastante grande para crearla.
+        """
+        # La conversión de la vista indexada cuesta según el área copiada:
+        # pocos rectángulos exactos, una copia por baldosa si hay muchos o
+        # el rectángulo envolvente si la región es densa
+        if area.rectCount() <= BLIT_MAX_RECTS:
+            rects = area.rects()
+            exact = False
+        elif is_dense(area):
+            rects = [area.boundingRect()]
+        else:
+            rects = tile_rects(area)
+        dpr = mask.devicePixelRatio()
+        if tint_view is not None:
+            if tint_view.composite is None:
+                copied = sum(rect.width() * rect.height() for rect in rects) * dpr * dpr
+                if copied >= COMPOSITE_MIN_AREA * mask.width() * mask.height():
+                    view = tint_view.composed()
+            else:
+                view = tint_view.composed()
+        if exact:
+            painter.save()
+            painter.setClipRegion(area, Qt.IntersectClip)
+        for rect in rects:
+            source = QRectF(rect.x() * dpr, rect.y() * dpr,
+                            rect.width() * dpr, rect.height() * dpr)
+            painter.drawImage(QRectF(rect), view, source)
+        if exact:
+            painter.restore()
+
+    def set_runs(self, tint, runs):
+        """Colores por zonas para un tinte: [(QColor, región)], o None
+
+        Lo que no cae en ninguna zona se compone con el color del tinte.
+        """
+        if runs:
+            self._runs[tint] = runs
+        else:
+            self._runs.pop(tint, None)
+
+    def covered(self, xs, ys):
+        """Indica qué puntos (arrays de coordenadas lógicas) tapa alguna guía"""
+        import numpy as np
+
+        hits = np.zeros(len(xs), bool)
+        for tint_view in self._views.values():
+            mask = tint_view.mask
+            dpr = mask.devicePixelRatio()
+            cols = np.clip((xs * dpr).astype(np.intp), 0, mask.width() - 1)
+            rows = np.clip((ys * dpr).astype(np.intp), 0, mask.height() - 1)
+            bits = mask.constBits()
+            bits.setsize(mask.byteCount())
+            coverage = np.frombuffer(bits, np.uint8).reshape(mask.height(), mask.bytesPerLine())
+            hits |= coverage[rows, cols] > 0
+        return hits
+
+    def release(self):
+        """Libera la memoria de la capa"""
+        self._release_data()
+        self._views = {}
+        self._tints = []
+        self._runs = {}
+        self._size_key = None
+        self._key = None
+        self._dirty = QRegion()
+        self._declared = False
+        self._full = True
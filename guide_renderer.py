@@ -0,0 +1,471 @@
+"""
+Renderizador de guías independiente de la ventana de overlay
+
+Dibuja las guías sobre cualquier QPaintDevice (QImage, QSvgGenerator,
+QPdfWriter o un QWidget), de modo que se pueden generar plantillas sin
+abrir la ventana a pantalla completa.
+
+Además de las guías de pantalla completa dibuja las de cada región (ver
+frame_regions): las primitivas de cada tamaño de marco se calculan una vez y
+se instancian en cada región con una traslación.
+
+El encuadre de entrega (letterbox) son unas líneas de encuadre, que van en
+la máscara como cualquier guía, y el sombreado de lo que queda fuera. El
+sombreado no se rasteriza en la capa: es una QRegion precalculada de dos
+bandas que se rellena con un color liso en una sola llamada al pintar, que
+cuesta mucho menos que componer una máscara del mismo tamaño.
+"""
+import math
+import time
+
+from PyQt5.QtCore import Qt, QSize, QRect, QRectF, QSizeF, QMarginsF
+from PyQt5.QtGui import (QColor, QImage, QPainter, QPaintEngine, QPdfWriter, QPageSize,
+                         QPageLayout, QRegion, QTransform)
+
+from frame_regions import RegionTiles, frame_rect, stamp
+from guide_geometry import GuideGeometry, GUIDE_TINT
+
+
+# Entradas de la caché de instancias y regiones de daño de las regiones
+REGION_CACHE_SIZE = 16
+
+# Color del sombreado fuera del encuadre (el alfa sale de fill_opacity)
+SHADE_COLOR = QColor(0, 0, 0)
+
+
+def pixel_snap_ratio(painter):
+    """Escala del dispositivo si conviene alinear a píxeles, o None
+
+    Solo en dispositivos raster (ventana, QImage) sin transformación propia;
+    las salidas vectoriales (SVG, PDF) conservan las líneas tal cual.
+    """
+    if painter.paintEngine().type() != QPaintEngine.Raster:
+        return None
+    if not painter.worldTransform().isIdentity():
+        return None
+    return painter.device().devicePixelRatioF()
+
+
+def device_rect(rect, dpr):
+    """Píxeles del dispositivo que toca un rectángulo lógico"""
+    left, top = math.floor(rect.x() * dpr), math.floor(rect.y() * dpr)
+    right = math.ceil((rect.x() + rect.width()) * dpr)
+    bottom = math.ceil((rect.y() + rect.height()) * dpr)
+    return QRect(left, top, right - left, bottom - top)
+
+
+class GuideRenderer:
+    """Dibuja las guías activas de una configuración sobre un QPainter
+
+    config es cualquier objeto con guides, guide_color, line_width,
+    grid_params, regions, letterbox, fill_opacity y spiral_params(),
+    normalmente un OverlayState.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.geometry = GuideGeometry()
+        self.region_tiles = RegionTiles()
+        self._instances = {}
+        self._region_areas = {}
+        # PaintProfiler opcional que recibe el tiempo de cada draw_*
+        self.profiler = None
+
+    def paint(self, painter, width, height, region=None):
+        """Dibuja todas las guías activas
+
+        Con una región dada se omiten las guías que no la tocan.
+        """
+        self.paint_shade(painter, width, height, region)
+        for guide_name, enabled in self.config.guides.items():
+            if not enabled:
+                continue
+            if region is not None and not region.intersects(
+                    self.guide_region(guide_name, width, height)):
+                continue
+            if self.profiler is not None and self.profiler.enabled:
+                start = time.perf_counter()
+                self.draw_guide(painter, guide_name, width, height)
+                self.profiler.time_guide(guide_name, time.perf_counter() - start)
+            else:
+                self.draw_guide(painter, guide_name, width, height)
+        if self.config.regions:
+            self.paint_regions(painter, region)
+        if self.config.letterbox:
+            self.draw_strokes(painter, self.frame_line_strokes(width, height))
+
+    def paint_mask(self, painter, width, height, region=None, tint=GUIDE_TINT):
+        """Dibuja la cobertura de los trazos de un tinte con pen opaco
+
+        Es lo que rasteriza la capa del overlay: el color se aplica después,
+        al componer la máscara.
+        """
+        timed = self.profiler is not None and self.profiler.enabled
+        if self.config.regions:
+            start = time.perf_counter() if timed else 0
+            self.paint_region_masks(painter, region, tint)
+            if timed:
+                self.profiler.time_guide('regions', time.perf_counter() - start)
+        snap = pixel_snap_ratio(painter)
+        for guide_name, enabled in self.config.guides.items():
+            if not enabled:
+                continue
+            if region is not None and not region.intersects(
+                    self.guide_region(guide_name, width, height)):
+                continue
+            start = time.perf_counter() if timed else 0
+            for stroke in self.guide_strokes(guide_name, width, height):
+                if stroke.tint() == tint:
+                    self.draw_stroke(painter, stroke,
+                                     stroke.mask_pen(self.config.line_width), snap)
+            if timed:
+                self.profiler.time_guide(guide_name, time.perf_counter() - start)
+        if self.config.letterbox and tint == GUIDE_TINT:
+            for stroke in self.frame_line_strokes(width, height):
+                self.draw_stroke(painter, stroke,
+                                 stroke.mask_pen(self.config.line_width), snap)
+
+    def tints(self, width, height):
+        """Tintes de las guías activas en orden de dibujado
+
+        Devuelve [(tinte, QColor, región)], con la región que cubren los
+        trazos de cada tinte.
+        """
+        colors = {}
+        for guide_name, enabled in self.config.guides.items():
+            if not enabled:
+                continue
+            for stroke in self.guide_strokes(guide_name, width, height):
+                tint = stroke.tint()
+                if tint not in colors:
+                    colors[tint] = (self.config.guide_color if tint == GUIDE_TINT
+                                    else stroke.color)
+        for _, tile in self.region_instances():
+            for tint, color in tile.tints():
+                if tint not in colors:
+                    colors[tint] = self.config.guide_color if tint == GUIDE_TINT else color
+        if self.config.letterbox and GUIDE_TINT not in colors:
+            colors[GUIDE_TINT] = self.config.guide_color
+        return [(tint, color, self.active_region(width, height, tint=tint))
+                for tint, color in colors.items()]
+
+    def guide_strokes(self, guide_name, width, height):
+        """Primitivas precalculadas de una guía"""
+        return self.geometry.get(guide_name, width, height, self.config.spiral_params(),
+                                 self.config.grid_params)
+
+    def guide_region(self, guide_name, width, height, line_width=None,
+                     spiral=None, tint=None, grid=None):
+        """Región que ocupa una guía con el estilo indicado"""
+        if line_width is None:
+            line_width = self.config.line_width
+        if spiral is None:
+            spiral = self.config.spiral_params()
+        if grid is None:
+            grid = self.config.grid_params
+        return self.geometry.region(guide_name, width, height, line_width,
+                                    spiral, tint, grid)
+
+    def active_region(self, width, height, line_width=None, tint=None):
+        """Unión de las regiones de todas las guías activas (las de las regiones incluidas)"""
+        region = QRegion()
+        for guide_name, enabled in self.config.guides.items():
+            if enabled:
+                region = region.united(self.guide_region(
+                    guide_name, width, height, line_width,
+                    tint=tint
+                ))
+        if self.config.regions:
+            region = region.united(self.regions_region(line_width, tint))
+        if self.config.letterbox and tint in (None, GUIDE_TINT):
+            region = region.united(self.frame_lines_region(
+                width, height, self.config.letterbox, line_width))
+        return region
+
+    # Encuadre de entrega: líneas de encuadre y sombreado exterior
+
+    def frame_line_strokes(self, width, height):
+        """Líneas de encuadre del aspecto actual (lista de Stroke)"""
+        return self.geometry.get_frame_lines(width, height, self.config.letterbox)
+
+    def frame_lines_region(self, width, height, aspect, line_width=None):
+        """Región que ocupan las líneas de encuadre de un aspecto (None = ninguna)"""
+        if not aspect:
+            return QRegion()
+        if line_width is None:
+            line_width = self.config.line_width
+        return self.geometry.letterbox(width, height, aspect, line_width)
+
+    def shade_region(self, width, height, aspect=None, fill_opacity=None):
+        """Zona sombreada fuera del encuadre; vacía sin encuadre o sin opacidad
+
+        Sin argumentos usa el encuadre y la opacidad actuales; con ellos sirve
+        para calcular lo que se sombreaba antes de un cambio.
+        """
+        if aspect is None:
+            aspect = self.config.letterbox
+        if fill_opacity is None:
+            fill_opacity = self.config.fill_opacity
+        if not aspect or not fill_opacity:
+            return QRegion()
+        return self.geometry.letterbox(width, height, aspect)
+
+    def shade_color(self):
+        color = QColor(SHADE_COLOR)
+        color.setAlpha(round(255 * self.config.fill_opacity / 100))
+        return color
+
+    def paint_shade(self, painter, width, height, region=None):
+        """Sombrea lo que queda fuera del encuadre con un solo drawRects"""
+        area = self.shade_region(width, height)
+        if region is not None:
+            area = area.intersected(region)
+        if area.isEmpty():
+            return
+        painter.save()
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(self.shade_color())
+        painter.drawRects(area.rects())
+        painter.restore()
+
+    # Regiones con guías propias
+
+    def region_instances(self, regions=None, line_width=None, spiral=None, grid=None):
+        """Marco (QRect) y RegionTile de cada región con guías
+
+        Sin argumentos usa las regiones y el estilo actuales; con ellos sirve
+        para calcular lo que cubrían antes de un cambio.
+        """
+        key = self._regions_key(regions, line_width, spiral, grid)
+        instances = self._instances.get(key)
+        if instances is None:
+            regions, line_width, spiral, grid = key
+            instances = []
+            for region in regions:
+                if region[4]:
+                    frame = frame_rect(region)
+                    instances.append((frame, self.region_tiles.get(
+                        frame.width(), frame.height(), region[4], line_width, spiral, grid)))
+            # Las baldosas en uso no se descartan, por muchas que sean
+            self.region_tiles.trim(len({id(tile) for _, tile in instances}))
+            if len(self._instances) >= REGION_CACHE_SIZE:
+                self._instances.clear()
+            self._instances[key] = instances
+        return instances
+
+    def _regions_key(self, regions, line_width, spiral, grid):
+        """(regiones, grosor, espiral, grid) con los valores actuales donde falten"""
+        return (self.config.regions if regions is None else regions,
+                self.config.line_width if line_width is None else line_width,
+                self.config.spiral_params() if spiral is None else spiral,
+                self.config.grid_params if grid is None else grid)
+
+    def regions_region(self, line_width=None, tint=None, regions=None, spiral=None, grid=None):
+        """Unión de lo que cubren las guías de las regiones (ver region_instances)"""
+        key = self._regions_key(regions, line_width, spiral, grid) + (tint,)
+        region = self._region_areas.get(key)
+        if region is None:
+            # Uniones por parejas: con cientos de regiones, unir una a una
+            # a la región acumulada crece de forma cuadrática
+            regions = [tile.region(tint).translated(frame.topLeft())
+                       for frame, tile in self.region_instances(*key[:4])]
+            while len(regions) > 1:
+                regions = [a.united(b) for a, b in zip(regions[::2], regions[1::2])] \
+                    + regions[len(regions) & ~1:]
+            region = regions[0] if regions else QRegion()
+            if len(self._region_areas) >= REGION_CACHE_SIZE:
+                self._region_areas.clear()
+            self._region_areas[key] = region
+        return region
+
+    def paint_regions(self, painter, region=None):
+        """Dibuja las guías de las regiones, cada una trasladada a su marco"""
+        timed = self.profiler is not None and self.profiler.enabled
+        start = time.perf_counter() if timed else 0
+        for frame, tile in self.region_instances():
+            if region is not None and not region.intersects(
+                    tile.region().boundingRect().translated(frame.topLeft())):
+                continue
+            painter.save()
+            painter.translate(frame.topLeft())
+            self.draw_strokes(painter, tile.strokes)
+            painter.restore()
+        if timed:
+            self.profiler.time_guide('regions', time.perf_counter() - start)
+
+    def paint_region_masks(self, painter, region, tint):
+        """Combina en la máscara que se está pintando las baldosas de un tinte
+
+        Cada región copia la baldosa ya rasterizada de su tamaño de marco;
+        con region solo se toca lo que cae dentro (el resto de la máscara no
+        se ha borrado).
+        """
+        mask = painter.device()
+        dpr = mask.devicePixelRatioF()
+        for frame, tile in self.region_instances():
+            bounds = tile.region(tint).boundingRect()
+            if bounds.isEmpty():
+                continue
+            bounds.translate(frame.topLeft())
+            clip = None
+            if region is not None:
+                if not region.intersects(bounds):
+                    continue
+                clip = [device_rect(rect, dpr)
+                        for rect in region.intersected(QRegion(bounds)).rects()]
+            image, origin = tile.image(tint, dpr, self.draw_stroke)
+            stamp(mask, image, round((frame.x() + origin.x()) * dpr),
+                  round((frame.y() + origin.y()) * dpr), clip)
+
+    def draw_guide(self, painter, guide_name, width, height):
+        """Dibuja una guía por nombre"""
+        if guide_name == 'rule_of_thirds':
+            self.draw_rule_of_thirds(painter, width, height)
+        elif guide_name == 'golden_ratio':
+            self.draw_golden_ratio(painter, width, height)
+        elif guide_name == 'center_lines':
+            self.draw_center_lines(painter, width, height)
+        elif guide_name == 'diagonals':
+            self.draw_diagonals(painter, width, height)
+        elif guide_name == 'golden_spiral':
+            self.draw_golden_spiral(painter, width, height)
+        elif guide_name == 'grid_4x4':
+            self.draw_grid(painter, width, height, 4, 4)
+        elif guide_name == 'grid_5x5':
+            self.draw_grid(painter, width, height, 5, 5)
+        elif guide_name == 'custom_grid':
+            self.draw_custom_grid(painter, width, height)
+        elif guide_name == 'safe_areas':
+            self.draw_safe_areas(painter, width, height)
+
+    def draw_strokes(self, painter, strokes):
+        """Dibuja grupos de primitivas precalculadas, una llamada por tipo"""
+        snap = pixel_snap_ratio(painter)
+        for stroke in strokes:
+            self.draw_stroke(painter, stroke, stroke.pen(
+                self.config.guide_color, self.config.line_width), snap)
+
+    def draw_stroke(self, painter, stroke, pen, snap=None):
+        """Dibuja un grupo de primitivas con el pen dado
+
+        Con snap (la escala del dispositivo) las líneas horizontales y
+        verticales y los rectángulos se rellenan alineados a píxeles y sin
+        antialiasing; el antialiasing queda para diagonales, arcos y marcas.
+        Los rellenos están en píxeles del dispositivo: con la escala deshecha
+        drawRects recibe rectángulos enteros y usa el relleno rápido de Qt.
+        """
+        lines, rects = stroke.lines, stroke.rects
+        if snap is not None:
+            fills, lines, rects = stroke.snapped(self.config.line_width, snap)
+            if fills:
+                antialias = painter.testRenderHint(QPainter.Antialiasing)
+                painter.setRenderHint(QPainter.Antialiasing, False)
+                painter.setPen(Qt.NoPen)
+                painter.setBrush(pen.color())
+                # Sobre la traslación que tenga el painter (baldosas de regiones)
+                transform = painter.worldTransform()
+                painter.setWorldTransform(QTransform.fromScale(1 / snap, 1 / snap) * transform)
+                painter.drawRects(fills)
+                painter.setWorldTransform(transform)
+                painter.setBrush(Qt.NoBrush)
+                painter.setRenderHint(QPainter.Antialiasing, antialias)
+        painter.setPen(pen)
+        if lines:
+            painter.drawLines(lines)
+        if rects:
+            painter.drawRects(rects)
+        if stroke.path is not None:
+            painter.drawPath(stroke.path)
+
+    def draw_rule_of_thirds(self, painter, width, height):
+        """Dibuja la regla de tercios (grid 3x3)"""
+        self.draw_strokes(painter, self.geometry.get('rule_of_thirds', width, height))
+
+    def draw_golden_ratio(self, painter, width, height):
+        """Dibuja rectángulos de proporción áurea"""
+        self.draw_strokes(painter, self.geometry.get('golden_ratio', width, height))
+
+    def draw_center_lines(self, painter, width, height):
+        """Dibuja líneas centrales (cruz)"""
+        self.draw_strokes(painter, self.geometry.get('center_lines', width, height))
+
+    def draw_diagonals(self, painter, width, height):
+        """Dibuja líneas diagonales"""
+        self.draw_strokes(painter, self.geometry.get('diagonals', width, height))
+
+    def draw_golden_spiral(self, painter, width, height):
+        """Dibuja cuadrados de Fibonacci (espiral áurea)"""
+        self.draw_strokes(painter, self.geometry.get(
+            'golden_spiral', width, height, self.config.spiral_params()
+        ))
+
+    def draw_grid(self, painter, width, height, rows, cols):
+        """Dibuja un grid personalizado"""
+        self.draw_strokes(painter, self.geometry.get_grid(width, height, rows, cols))
+
+    def draw_custom_grid(self, painter, width, height):
+        """Dibuja el grid configurable (filas, columnas, medianil, márgenes y línea base)"""
+        self.draw_strokes(painter, self.geometry.get(
+            'custom_grid', width, height, grid=self.config.grid_params
+        ))
+
+    def draw_safe_areas(self, painter, width, height):
+        """Dibuja áreas seguras (útil para video)"""
+        self.draw_strokes(painter, self.geometry.get('safe_areas', width, height))
+
+    # Salidas sin ventana
+
+    def render_to_device(self, device, width, height, background=None):
+        """Dibuja las guías sobre cualquier QPaintDevice
+
+        width y height son el tamaño lógico de las guías; el dispositivo se
+        escala si su tamaño en píxeles es distinto (p. ej. QPdfWriter).
+        """
+        painter = QPainter(device)
+        painter.setRenderHint(QPainter.Antialiasing)
+
+        # Escalar al dispositivo si no trabaja en las mismas unidades
+        device_w = device.width()
+        device_h = device.height()
+        if device_w and device_h and (device_w, device_h) != (width, height):
+            painter.scale(device_w / width, device_h / height)
+
+        if background is not None:
+            painter.fillRect(QRectF(0, 0, width, height), background)
+        self.paint(painter, width, height)
+        painter.end()
+
+    def render_image(self, width, height, dpr=1.0, background=None):
+        """Renderiza las guías en una QImage transparente"""
+        image = QImage(max(1, round(width * dpr)), max(1, round(height * dpr)),
+                       QImage.Format_ARGB32_Premultiplied)
+        image.setDevicePixelRatio(dpr)
+        image.fill(Qt.transparent)
+
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.Antialiasing)
+        if background is not None:
+            painter.fillRect(QRectF(0, 0, width, height), background)
+        self.paint(painter, width, height)
+        painter.end()
+        return image
+
+    def render_svg(self, path, width, height, background=None, title="Guías de composición"):
+        """Escribe las guías como SVG vectorial"""
+        # Importación local: QtSvg solo se necesita para esta salida
+        from PyQt5.QtSvg import QSvgGenerator
+
+        generator = QSvgGenerator()
+        generator.setFileName(path)
+        generator.setSize(QSize(width, height))
+        generator.setViewBox(QRect(0, 0, width, height))
+        generator.setTitle(title)
+        self.render_to_device(generator, width, height, background)
+
+    def render_pdf(self, path, width, height, background=None, resolution=72):
+        """Escribe las guías como PDF de una página del tamaño indicado"""
+        writer = QPdfWriter(path)
+        writer.setResolution(resolution)
+        writer.setPageSize(QPageSize(QSizeF(width, height), QPageSize.Point))
+        writer.setPageMargins(QMarginsF(0, 0, 0, 0), QPageLayout.Point)
+        self.render_to_device(writer, width, height, background)
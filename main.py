@@ -2,35 +2,192 @@
 Aplicación de Overlay con Guías de Composición Fotográfica
 Usando PyQt5 para mayor funcionalidad y control
 """
+import time
+
+# Referencia de --profile-startup (antes de cualquier otra importación)
+LAUNCHED = time.perf_counter()
+
+import argparse
+import multiprocessing
 import sys
-from PyQt5.QtWidgets import QApplication
-from control_panel import ControlPanel
-from overlay_window import OverlayWindow
+
+
+# Si ningún overlay llega a pintar (p. ej. sin pantallas), el panel se
+# construye igualmente pasado este tiempo (ms)
+PANEL_FALLBACK_MS = 1000
+
 
 class CompositionOverlayApp:
-    def __init__(self):
-        self.app = QApplication(sys.argv)
+    def __init__(self, argv, profile_startup=False, control_server=None):
+        # Importaciones locales: el modo por lotes no necesita widgets
+        from startup_profile import StartupProfile
+        self.startup = StartupProfile(profile_startup, LAUNCHED)
+
+        from PyQt5.QtCore import QTimer
+        from PyQt5.QtWidgets import QApplication
+        from overlay_manager import OverlayManager
+        from preset_store import PresetStore
+        self.startup.mark("importaciones")
+
+        self.app = QApplication(argv)
         self.app.setApplicationName("Composition Overlay")
-        
-        # Crear ventana de overlay (siempre al frente)
-        self.overlay = OverlayWindow()
-        
-        # Crear panel de control
-        self.control_panel = ControlPanel(self.overlay)
+        self.startup.mark("QApplication")
+
+        # Crear un overlay por pantalla (siempre al frente)
+        self.overlay = OverlayManager()
+
+        # El último preset se aplica antes del primer frame para que no se
+        # vean un instante las guías por defecto; el resto de la biblioteca
+        # la abre el panel más tarde
+        self.presets = PresetStore()
+        self.restore_last_preset()
+        self.startup.mark("overlays")
+
+        # Canal de control para otros procesos (--control-server)
+        self.control_server = None
+        if control_server is not None:
+            self.start_control_server(control_server)
+
+        # El panel de control se construye cuando el overlay ya está en
+        # pantalla
+        self.control_panel = None
+        self.overlay.first_frame.connect(self.first_frame)
+        QTimer.singleShot(PANEL_FALLBACK_MS, self.build_panel)
+
+    def restore_last_preset(self):
+        """Aplica a los overlays el último preset usado, si se puede leer"""
+        try:
+            self.presets.import_legacy()
+        except OSError:
+            pass  # Sin permisos de escritura: se sigue sin importar
+        name = self.presets.last_used
+        if name is None:
+            return
+        try:
+            self.overlay.apply_state(self.presets.load(name))
+        except (KeyError, OSError, ValueError):
+            pass  # Silencioso si el preset no se puede leer
+
+    def start_control_server(self, name):
+        """Abre el canal de control local; si no se puede, se sigue sin él"""
+        from control_server import DEFAULT_SERVER_NAME, ControlServer
+        server = ControlServer(self.overlay, self.presets, name or DEFAULT_SERVER_NAME)
+        try:
+            path = server.listen()
+        except OSError as e:
+            print(e, file=sys.stderr)
+            return
+        print(f"Canal de control en {path}", file=sys.stderr)
+        self.control_server = server
+
+    def first_frame(self):
+        """El primer frame ya se pintó: el panel, en la siguiente vuelta del bucle"""
+        from PyQt5.QtCore import QTimer
+        self.startup.mark("primer frame")
+        QTimer.singleShot(0, self.build_panel)
+
+    def build_panel(self):
+        """Crea el panel de control (una sola vez)"""
+        if self.control_panel is not None:
+            return
+        from control_panel import ControlPanel
+
+        self.control_panel = ControlPanel(self.overlay, self.presets, deferred=True)
         self.control_panel.show()
-        
-        # Conectar señal de cierre
+        self.startup.mark("panel")
+
+        # Conectar señales de cierre y de panel completo
         self.control_panel.closed.connect(self.cleanup)
-        
+        self.control_panel.ready.connect(self.panel_ready)
+        if self.control_server is not None:
+            self.control_server.preset_applied.connect(self.control_panel.update_preset_combo)
+
+    def panel_ready(self):
+        """Opciones avanzadas y presets listos: termina el arranque"""
+        self.startup.mark("presets y opciones")
+        self.startup.report()
+
     def cleanup(self):
         """Limpieza al cerrar"""
+        if self.control_server is not None:
+            self.control_server.close()
         self.overlay.close()
-        
+
     def run(self):
         """Ejecutar aplicación"""
         return self.app.exec_()
 
 
+def parse_args(argv):
+    """Separa las opciones propias de las que se pasan a Qt"""
+    parser = argparse.ArgumentParser(description="Composition Overlay")
+    parser.add_argument(
+        '--render', metavar='MANIFEST',
+        help="Renderiza sin ventana las plantillas descritas en un manifiesto JSON"
+    )
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help="Procesos para --render y --burn-in (por defecto, uno por CPU)"
+    )
+    parser.add_argument(
+        '--burn-in', metavar='INPUT',
+        help="Quema las guías en un vídeo y4m o RGB crudo ('-' = stdin)"
+    )
+    parser.add_argument(
+        '--output', default='-',
+        help="Salida de --burn-in, en el mismo formato ('-' = stdout)"
+    )
+    parser.add_argument(
+        '--preset', default=None,
+        help="Preset (nombre o archivo JSON) para --burn-in; por defecto, el último usado"
+    )
+    parser.add_argument(
+        '--size', metavar='WxH', default=None,
+        help="Tamaño de los frames RGB crudos (rgb24) de --burn-in"
+    )
+    parser.add_argument(
+        '--matrix', choices=('601', '709'), default=None,
+        help="Matriz YCbCr de la entrada y4m (por defecto, 709 desde 720 líneas)"
+    )
+    parser.add_argument(
+        '--profile-startup', action='store_true',
+        help="Muestra en stderr el tiempo de cada fase del arranque"
+    )
+    parser.add_argument(
+        '--control-server', nargs='?', const='', default=None, metavar='NAME',
+        help="Abre un canal de control local (por defecto 'composition-overlay')"
+    )
+    return parser.parse_known_args(argv[1:])
+
+
+def main(argv):
+    args, qt_args = parse_args(argv)
+
+    if args.render:
+        from batch_render import run_batch
+        try:
+            return 1 if run_batch(args.render, args.workers) else 0
+        except (KeyError, OSError, TypeError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+
+    if args.burn_in:
+        from burn_in import load_config, parse_size, run_burn_in
+        try:
+            size = parse_size(args.size) if args.size else None
+            run_burn_in(args.burn_in, args.output, load_config(args.preset), size,
+                        args.workers, args.matrix)
+        except (KeyError, OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    app = CompositionOverlayApp([argv[0]] + qt_args, args.profile_startup,
+                                args.control_server)
+    return app.run()
+
+
 if __name__ == "__main__":
-    app = CompositionOverlayApp()
-    sys.exit(app.run())
+    # Necesario para el pool de procesos en el ejecutable de PyInstaller
+    multiprocessing.freeze_support()
+    sys.exit(main(sys.argv))
@@ -0,0 +1,345 @@
+"""
+Gestor de overlays: uno por pantalla
+
+Crea un OverlayWindow por cada QScreen y los crea o destruye cuando se
+conectan o desconectan pantallas. Cada overlay tiene sus propias guías,
+estilo y capa cacheada (con la escala de su pantalla); las pantallas
+idénticas comparten la capa rasterizada a través de SharedLayers.
+
+El panel de control trabaja con el gestor como si fuera un overlay: los
+setters se aplican a la pantalla seleccionada o a todas, y los valores se
+leen de la pantalla seleccionada (o de la primera). subscribe() reenvía los
+avisos del estado de esa misma pantalla. Sin ninguna pantalla (o tras
+desconectar la última) los valores se leen de un estado suelto que conserva
+los de la última pantalla, y la primera que se conecte los adopta.
+"""
+from contextlib import ExitStack, contextmanager
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtGui import QGuiApplication
+
+from guide_layer import SharedLayers
+from overlay_state import DEFAULT_GUIDES, STATE_FIELDS, OverlayState, StateListeners
+from paint_profiler import PaintProfiler
+from overlay_window import OverlayWindow
+
+
+class OverlayManager(QObject):
+    # Se emite al conectar o desconectar pantallas
+    screens_changed = pyqtSignal()
+    # Se emite cuando el primer overlay termina su primer frame
+    first_frame = pyqtSignal()
+    # Se emite al mostrar u ocultar los overlays
+    visibility_changed = pyqtSignal(bool)
+
+    def __init__(self):
+        super().__init__()
+        self.shared_layers = SharedLayers()
+        self.overlays = []
+        self.selected = None  # Overlay seleccionado (None = todas las pantallas)
+        self.listeners = StateListeners()
+        # Estado y perfilador que se muestran mientras no hay ninguna pantalla
+        self.detached_state = OverlayState()
+        self.detached_state.subscribe(
+            STATE_FIELDS, lambda changes: self.relay_changes(None, changes))
+        self.detached_profiler = PaintProfiler()
+
+        # Opciones globales, comunes a todas las pantallas
+        self.visible = True
+        self.click_through = False
+        self.sparse = False
+        self.auto_contrast = False
+        self.region_drawing = False
+        self.region_style = (DEFAULT_GUIDES, None)  # Guías y aspecto de las regiones nuevas
+        self.max_fps = None
+        self.closed = False
+        self.painted = False
+
+        app = QGuiApplication.instance()
+        for screen in app.screens():
+            self.add_screen(screen)
+        app.screenAdded.connect(self.add_screen)
+        app.screenRemoved.connect(self.remove_screen)
+
+    def add_screen(self, screen):
+        """Crea el overlay de una pantalla nueva con los ajustes actuales"""
+        overlay = OverlayWindow(screen, self.shared_layers)
+        if self.overlays:
+            overlay.copy_settings(self.primary())
+        else:
+            overlay.state.copy_from(self.detached_state)
+        overlay.enable_click_through(self.click_through)
+        overlay.set_sparse(self.sparse)
+        overlay.set_auto_contrast(self.auto_contrast)
+        overlay.set_region_style(*self.region_style)
+        overlay.set_region_drawing(self.region_drawing)
+        overlay.set_max_fps(self.max_fps)
+        if not self.visible:
+            overlay.hide()
+        screen.geometryChanged.connect(overlay.setGeometry)
+        overlay.first_frame.connect(self.overlay_painted)
+        overlay.state.subscribe(
+            STATE_FIELDS, lambda changes, o=overlay: self.relay_changes(o, changes)
+        )
+        self.overlays.append(overlay)
+        self.screens_changed.emit()
+
+    def remove_screen(self, screen):
+        """Destruye el overlay de una pantalla desconectada"""
+        for overlay in [o for o in self.overlays if o.target_screen is screen]:
+            if len(self.overlays) == 1:
+                # La última pantalla: sus ajustes se conservan para la siguiente
+                self.detached_state.copy_from(overlay.state)
+            self.overlays.remove(overlay)
+            if self.selected is overlay:
+                self.selected = None
+            overlay.close()
+            overlay.deleteLater()
+        self.screens_changed.emit()
+
+    def overlay_painted(self):
+        if not self.painted:
+            self.painted = True
+            self.first_frame.emit()
+
+    def relay_changes(self, overlay, changes):
+        """Reenvía los cambios de estado de la pantalla mostrada"""
+        if overlay is self.primary():
+            self.listeners.notify(changes)
+
+    def subscribe(self, fields, callback):
+        """Avisa de los cambios de fields en la pantalla mostrada (ver OverlayState)"""
+        self.listeners.subscribe(fields, callback)
+
+    def unsubscribe(self, callback):
+        self.listeners.unsubscribe(callback)
+
+    def screen_labels(self):
+        """Descripción de cada pantalla, en el orden de overlays"""
+        labels = []
+        for i, overlay in enumerate(self.overlays):
+            screen = overlay.target_screen
+            size = screen.size()
+            labels.append(f"{i + 1}: {screen.name()} ({size.width()}×{size.height()}"
+                          f" @{screen.devicePixelRatio():g}x)")
+        return labels
+
+    def select(self, index):
+        """Selecciona la pantalla a editar por índice (None = todas)"""
+        if index is None or not 0 <= index < len(self.overlays):
+            self.selected = None
+        else:
+            self.selected = self.overlays[index]
+
+    def targets(self):
+        """Overlays a los que se aplican los cambios"""
+        return [self.selected] if self.selected is not None else list(self.overlays)
+
+    def primary(self):
+        """Overlay del que se leen los valores mostrados en el panel (None sin pantallas)"""
+        if self.selected is not None:
+            return self.selected
+        return self.overlays[0] if self.overlays else None
+
+    # Lectura del estado (de la pantalla seleccionada)
+
+    @property
+    def state(self):
+        primary = self.primary()
+        return primary.state if primary is not None else self.detached_state
+
+    @property
+    def guides(self):
+        return self.state.guides
+
+    @property
+    def guide_color(self):
+        return self.state.guide_color
+
+    @property
+    def line_width(self):
+        return self.state.line_width
+
+    @property
+    def window_opacity(self):
+        return self.state.window_opacity
+
+    @property
+    def grid_params(self):
+        return self.state.grid_params
+
+    @property
+    def profiler(self):
+        primary = self.primary()
+        return primary.profiler if primary is not None else self.detached_profiler
+
+    @property
+    def analysis(self):
+        primary = self.primary()
+        return primary.analysis if primary is not None else False
+    
+    @property
+    def regions(self):
+        return self.state.regions
+    
+    @property
+    def letterbox(self):
+        return self.state.letterbox
+    
+    @property
+    def fill_opacity(self):
+        return self.state.fill_opacity
+
+    def spiral_params(self):
+        return self.state.spiral_params()
+
+    def current_state(self):
+        return self.state.to_dict()
+
+    # Setters (a la pantalla seleccionada o a todas)
+
+    def toggle_guide(self, guide_name):
+        """Activa/desactiva una guía según su estado en la pantalla mostrada"""
+        if guide_name in self.guides:
+            self.set_guide(guide_name, not self.guides[guide_name])
+
+    def set_guide(self, guide_name, enabled):
+        for overlay in self.targets():
+            overlay.set_guide(guide_name, enabled)
+
+    def set_guide_color(self, color):
+        for overlay in self.targets():
+            overlay.set_guide_color(color)
+
+    def set_line_width(self, width):
+        for overlay in self.targets():
+            overlay.set_line_width(width)
+
+    def set_opacity(self, opacity):
+        for overlay in self.targets():
+            overlay.set_opacity(opacity)
+
+    def set_spiral_offset(self, offset):
+        for overlay in self.targets():
+            overlay.set_spiral_offset(offset)
+
+    def set_spiral_orientation(self, rotation, flip_h, flip_v):
+        for overlay in self.targets():
+            overlay.set_spiral_orientation(rotation, flip_h, flip_v)
+
+    def set_grid(self, rows, cols, gutter=0, margin=0, baseline=0):
+        for overlay in self.targets():
+            overlay.set_grid(rows, cols, gutter, margin, baseline)
+
+    def set_letterbox(self, aspect):
+        for overlay in self.targets():
+            overlay.set_letterbox(aspect)
+
+    def set_fill_opacity(self, opacity):
+        for overlay in self.targets():
+            overlay.set_fill_opacity(opacity)
+
+    def schedule(self, setter_name, *args):
+        """Programa un setter para el próximo frame de cada overlay afectado"""
+        for overlay in self.targets():
+            overlay.schedule(setter_name, *args)
+
+    def set_profiling(self, enabled):
+        for overlay in self.targets():
+            overlay.set_profiling(enabled)
+
+    def set_analysis(self, enabled):
+        for overlay in self.targets():
+            overlay.set_analysis(enabled)
+
+    def clear_regions(self):
+        for overlay in self.targets():
+            overlay.clear_regions()
+    
+    def detach_layer(self):
+        for overlay in self.targets():
+            overlay.detach_layer()
+
+    @contextmanager
+    def batch(self):
+        """Transacción sobre todas las pantallas afectadas (un repintado en cada una)"""
+        with ExitStack() as stack:
+            for overlay in self.targets():
+                stack.enter_context(overlay.batch())
+            yield self
+
+    def validate_state(self, state):
+        if not self.overlays:
+            return self.detached_state.validate(state)
+        for overlay in self.targets():
+            overlay.validate_state(state)
+
+    def apply_state(self, state, keep_layer=False):
+        """Aplica un estado a cada pantalla afectada; devuelve los campos que cambiaron
+
+        Se valida contra todas antes de aplicar nada. Sin pantallas se aplica
+        al estado suelto, que adoptará la primera que se conecte.
+        """
+        self.validate_state(state)
+        if not self.overlays:
+            return self.detached_state.apply(state)
+        changed = set()
+        for overlay in self.targets():
+            changed |= overlay.apply_state(state, keep_layer)
+        return changed
+
+    # Opciones globales
+
+    def set_max_fps(self, fps):
+        self.max_fps = fps or None
+        for overlay in self.overlays:
+            overlay.set_max_fps(fps)
+
+    def enable_click_through(self, enabled):
+        self.click_through = enabled
+        for overlay in self.overlays:
+            overlay.enable_click_through(enabled)
+
+    def set_sparse(self, enabled):
+        self.sparse = enabled
+        for overlay in self.overlays:
+            overlay.set_sparse(enabled)
+
+    def set_auto_contrast(self, enabled):
+        self.auto_contrast = enabled
+        for overlay in self.overlays:
+            overlay.set_auto_contrast(enabled)
+    
+    def set_region_drawing(self, enabled):
+        """Dibujo de regiones con el ratón: cada región va a la pantalla en que se dibuja"""
+        self.region_drawing = enabled
+        for overlay in self.overlays:
+            overlay.set_region_drawing(enabled)
+    
+    def set_region_style(self, guides, aspect):
+        self.region_style = (tuple(guides), aspect)
+        for overlay in self.overlays:
+            overlay.set_region_style(guides, aspect)
+
+    def show(self):
+        self.visible = True
+        for overlay in self.overlays:
+            overlay.show()
+        self.visibility_changed.emit(True)
+
+    def hide(self):
+        self.visible = False
+        for overlay in self.overlays:
+            overlay.hide()
+        self.visibility_changed.emit(False)
+
+    def close(self):
+        """Cierra todos los overlays (se puede llamar más de una vez)"""
+        if self.closed:
+            return
+        self.closed = True
+        app = QGuiApplication.instance()
+        app.screenAdded.disconnect(self.add_screen)
+        app.screenRemoved.disconnect(self.remove_screen)
+        for overlay in self.overlays:
+            overlay.close()
@@ -0,0 +1,549 @@
+"""
+Estado observable del overlay
+
+OverlayState reúne todo lo que define lo que dibuja un overlay (guías
+activas, color, grosor, opacidad, espiral, grid configurable, regiones con
+guías propias y encuadre de entrega con su sombreado) y es también la
+configuración del renderizador sin ventana. Los cambios pasan por sus
+setters: cada campo que cambia incrementa su versión y se avisa solo a los
+suscriptores de ese campo, con el valor anterior, así que cada oyente (la
+ventana, el panel, el menú contextual) trabaja en proporción a lo que
+cambió. Dentro de transaction() los avisos se agrupan en uno al terminar.
+
+GUIDE_DEFINITIONS es la única tabla de guías: de ella salen GUIDE_NAMES, las
+casillas del panel y las acciones del menú contextual.
+"""
+from contextlib import contextmanager
+from numbers import Real
+
+from PyQt5.QtGui import QColor
+
+from frame_regions import MAX_REGIONS, parse_aspect
+from guide_geometry import DEFAULT_GRID, DEFAULT_SPIRAL, SPIRAL_ROTATIONS
+
+
+# Guías disponibles, en orden de dibujado: (id, icono, nombre, descripción)
+GUIDE_DEFINITIONS = [
+    ('rule_of_thirds', '📐', 'Regla de Tercios', 'Grid 3×3 clásico'),
+    ('golden_ratio', '✨', 'Proporción Áurea', 'Ratio φ (1.618)'),
+    ('center_lines', '➕', 'Líneas Centrales', 'Cruz central'),
+    ('diagonals', '📏', 'Diagonales', 'Líneas diagonales'),
+    ('golden_spiral', '🌀', 'Espiral Áurea', 'Espiral de Fibonacci'),
+    ('grid_4x4', '▦', 'Grid 4×4', 'Cuadrícula 4 filas × 4 columnas'),
+    ('grid_5x5', '▦', 'Grid 5×5', 'Cuadrícula 5 filas × 5 columnas'),
+    ('custom_grid', '▦', 'Grid Configurable',
+     'Filas, columnas, medianiles, márgenes y línea base'),
+    ('safe_areas', '📺', 'Áreas Seguras', 'Action/Title safe para video'),
+]
+
+GUIDE_NAMES = [guide_id for guide_id, _, _, _ in GUIDE_DEFINITIONS]
+
+# Guías activas al arrancar
+DEFAULT_GUIDES = ('rule_of_thirds',)
+
+# Campos observables, con el nombre que tienen en los presets
+STATE_FIELDS = ('guides', 'color', 'line_width', 'opacity', 'spiral', 'grid', 'regions',
+                'letterbox', 'fill_opacity')
+
+# Campos que cambian la cobertura de las guías (el resto solo su tinte)
+COVERAGE_FIELDS = ('guides', 'line_width', 'spiral', 'grid', 'regions', 'letterbox')
+
+# Campos del grid configurable en el formato de los presets, en el orden de
+# grid_params
+GRID_FIELDS = ('rows', 'cols', 'gutter', 'margin', 'baseline')
+
+# Opacidad (%) del sombreado fuera del encuadre al arrancar
+DEFAULT_FILL_OPACITY = 30
+
+# Valores admitidos por validate
+SPIRAL_MAX_OFFSET = 14
+GRID_MAX_CELLS = 2000
+
+
+def grid_params_to_dict(grid):
+    return dict(zip(GRID_FIELDS, grid))
+
+
+def grid_params_from_dict(data, base=DEFAULT_GRID):
+    """grid_params desde {'rows', 'cols', ...}; los campos que faltan salen de base"""
+    return tuple(int(data.get(field, value)) for field, value in zip(GRID_FIELDS, base))
+
+
+def region_to_dict(region):
+    x, y, width, height, guides, aspect = region
+    return {'rect': [x, y, width, height], 'guides': list(guides), 'aspect': aspect}
+
+
+def region_from_dict(data):
+    """Región (x, y, ancho, alto, guías, aspecto) desde {'rect', 'guides', 'aspect'}"""
+    x, y, width, height = (int(v) for v in data['rect'])
+    guides = data.get('guides', DEFAULT_GUIDES)
+    return (x, y, width, height, tuple(name for name in GUIDE_NAMES if name in guides),
+            parse_aspect(data.get('aspect')))
+
+
+class StateListeners:
+    """Suscriptores por campo
+
+    Cada suscripción es (campos, callback). notify llama a cada callback una
+    sola vez y solo con los campos que le interesan: {campo: valor anterior}.
+    """
+    __slots__ = ('_entries',)
+
+    def __init__(self):
+        self._entries = []
+
+    def subscribe(self, fields, callback):
+        if isinstance(fields, str):
+            fields = (fields,)
+        unknown = set(fields) - set(STATE_FIELDS)
+        if unknown:
+            raise ValueError(f"Campos desconocidos: {', '.join(sorted(unknown))}")
+        self._entries.append((frozenset(fields), callback))
+
+    def unsubscribe(self, callback):
+        self._entries = [entry for entry in self._entries if entry[1] != callback]
+
+    def notify(self, changes):
+        for fields, callback in list(self._entries):
+            relevant = {field: old for field, old in changes.items() if field in fields}
+            if relevant:
+                callback(relevant)
+
+
+class OverlayState:
+    """Guías y estilo de un overlay, con versiones y avisos por campo
+
+    Expone la interfaz que usa el renderizador: guides, guide_color,
+    line_width, grid_params, regions, letterbox, fill_opacity y
+    spiral_params(). Los atributos se leen
+    directamente pero solo deben cambiarse con los setters (si no, ni las
+    versiones ni los suscriptores se enteran).
+    """
+    __slots__ = ('guides', 'guide_color', 'line_width', 'window_opacity', 'spiral',
+                 'grid_params', 'regions', 'letterbox', 'fill_opacity', 'version', 'versions',
+                 'listeners', '_depth', '_pending')
+
+    def __init__(self):
+        self.guides = {name: name in DEFAULT_GUIDES for name in GUIDE_NAMES}
+        self.guide_color = QColor(255, 255, 255, 180)  # Blanco semi-transparente
+        self.line_width = 2
+        self.window_opacity = 0.8
+        # Espiral: (desplazamiento 0-14 continuo, rotación, volteo H, volteo V)
+        self.spiral = DEFAULT_SPIRAL
+        # Grid configurable: (filas, columnas, medianil, margen, línea base)
+        self.grid_params = DEFAULT_GRID
+        # Regiones con guías propias: tuplas (x, y, ancho, alto, guías, aspecto)
+        self.regions = ()
+        # Encuadre de entrega: relación de aspecto (None = sin encuadre) y
+        # opacidad (0-100 %) del sombreado de lo que queda fuera
+        self.letterbox = None
+        self.fill_opacity = DEFAULT_FILL_OPACITY
+
+        # Versión global y por campo: aumentan con cada cambio
+        self.version = 0
+        self.versions = dict.fromkeys(STATE_FIELDS, 0)
+        self.listeners = StateListeners()
+        self._depth = 0
+        self._pending = {}  # campo -> valor antes del primer cambio pendiente
+
+    def spiral_params(self):
+        """Parámetros de la espiral: (desplazamiento, rotación, volteo H, volteo V)"""
+        return self.spiral
+
+    def value(self, field):
+        """Copia del valor actual de un campo (para comparar o guardar)"""
+        if field == 'guides':
+            return dict(self.guides)
+        if field == 'color':
+            return QColor(self.guide_color)
+        if field == 'line_width':
+            return self.line_width
+        if field == 'opacity':
+            return self.window_opacity
+        if field == 'spiral':
+            return self.spiral
+        if field == 'grid':
+            return self.grid_params
+        if field == 'regions':
+            return self.regions
+        if field == 'letterbox':
+            return self.letterbox
+        if field == 'fill_opacity':
+            return self.fill_opacity
+        raise KeyError(field)
+
+    def coverage_key(self):
+        """Clave con todo lo que afecta a la cobertura de las guías
+
+        El color no forma parte de ella: se aplica al componer la capa. Se
+        construye con los valores (no con las versiones) para que dos estados
+        iguales compartan capa y volver a un preset la encuentre en caché.
+        """
+        return (
+            tuple(name for name, enabled in self.guides.items() if enabled),
+            self.line_width,
+            self.spiral,
+            self.grid_params,
+            self.regions,
+            self.letterbox,
+        )
+
+    # Suscripciones
+
+    def subscribe(self, fields, callback):
+        """Llama a callback({campo: valor anterior}) cuando cambie alguno de fields"""
+        self.listeners.subscribe(fields, callback)
+
+    def unsubscribe(self, callback):
+        self.listeners.unsubscribe(callback)
+
+    @contextmanager
+    def transaction(self):
+        """Agrupa varios cambios en un solo aviso por suscriptor
+
+        Los campos que vuelven a su valor inicial dentro de la transacción no
+        se notifican.
+        """
+        self._depth += 1
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+            if not self._depth:
+                self._flush()
+
+    def _changed(self, field, old):
+        self.version += 1
+        self.versions[field] += 1
+        self._pending.setdefault(field, old)
+        if not self._depth:
+            self._flush()
+
+    def _flush(self):
+        pending, self._pending = self._pending, {}
+        changes = {field: old for field, old in pending.items()
+                   if old != self.value(field)}
+        if changes:
+            self.listeners.notify(changes)
+
+    # Setters (devuelven si el valor cambió)
+
+    def set_guide(self, guide_name, enabled):
+        if guide_name not in self.guides or self.guides[guide_name] == enabled:
+            return False
+        old = dict(self.guides)
+        self.guides[guide_name] = enabled
+        self._changed('guides', old)
+        return True
+
+    def set_color(self, color):
+        # Copia propia: set_opacity modifica el alfa del color
+        color = QColor(color)
+        if color == self.guide_color:
+            return False
+        old, self.guide_color = self.guide_color, color
+        self._changed('color', old)
+        return True
+
+    def set_line_width(self, width):
+        if width == self.line_width:
+            return False
+        old, self.line_width = self.line_width, width
+        self._changed('line_width', old)
+        return True
+
+    def set_opacity(self, opacity):
+        """Opacidad general (0-1); fija también el alfa del color"""
+        with self.transaction():
+            if opacity != self.window_opacity:
+                old, self.window_opacity = self.window_opacity, opacity
+                self._changed('opacity', old)
+            alpha = int(255 * opacity)
+            if alpha != self.guide_color.alpha():
+                color = QColor(self.guide_color)
+                color.setAlpha(alpha)
+                self.set_color(color)
+
+    def set_spiral(self, offset, rotation, flip_h, flip_v):
+        spiral = (offset, rotation, flip_h, flip_v)
+        if spiral == self.spiral:
+            return False
+        old, self.spiral = self.spiral, spiral
+        self._changed('spiral', old)
+        return True
+
+    def set_grid(self, rows, cols, gutter=0, margin=0, baseline=0):
+        grid = (rows, cols, gutter, margin, baseline)
+        if grid == self.grid_params:
+            return False
+        old, self.grid_params = self.grid_params, grid
+        self._changed('grid', old)
+        return True
+
+    def set_regions(self, regions):
+        """Sustituye las regiones (tuplas (x, y, ancho, alto, guías, aspecto))"""
+        regions = tuple(regions)
+        if regions == self.regions:
+            return False
+        old, self.regions = self.regions, regions
+        self._changed('regions', old)
+        return True
+
+    def set_letterbox(self, aspect):
+        """Relación de aspecto del encuadre (número) o None para quitarlo"""
+        if aspect == self.letterbox:
+            return False
+        old, self.letterbox = self.letterbox, aspect
+        self._changed('letterbox', old)
+        return True
+
+    def set_fill_opacity(self, opacity):
+        """Opacidad (0-100 %) del sombreado fuera del encuadre"""
+        if opacity == self.fill_opacity:
+            return False
+        old, self.fill_opacity = self.fill_opacity, opacity
+        self._changed('fill_opacity', old)
+        return True
+
+    def copy_from(self, other):
+        """Copia las guías y el estilo de otro estado (un solo aviso)"""
+        with self.transaction():
+            for name, enabled in other.guides.items():
+                self.set_guide(name, enabled)
+            self.set_color(other.guide_color)
+            self.set_line_width(other.line_width)
+            if other.window_opacity != self.window_opacity:
+                old, self.window_opacity = self.window_opacity, other.window_opacity
+                self._changed('opacity', old)
+            self.set_spiral(*other.spiral)
+            self.set_grid(*other.grid_params)
+            self.set_regions(other.regions)
+            self.set_letterbox(other.letterbox)
+            self.set_fill_opacity(other.fill_opacity)
+
+    # Formato de los presets
+
+    def to_dict(self):
+        """Estado en el formato de los presets (serializable en JSON)"""
+        offset, rotation, flip_h, flip_v = self.spiral
+        return {
+            'guides': dict(self.guides),
+            'color': {
+                'r': self.guide_color.red(),
+                'g': self.guide_color.green(),
+                'b': self.guide_color.blue(),
+                'a': self.guide_color.alpha()
+            },
+            'line_width': self.line_width,
+            'opacity': self.window_opacity,
+            'spiral': {
+                'offset': offset,
+                'rotation': rotation,
+                'flip_h': flip_h,
+                'flip_v': flip_v
+            },
+            'grid': grid_params_to_dict(self.grid_params),
+            'regions': [region_to_dict(region) for region in self.regions],
+            'letterbox': self.letterbox,
+            'fill_opacity': self.fill_opacity
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Crea un estado desde el formato de los presets, sin validar
+
+        Acepta 'guides' como dict {guía: bool} o como lista de guías activas.
+        Lo usa el renderizado por lotes, que admite manifiestos escritos a mano.
+        """
+        state = cls()
+        guides = data.get('guides')
+        if isinstance(guides, dict):
+            for name, enabled in guides.items():
+                if name in state.guides:
+                    state.guides[name] = bool(enabled)
+        elif guides is not None:
+            state.guides = {name: name in guides for name in GUIDE_NAMES}
+
+        if 'color' in data:
+            c = data['color']
+            state.guide_color = QColor(c['r'], c['g'], c['b'], c.get('a', 255))
+        if 'line_width' in data:
+            state.line_width = int(data['line_width'])
+        if 'opacity' in data:
+            state.window_opacity = float(data['opacity'])
+            state.guide_color.setAlpha(int(255 * state.window_opacity))
+
+        spiral = data.get('spiral', {})
+        offset, rotation, flip_h, flip_v = state.spiral
+        state.spiral = (float(spiral.get('offset', offset)),
+                        int(spiral.get('rotation', rotation)),
+                        bool(spiral.get('flip_h', flip_h)),
+                        bool(spiral.get('flip_v', flip_v)))
+
+        if 'grid' in data:
+            state.grid_params = grid_params_from_dict(data['grid'])
+        if 'regions' in data:
+            state.regions = tuple(region_from_dict(region) for region in data['regions'])
+        if 'letterbox' in data:
+            state.letterbox = parse_aspect(data['letterbox'])
+        if 'fill_opacity' in data:
+            state.fill_opacity = int(data['fill_opacity'])
+        return state
+
+    def validate(self, state):
+        """Comprueba un estado (parcial) y lo devuelve normalizado
+
+        Lanza ValueError con el primer campo inválido. Los campos que no
+        aparecen no cambian; el color se devuelve como QColor, la espiral,
+        el grid y las regiones como tuplas completas y el encuadre como
+        número (acepta también 'W:H') o None.
+        """
+        unknown = set(state) - set(STATE_FIELDS)
+        if unknown:
+            raise ValueError(f"Campos desconocidos: {', '.join(sorted(unknown))}")
+        normalized = {}
+
+        if 'guides' in state:
+            guides = state['guides']
+            if not isinstance(guides, dict):
+                raise ValueError("'guides' debe ser un diccionario guía -> bool")
+            for name, enabled in guides.items():
+                if name not in self.guides:
+                    raise ValueError(f"Guía desconocida: {name}")
+                if not isinstance(enabled, bool):
+                    raise ValueError(f"La guía {name} debe ser true/false")
+            normalized['guides'] = dict(guides)
+
+        if 'color' in state:
+            color = state['color']
+            if isinstance(color, dict):
+                try:
+                    channels = [color['r'], color['g'], color['b'], color.get('a', 255)]
+                except KeyError as e:
+                    raise ValueError(f"Al color le falta el canal {e}")
+                if not all(isinstance(c, int) and 0 <= c <= 255 for c in channels):
+                    raise ValueError("Los canales del color deben ser enteros 0-255")
+                color = QColor(*channels)
+            elif not isinstance(color, QColor) or not color.isValid():
+                raise ValueError("'color' debe ser {r, g, b, a} o un QColor válido")
+            normalized['color'] = QColor(color)
+
+        if 'line_width' in state:
+            width = state['line_width']
+            if isinstance(width, bool) or not isinstance(width, int) or width < 1:
+                raise ValueError("'line_width' debe ser un entero >= 1")
+            normalized['line_width'] = width
+
+        if 'opacity' in state:
+            opacity = state['opacity']
+            if isinstance(opacity, bool) or not isinstance(opacity, Real) \
+                    or not 0 <= opacity <= 1:
+                raise ValueError("'opacity' debe estar entre 0 y 1")
+            normalized['opacity'] = opacity
+
+        if 'spiral' in state:
+            spiral = state['spiral']
+            if not isinstance(spiral, dict):
+                raise ValueError("'spiral' debe ser un diccionario")
+            offset = spiral.get('offset', self.spiral[0])
+            rotation = spiral.get('rotation', self.spiral[1])
+            flip_h = spiral.get('flip_h', self.spiral[2])
+            flip_v = spiral.get('flip_v', self.spiral[3])
+            if isinstance(offset, bool) or not isinstance(offset, Real) \
+                    or not 0 <= offset <= SPIRAL_MAX_OFFSET:
+                raise ValueError(f"'spiral.offset' debe estar entre 0 y {SPIRAL_MAX_OFFSET}")
+            if rotation not in SPIRAL_ROTATIONS or isinstance(rotation, bool):
+                raise ValueError("'spiral.rotation' debe ser 0, 90, 180 o 270")
+            if not isinstance(flip_h, bool) or not isinstance(flip_v, bool):
+                raise ValueError("'spiral.flip_h' y 'spiral.flip_v' deben ser true/false")
+            normalized['spiral'] = (offset, rotation, flip_h, flip_v)
+
+        if 'grid' in state:
+            grid = state['grid']
+            if not isinstance(grid, dict) or set(grid) - set(GRID_FIELDS):
+                raise ValueError(f"'grid' debe ser un diccionario con {', '.join(GRID_FIELDS)}")
+            for field, value in grid.items():
+                if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                    raise ValueError(f"'grid.{field}' debe ser un entero >= 0")
+            grid = grid_params_from_dict(grid, self.grid_params)
+            if not 1 <= grid[0] <= GRID_MAX_CELLS or not 1 <= grid[1] <= GRID_MAX_CELLS:
+                raise ValueError(f"'grid.rows' y 'grid.cols' deben estar entre 1 y {GRID_MAX_CELLS}")
+            normalized['grid'] = grid
+
+        if 'regions' in state:
+            regions = state['regions']
+            if not isinstance(regions, (list, tuple)):
+                raise ValueError("'regions' debe ser una lista de regiones")
+            if len(regions) > MAX_REGIONS:
+                raise ValueError(f"Como mucho {MAX_REGIONS} regiones")
+            normalized['regions'] = tuple(
+                self.validate_region(region, i) for i, region in enumerate(regions))
+
+        if 'letterbox' in state:
+            try:
+                normalized['letterbox'] = parse_aspect(state['letterbox'])
+            except ValueError as e:
+                raise ValueError(f"'letterbox': {e}")
+
+        if 'fill_opacity' in state:
+            opacity = state['fill_opacity']
+            if isinstance(opacity, bool) or not isinstance(opacity, int) \
+                    or not 0 <= opacity <= 100:
+                raise ValueError("'fill_opacity' debe ser un entero entre 0 y 100")
+            normalized['fill_opacity'] = opacity
+
+        return normalized
+
+    def validate_region(self, region, index=0):
+        """Comprueba una región {'rect', 'guides', 'aspect'} y la devuelve como tupla"""
+        name = f"regions[{index}]"
+        if not isinstance(region, dict) or set(region) - {'rect', 'guides', 'aspect'}:
+            raise ValueError(f"'{name}' debe ser un diccionario con rect, guides y aspect")
+        rect = region.get('rect')
+        if not isinstance(rect, (list, tuple)) or len(rect) != 4 or any(
+                isinstance(v, bool) or not isinstance(v, int) for v in rect):
+            raise ValueError(f"'{name}.rect' debe ser [x, y, ancho, alto] en enteros")
+        if rect[2] < 1 or rect[3] < 1:
+            raise ValueError(f"'{name}.rect' debe tener ancho y alto >= 1")
+        guides = region.get('guides', list(DEFAULT_GUIDES))
+        if not isinstance(guides, (list, tuple)):
+            raise ValueError(f"'{name}.guides' debe ser una lista de guías")
+        for guide in guides:
+            if guide not in self.guides:
+                raise ValueError(f"Guía desconocida en {name}: {guide}")
+        try:
+            aspect = parse_aspect(region.get('aspect'))
+        except ValueError as e:
+            raise ValueError(f"'{name}.aspect': {e}")
+        return (*rect, tuple(guide for guide in GUIDE_NAMES if guide in guides), aspect)
+
+    def apply(self, state):
+        """Aplica un estado (parcial) en una transacción
+
+        Se valida todo antes de tocar nada (ValueError si no es válido).
+        Devuelve el conjunto de campos que cambiaron.
+        """
+        state = self.validate(state)
+        before = self.to_dict()
+        with self.transaction():
+            for name, enabled in state.get('guides', {}).items():
+                self.set_guide(name, enabled)
+            if 'color' in state:
+                self.set_color(state['color'])
+            if 'opacity' in state:
+                self.set_opacity(state['opacity'])
+            if 'line_width' in state:
+                self.set_line_width(state['line_width'])
+            if 'spiral' in state:
+                self.set_spiral(*state['spiral'])
+            if 'grid' in state:
+                self.set_grid(*state['grid'])
+            if 'regions' in state:
+                self.set_regions(state['regions'])
+            if 'letterbox' in state:
+                self.set_letterbox(state['letterbox'])
+            if 'fill_opacity' in state:
+                self.set_fill_opacity(state['fill_opacity'])
+        after = self.to_dict()
+        return {field for field in after if after[field] != before[field]}
@@ -1,36 +1,107 @@
 """
 Ventana de Overlay Transparente con Guías de Composición
 """
+from contextlib import contextmanager
+
 from PyQt5.QtWidgets import QWidget, QMenu, QAction
-from PyQt5.QtCore import Qt, QTimer, QPoint, QRect
-from PyQt5.QtGui import QPainter, QPen, QColor, QBrush, QPainterPath
-import math
+from PyQt5.QtCore import Qt, QTimer, QRect, pyqtSignal
+from PyQt5.QtGui import QPainter, QPen, QRegion
+
+from auto_contrast import CONTRAST_INTERVAL_MS, AutoContrast
+from composition_analyzer import ANALYSIS_INTERVAL_MS, CompositionAnalyzer
+from frame_regions import (LETTERBOX_ASPECTS, MAX_REGIONS, MIN_REGION_SIZE, frame_rect,
+                           region_at)
+from frame_scheduler import FrameScheduler
+from guide_geometry import GUIDE_TINT, guide_params
+from guide_layer import GuideLayer, is_dense, tile_rects
+from guide_renderer import GuideRenderer
+from overlay_state import (COVERAGE_FIELDS, DEFAULT_GUIDES, GUIDE_DEFINITIONS, GUIDE_NAMES,
+                           OverlayState)
+from paint_profiler import PaintProfiler, profiling_requested
+
+
+# Margen extra (px) de la máscara del modo disperso alrededor de las guías
+SPARSE_MARGIN = 2
+
+# Con más rectángulos que esto, la máscara se simplifica por baldosas de
+# SPARSE_TILE px (las diagonales y la espiral generan miles de rectángulos)
+SPARSE_MAX_RECTS = 256
+SPARSE_TILE = 32
+
+# Motivo (para el perfilado) de los repintados que pide cada campo del estado
+FIELD_REASONS = {
+    'guides': 'set_guide',
+    'color': 'set_guide_color',
+    'line_width': 'set_line_width',
+    'spiral': 'set_spiral',
+    'grid': 'set_grid',
+    'regions': 'set_regions',
+    'letterbox': 'set_letterbox',
+    'fill_opacity': 'set_fill_opacity',
+}
 
 
 class OverlayWindow(QWidget):
-    def __init__(self):
+    # Se emite una vez, al terminar el primer paintEvent
+    first_frame = pyqtSignal()
+    
+    def __init__(self, screen=None, shared_layers=None):
         super().__init__()
         
-        # Configuración de guías
-        self.guides = {
-            'rule_of_thirds': True,
-            'golden_ratio': False,
-            'center_lines': False,
-            'diagonals': False,
-            'golden_spiral': False,
-            'grid_4x4': False,
-            'grid_5x5': False,
-            'safe_areas': False
-        }
-        
-        # Configuración de estilo
-        self.guide_color = QColor(255, 255, 255, 180)  # Blanco semi-transparente
-        self.line_width = 2
-        self.window_opacity = 0.8
-        self.fill_opacity = 30  # Para áreas de relleno
-        
-        # Configuración de la espiral
-        self.spiral_offset_x = 0  # Desplazamiento horizontal de la espiral (0-14)
+        # Pantalla que cubre el overlay (None = la pantalla principal)
+        self.target_screen = screen
+        
+        # Guías y estilo: la ventana repinta lo que cubren los campos que cambian
+        self.state = OverlayState()
+        self.state.subscribe(COVERAGE_FIELDS + ('color', 'fill_opacity'), self.state_changed)
+        
+        # Renderizador (con su geometría precalculada) y capa pre-renderizada
+        self.renderer = GuideRenderer(self.state)
+        self.guide_layer = GuideLayer(shared_layers)
+        
+        # Perfilado opcional de repintados (OVERLAY_PROFILE=1 o desde el panel)
+        self.profiler = PaintProfiler()
+        self.renderer.profiler = self.profiler
+        self.hud_timer = QTimer(self)
+        self.hud_timer.setInterval(500)
+        self.hud_timer.timeout.connect(self.refresh_hud)
+        
+        # Contraste automático: color de cada tramo según el fondo
+        self.auto_contrast = False
+        self.contrast = None
+        self.contrast_timer = QTimer(self)
+        self.contrast_timer.setInterval(CONTRAST_INTERVAL_MS)
+        self.contrast_timer.timeout.connect(self.refresh_contrast)
+        
+        # Análisis de composición opcional (se crea al activarlo)
+        self.analysis = False
+        self.analyzer = None
+        self.analysis_timer = QTimer(self)
+        self.analysis_timer.setInterval(ANALYSIS_INTERVAL_MS)
+        self.analysis_timer.timeout.connect(self.refresh_analysis)
+        
+        # Agrupa los cambios de controles continuos (uno por frame como mucho)
+        self.scheduler = FrameScheduler(self)
+        
+        # Modo disperso: la ventana solo ocupa los píxeles de las guías
+        self.sparse = False
+        self.click_through = False
+        
+        # Dibujo de regiones con el ratón: guías y aspecto de las nuevas y
+        # arrastre en curso
+        self.region_drawing = False
+        self.region_guides = DEFAULT_GUIDES
+        self.region_aspect = None
+        self._drag_start = None
+        self._drag_rect = QRect()
+        self.context_region = None
+        
+        # Transacción en curso (batch): repintados y máscara pendientes
+        self._batch_depth = 0
+        self._batch_region = QRegion()
+        self._batch_mask = False
+        
+        self.painted = False
         
         self.init_ui()
         
@@ -40,409 +111,666 @@ class OverlayWindow(QWidget):
         self.setWindowFlags(
             Qt.FramelessWindowHint |
             Qt.WindowStaysOnTopHint |
-            Qt.Tool
+            Qt.Tool |
+            Qt.WindowDoesNotAcceptFocus
         )
+        # Mostrarlo (p. ej. desde el canal de control) no quita el foco a
+        # la aplicación de debajo
+        self.setAttribute(Qt.WA_ShowWithoutActivating)
         
         # Hacer ventana transparente
         self.setAttribute(Qt.WA_TranslucentBackground)
         self.setAttribute(Qt.WA_TransparentForMouseEvents, False)
         
-        # Pantalla completa
-        self.showFullScreen()
+        # Pantalla completa en su pantalla
+        if self.target_screen is not None:
+            self.setGeometry(self.target_screen.geometry())
+            self.create()
+            self.windowHandle().setScreen(self.target_screen)
+        # Como showFullScreen() pero sin pedir la activación de la ventana
+        self.setWindowState(Qt.WindowFullScreen)
+        self.show()
         
-        # Menú contextual
+        # Menú contextual (se crea una vez y sigue al estado)
         self.setContextMenuPolicy(Qt.CustomContextMenu)
         self.customContextMenuRequested.connect(self.show_context_menu)
+        self.create_context_menu()
+        
+        if profiling_requested():
+            self.set_profiling(True)
         
+    def layer_key(self):
+        """Clave con todo lo que afecta a la cobertura de la capa de guías"""
+        return self.state.coverage_key()
+    
+    # Lectura del estado
+    
+    @property
+    def guides(self):
+        return self.state.guides
+    
+    @property
+    def guide_color(self):
+        return self.state.guide_color
+    
+    @property
+    def line_width(self):
+        return self.state.line_width
+    
+    @property
+    def window_opacity(self):
+        return self.state.window_opacity
+    
+    @property
+    def grid_params(self):
+        return self.state.grid_params
+    
+    @property
+    def regions(self):
+        return self.state.regions
+    
+    @property
+    def letterbox(self):
+        return self.state.letterbox
+    
+    @property
+    def fill_opacity(self):
+        """Opacidad (0-100 %) de las áreas de relleno: el sombreado fuera del encuadre"""
+        return self.state.fill_opacity
+    
+    def spiral_params(self):
+        """Parámetros de la espiral: (desplazamiento, rotación, volteo H, volteo V)"""
+        return self.state.spiral_params()
+    
     def paintEvent(self, event):
-        """Dibuja las guías de composición"""
+        """Dibuja las guías de composición desde la capa cacheada"""
+        self.profiler.begin_paint()
         painter = QPainter(self)
-        painter.setRenderHint(QPainter.Antialiasing)
-        
-        # Configurar pen para las líneas
-        pen = QPen(self.guide_color, self.line_width)
-        painter.setPen(pen)
-        
-        width = self.width()
-        height = self.height()
-        
-        # Dibujar guías activas
-        if self.guides['rule_of_thirds']:
-            self.draw_rule_of_thirds(painter, width, height)
-            
-        if self.guides['golden_ratio']:
-            self.draw_golden_ratio(painter, width, height)
-            
-        if self.guides['center_lines']:
-            self.draw_center_lines(painter, width, height)
-            
-        if self.guides['diagonals']:
-            self.draw_diagonals(painter, width, height)
-            
-        if self.guides['golden_spiral']:
-            self.draw_golden_spiral(painter, width, height)
-            
-        if self.guides['grid_4x4']:
-            self.draw_grid(painter, width, height, 4, 4)
-            
-        if self.guides['grid_5x5']:
-            self.draw_grid(painter, width, height, 5, 5)
-            
-        if self.guides['safe_areas']:
-            self.draw_safe_areas(painter, width, height)
-    
-    def draw_rule_of_thirds(self, painter, width, height):
-        """Dibuja la regla de tercios (grid 3x3)"""
-        # Líneas verticales
-        painter.drawLine(int(width / 3), 0, int(width / 3), height)
-        painter.drawLine(int(2 * width / 3), 0, int(2 * width / 3), height)
-        
-        # Líneas horizontales
-        painter.drawLine(0, int(height / 3), width, int(height / 3))
-        painter.drawLine(0, int(2 * height / 3), width, int(2 * height / 3))
-        
-        # Puntos de intersección (puntos fuertes)
-        old_pen = painter.pen()
-        painter.setPen(QPen(self.guide_color, self.line_width * 3))
-        
-        points = [
-            (width / 3, height / 3),
-            (2 * width / 3, height / 3),
-            (width / 3, 2 * height / 3),
-            (2 * width / 3, 2 * height / 3)
-        ]
-        
-        for x, y in points:
-            painter.drawEllipse(QPoint(int(x), int(y)), 5, 5)
-        
-        painter.setPen(old_pen)
-    
-    def draw_golden_ratio(self, painter, width, height):
-        """Dibuja rectángulos de proporción áurea"""
-        phi = 1.618033988749895  # Número áureo
-        
-        # Líneas verticales
-        x1 = width / phi
-        x2 = width - x1
-        
-        painter.drawLine(int(x1), 0, int(x1), height)
-        painter.drawLine(int(x2), 0, int(x2), height)
-        
-        # Líneas horizontales
-        y1 = height / phi
-        y2 = height - y1
-        
-        painter.drawLine(0, int(y1), width, int(y1))
-        painter.drawLine(0, int(y2), width, int(y2))
-        
-        # Puntos de intersección
-        old_pen = painter.pen()
-        painter.setPen(QPen(self.guide_color, self.line_width * 3))
-        
-        points = [
-            (x1, y1), (x2, y1),
-            (x1, y2), (x2, y2)
-        ]
-        
-        for x, y in points:
-            painter.drawEllipse(QPoint(int(x), int(y)), 5, 5)
-        
-        painter.setPen(old_pen)
-    
-    def draw_center_lines(self, painter, width, height):
-        """Dibuja líneas centrales (cruz)"""
-        # Línea vertical central
-        painter.drawLine(int(width / 2), 0, int(width / 2), height)
-        
-        # Línea horizontal central
-        painter.drawLine(0, int(height / 2), width, int(height / 2))
-        
-        # Punto central
-        old_pen = painter.pen()
-        painter.setPen(QPen(self.guide_color, self.line_width * 4))
-        painter.drawEllipse(QPoint(int(width / 2), int(height / 2)), 6, 6)
-        painter.setPen(old_pen)
-    
-    def draw_diagonals(self, painter, width, height):
-        """Dibuja líneas diagonales"""
-        # Diagonal principal (esquina superior izquierda a inferior derecha)
-        painter.drawLine(0, 0, width, height)
-        
-        # Diagonal secundaria (esquina superior derecha a inferior izquierda)
-        painter.drawLine(width, 0, 0, height)
-    
-    def draw_golden_spiral(self, painter, width, height):
-        """Dibuja cuadrados de Fibonacci (espiral áurea)"""
-        
-        # Secuencia de Fibonacci
-        fib = [1, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89]
-        
-        # Calcular el tamaño base y la unidad de escala
-        size = min(width, height)
-        unit = size / fib[-1]  # 89 es el último número
-        
-        # Posición inicial (centrado verticalmente, alineado a la izquierda)
-        start_x = 0
-        start_y = (height - size) / 2
-        
-        # Guardar el estilo de línea actual
-        old_pen = painter.pen()
-        painter.setPen(QPen(self.guide_color, self.line_width // 2))
-        
-        # Definir las coordenadas fijas de cada cuadrado en la espiral
-        # Formato: (número_fibonacci, x_offset, y_offset)
-        # Los offsets son en unidades de Fibonacci, se multiplicarán por 'unit'
-        
-        squares = [
-            # Cuadrado 89: Esquina superior izquierda (base)
-            (89, 0, 0),
-            
-            # Cuadrado 55: A la derecha del 89
-            (55, 89, 0),
-            
-            # Cuadrado 34: Debajo del 55, alineado a la derecha
-            (34, 89+55-34, 55),
-            
-            # Cuadrado 21: A la izquierda del 34, debajo del 89
-            (21, 89, 55+13),
-            
-            # Cuadrado 13: Arriba del 21, a la izquierda
-            (13, 89, 55),
-            
-            # Cuadrado 8: A la derecha del 13
-            (8, 89+ 13, 55),
-            
-            # Cuadrado 5: Arriba del 8
-            (5, 89+3+13, 55+8),
-            
-            # Cuadrado 3: A la izquierda del 5
-            (3, 89+13, 55+8+2),
-            
-            # Cuadrado 2: Debajo del 3
-            (2, 89+13, 55+8),
+        # Solo se compone la región expuesta
+        self.compose(painter, event.region())
+        
+        if self.profiler.enabled:
+            hud_rect = self.profiler.hud_rect(self.width(), self.height())
+            if event.region().intersects(hud_rect):
+                painter.setClipping(False)
+                self.profiler.paint_hud(painter, hud_rect)
+        
+        if self.analysis and event.region().intersects(self.analyzer.region):
+            painter.setClipping(False)
+            self.analyzer.paint(painter, event.region(), self.width(), self.height())
+        
+        if self._drag_start is not None and event.region().intersects(self.drag_bounds()):
+            painter.setClipping(False)
+            self.paint_drag(painter)
+        painter.end()
+        self.profiler.end_paint()
+        
+        if not self.painted:
+            self.painted = True
+            self.first_frame.emit()
+    
+    def ensure_layer(self):
+        """Pone la capa al día con el estado actual y la devuelve
 
-            #Cuadro 1: Arriba del 2 se supone
-            (1,89+13+2,55+9),
+        La usa paintEvent y también la captura, que compone la capa sobre la
+        pantalla sin esperar al siguiente frame.
+        """
+        width, height = self.width(), self.height()
+        self.guide_layer.get(
+            width, height, self.devicePixelRatioF(), self.layer_key(),
+            self.renderer.paint_mask, self.renderer.tints(width, height)
+        )
+        self.guide_layer.set_runs(
+            GUIDE_TINT, self.contrast.runs(self.guide_color) if self.auto_contrast else None
+        )
+        return self.guide_layer
+    
+    def compose(self, painter, region):
+        """Compone en una región el sombreado fuera del encuadre y las guías encima
 
-            #Cuaddro 1: A la derecha del 1
-            (1,89+13+2,55+8),
-        ]
-        
-        # Dibujar cada cuadrado en su posición fija
-        for side_fib, offset_x, offset_y in squares:
-            side = side_fib * unit
-            # Aplicar el desplazamiento horizontal de la espiral
-            x = start_x + (offset_x + self.spiral_offset_x) * unit
-            y = start_y + offset_y * unit
-            painter.drawRect(int(x), int(y), int(side), int(side))
-        
-        # ===== CURVA DE LA ESPIRAL =====
-        # Cada arco es 1/4 de círculo que conecta la esquina de un cuadrado con la esquina del siguiente
-        # Formato: (radio_fib, centro_x_offset, centro_y_offset, ángulo_inicio, ángulo_extensión)
-        # Los ángulos en Qt: 0° = derecha (3 o'clock), 90° = arriba (12 o'clock)
-        # Los ángulos se especifican en 1/16 de grado (por eso se multiplican por 16)
-        
-        # Configurar un grosor ligeramente mayor para la curva
-        painter.setPen(QPen(self.guide_color, self.line_width))
-        
-        spiral_arcs = [
-            # Arco 1: De esquina inferior izquierda del 89 → esquina superior derecha del 55
-            # Centro: esquina inferior derecha del cuadrado 89 en posición (89, 89)
-            # Radio = 89 unidades
-            # Desde la izquierda (180°) hacia arriba (90°) = -90° (sentido antihorario)
-            (89, 89, 89, 180*16, -90*16),
-            
-            # Arco 2: De esquina superior izquierda del 55 → esquina inferior derecha del 34
-            # Cuadrado 55 está en (89, 0), cuadrado 34 está en (110, 55)
-            # Centro: esquina superior derecha del 55 en posición (89+55, 55)
-            # Radio = 55 unidades
-            # Desde arriba (90°) hacia la derecha (0°) = -90° (sentido antihorario)
-            (55, 89, 55, 90*16, -90*16),
-            
-            # Arco 3: De esquina superior derecha del 34 → esquina inferior izquierda del 21
-            # Cuadrado 34 está en (110, 55), cuadrado 21 está en (89, 68)
-            # Centro: esquina superior izquierda del 34 en posición (110, 55)
-            # Radio = 34 unidades
-            # Desde la derecha (0°) hacia abajo (270°) = -90° (sentido antihorario)
-            (34, 110, 55, 0*16, -90*16),
-            
-            # Arco 4: De esquina inferior derecha del 21 → esquina superior izquierda del 13
-            # Cuadrado 21 está en (89, 68), cuadrado 13 está en (89, 55)
-            # Centro: esquina inferior izquierda del 21 en posición (89, 68+21=89)
-            # Radio = 21 unidades
-            # Desde abajo (270°) hacia la izquierda (180°) = -90° (sentido antihorario)
-            (21, 89+21, 55+13, 270*16, -90*16),
-            
-            # Arco 5: De esquina inferior izquierda del 13 → esquina superior derecha del 8
-            # Cuadrado 13 está en (89, 55), cuadrado 8 está en (102, 55)
-            # Centro: esquina inferior derecha del 13 en posición (89+13=102, 55+13=68)
-            # Radio = 13 unidades
-            # Desde la izquierda (180°) hacia arriba (90°) = -90° (sentido antihorario)
-            (13, 102, 68, 180*16, -90*16),
-            
-            # Arco 6: De esquina superior izquierda del 8 → esquina inferior derecha del 5
-            # Cuadrado 8 está en (102, 55), cuadrado 5 está en (105, 63)
-            # Centro: esquina superior derecha del 8 en posición (102+8=110, 55+8=63)
-            # Radio = 8 unidades
-            # Desde arriba (90°) hacia la derecha (0°) = -90° (sentido antihorario)
-            (8, 89+13, 63, 90*16, -90*16),
-            
-            # Arco 7: De esquina superior derecha del 5 → esquina inferior izquierda del 3
-            # Cuadrado 5 está en (105, 63), cuadrado 3 está en (102, 65)
-            # Centro: esquina superior izquierda del 5 en posición (105, 63)
-            # Radio = 5 unidades
-            # Desde la derecha (0°) hacia abajo (270°) = -90° (sentido antihorario)
-            (5, 105, 63, 0*16, -90*16),
-            
-            # Arco 8: De esquina inferior derecha del 3 → esquina superior izquierda del 2
-            # Cuadrado 3 está en (102, 65), cuadrado 2 está en (102, 63)
-            # Centro: esquina inferior izquierda del 3 en posición (102, 65+3=68)
-            # Radio = 3 unidades
-            # Desde abajo (270°) hacia la izquierda (180°) = -90° (sentido antihorario)
-            (3, 89+13+3, 55+10, 270*16, -90*16),
+        Lo usan paintEvent y las capturas. El sombreado no pasa por la capa:
+        se rellena directamente, con sus bandas precalculadas.
+        """
+        layer = self.ensure_layer()
+        self.renderer.paint_shade(painter, self.width(), self.height(), region)
+        layer.blit(painter, region)
+    
+    def shade_region(self, aspect=None, fill_opacity=None):
+        """Zona sombreada fuera del encuadre (ver GuideRenderer.shade_region)"""
+        return self.renderer.shade_region(self.width(), self.height(), aspect, fill_opacity)
+    
+    def guide_region(self, guide_name, line_width=None, spiral=None,
+                     tint=None, grid=None):
+        """Región de pantalla que ocupa una guía con el estilo indicado"""
+        return self.renderer.guide_region(
+            guide_name, self.width(), self.height(), line_width,
+            spiral, tint, grid
+        )
+    
+    def active_region(self, line_width=None, tint=None):
+        """Unión de las regiones de todas las guías activas"""
+        return self.renderer.active_region(
+            self.width(), self.height(), line_width, tint
+        )
+    
+    def repaint_region(self, region, reason=None):
+        """Repinta una región sin re-rasterizar la capa (cambios de tinte)"""
+        if not region.isEmpty():
+            self.profiler.note_trigger(reason)
+            if self._batch_depth:
+                self._batch_region = self._batch_region.united(region)
+            else:
+                self.update(region)
+    
+    def invalidate_region(self, region, reason=None):
+        """Re-rasteriza y repinta solo la región indicada
 
-            # Arco 9: esquina inferior izquierda del 2 → esquina superior izquierda del 1
-            # Cuadrado 2 está en (102, 63), cuadrado 1 está en (102, 60)
-            # Centro: esquina inferior izquierda del 2 en posición (102, 63+3=66)
-            # Radio = 3 unidades
-            # Desde abajo (270°) hacia la izquierda (180°) = -90° (sentido antihorario)
-            (2, 89+13+2, 55+8+2, 180*16, -90*16),
+        reason identifica al que pidió el repintado (para el perfilado).
+        """
+        self.guide_layer.invalidate(region)
+        self.repaint_region(region, reason)
+        if self.sparse:
+            if self._batch_depth:
+                self._batch_mask = True
+            else:
+                self.update_mask()
+    
+    @contextmanager
+    def batch(self):
+        """Agrupa varios cambios en una transacción con un único repintado
 
-            # Arco 10: esquina inferior izquierda del 1 → esquina superior izquierda del 0
-            # Cuadrado 1 está en (102, 60), cuadrado 0 está en (102, 58)
-            # Centro: esquina inferior izquierda del 1 en posición (102, 60+3=63)
-            # Radio = 3 unidades
-            # Desde abajo (270°) hacia la izquierda (180°) = -90° (sentido antihorario)
-            (1, 89+13+2, 55+8+1, 90*16, -90*16),
+        Dentro del bloque los setters actualizan el estado, pero la ventana
+        recibe un solo aviso con todos los campos cambiados, las regiones a
+        repintar se acumulan y la máscara del modo disperso no se recalcula.
+        Al salir del bloque más externo se pide un solo update() con la
+        unión de las regiones.
+        """
+        self._batch_depth += 1
+        try:
+            # Los avisos del estado llegan juntos al cerrar la transacción,
+            # antes del update()
+            with self.state.transaction():
+                yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                region, self._batch_region = self._batch_region, QRegion()
+                update_mask, self._batch_mask = self._batch_mask, False
+                if update_mask and self.sparse:
+                    self.update_mask()
+                if not region.isEmpty():
+                    self.update(region)
+    
+    def set_profiling(self, enabled):
+        """Activa/desactiva el perfilado de repintados y su HUD"""
+        if enabled == self.profiler.enabled:
+            return
+        self.profiler.enabled = enabled
+        if enabled:
+            self.profiler.reset()
+            self.hud_timer.start()
+        else:
+            self.hud_timer.stop()
+        if self.sparse:
+            self.update_mask()
+        self.update(self.profiler.hud_rect(self.width(), self.height()))
+    
+    def set_auto_contrast(self, enabled):
+        """Activa/desactiva el contraste automático de las guías"""
+        if enabled == self.auto_contrast:
+            return
+        self.auto_contrast = enabled
+        if enabled:
+            if self.contrast is None:
+                self.contrast = AutoContrast(self)
+            self.contrast.error = None
+            self.contrast_timer.start()
+            self.refresh_contrast()
+        else:
+            self.contrast_timer.stop()
+        # El color de las guías vuelve a ser el del estado (o deja de serlo)
+        self.repaint_region(self.active_region(tint=GUIDE_TINT), 'auto_contrast')
+    
+    def refresh_contrast(self):
+        """Mide otro turno del fondo; repinta solo los tramos que cambian de color"""
+        if not self.isVisible():
+            return
+        damaged = self.contrast.update(self.width(), self.height())
+        if self.contrast.error:
+            self.contrast_timer.stop()
+        self.repaint_region(damaged.intersected(self.active_region(tint=GUIDE_TINT)),
+                            'auto_contrast')
+    
+    def set_analysis(self, enabled):
+        """Activa/desactiva el análisis de composición y sus indicadores"""
+        if enabled == self.analysis:
+            return
+        self.analysis = enabled
+        if enabled:
+            if self.analyzer is None:
+                self.analyzer = CompositionAnalyzer(self)
+            self.analyzer.error = None
+            self.analysis_timer.start(ANALYSIS_INTERVAL_MS)
+            self.refresh_analysis()
+        else:
+            self.analysis_timer.stop()
+            self.update(self.analyzer.region)
+        if self.sparse:
+            self.update_mask()
+    
+    def refresh_analysis(self):
+        """Un análisis; repinta solo los indicadores que cambiaron"""
+        if not self.isVisible():
+            return
+        region = self.analyzer.region
+        damaged = self.analyzer.update(self.width(), self.height())
+        if self.analyzer.error:
+            # Sin copia de pantalla no hay nada que analizar (el recuadro lo indica)
+            self.analysis_timer.stop()
+        if self.sparse and self.analyzer.region != region:
+            self.update_mask()
+        if not damaged.isEmpty():
+            self.profiler.note_trigger('analysis')
+            self.update(damaged)
+        self.analysis_timer.setInterval(self.analyzer.interval_ms())
+    
+    def set_sparse(self, enabled):
+        """Activa/desactiva el modo disperso
+
+        La ventana se recorta (setMask) a las guías con su grosor más un
+        margen: el compositor solo mezcla esos píxeles y los clics entre las
+        líneas pasan a las ventanas de debajo.
+        """
+        if enabled == self.sparse:
+            return
+        self.sparse = enabled
+        if enabled:
+            self.update_mask()
+        else:
+            self.clearMask()
+    
+    def update_mask(self):
+        """Recalcula la máscara del modo disperso a partir de la geometría"""
+        if self.region_drawing:
+            # Mientras se dibujan regiones toda la ventana recibe el ratón
+            return
+        region = self.active_region()
+        if self.profiler.enabled:
+            region = region.united(self.profiler.hud_rect(self.width(), self.height()))
+        if self.analysis:
+            region = region.united(self.analyzer.region)
+        # El sombreado también se ve: sus bandas entran en la máscara
+        region = region.united(self.shade_region())
+        if region.rectCount() <= SPARSE_MAX_RECTS:
+            rects = region.rects()
+        elif is_dense(region, SPARSE_TILE, 1):
+            # Más rectángulos que baldosas (un grid fino): casi todas quedarían
+            # cubiertas, así que basta el rectángulo envolvente
+            rects = [region.boundingRect()]
+        else:
+            rects = tile_rects(region, SPARSE_TILE)
+        mask = QRegion()
+        for rect in rects:
+            mask = mask.united(rect.adjusted(-SPARSE_MARGIN, -SPARSE_MARGIN,
+                                             SPARSE_MARGIN, SPARSE_MARGIN))
+        if mask.isEmpty():
+            # Una máscara vacía la quitaría: sin guías basta un píxel
+            mask = QRegion(0, 0, 1, 1)
+        self.setMask(mask)
+    
+    def resizeEvent(self, event):
+        """La geometría de las guías depende del tamaño de la ventana"""
+        super().resizeEvent(event)
+        if self.sparse:
+            self.update_mask()
+    
+    def refresh_hud(self):
+        """Repinta solo el área del HUD con los datos actualizados"""
+        self.profiler.note_trigger('hud')
+        self.update(self.profiler.hud_rect(self.width(), self.height()))
+    
+    def schedule(self, setter_name, *args):
+        """Programa una llamada a un setter para el próximo frame
 
-            # Arco 11: esquina inferior izquierda del 1 → esquina superior izquierda del 0
-            # Cuadrado 1 está en (102, 60), cuadrado 0 está en (102, 58)
-            # Centro: esquina inferior izquierda del 1 en posición (102, 60+3=63)
-            # Radio = 3 unidades
-            # Desde abajo (270°) hacia la izquierda (180°) = -90° (sentido antihorario)
-            (1, 89+13+2, 55+8+1, 0*16, -90*16),
-        ]
-        
-        # Dibujar cada arco de la espiral
-        for radius_fib, center_x_offset, center_y_offset, start_angle, span_angle in spiral_arcs:
-            radius = radius_fib * unit
-            # Aplicar el desplazamiento horizontal de la espiral
-            center_x = start_x + (center_x_offset + self.spiral_offset_x) * unit
-            center_y = start_y + center_y_offset * unit
-            
-            # drawArc necesita un rectángulo que contenga el círculo
-            # El rectángulo va desde (centro - radio) hasta (centro + radio)
-            rect_x = center_x - radius
-            rect_y = center_y - radius
-            rect_size = radius * 2
-            
-            painter.drawArc(
-                int(rect_x), int(rect_y), 
-                int(rect_size), int(rect_size),
-                start_angle, span_angle
-            )
-        
-        # Restaurar el estilo de línea original
-        painter.setPen(old_pen)
-    
-    def draw_grid(self, painter, width, height, rows, cols):
-        """Dibuja un grid personalizado"""
-        # Líneas verticales
-        for i in range(1, cols):
-            x = int(i * width / cols)
-            painter.drawLine(x, 0, x, height)
-        
-        # Líneas horizontales
-        for i in range(1, rows):
-            y = int(i * height / rows)
-            painter.drawLine(0, y, width, y)
-    
-    def draw_safe_areas(self, painter, width, height):
-        """Dibuja áreas seguras (útil para video)"""
-        # Action safe: 90% del área
-        action_margin_w = int(width * 0.05)
-        action_margin_h = int(height * 0.05)
-        
-        # Title safe: 80% del área
-        title_margin_w = int(width * 0.1)
-        title_margin_h = int(height * 0.1)
-        
-        old_pen = painter.pen()
-        
-        # Action safe (línea sólida)
-        painter.setPen(QPen(QColor(255, 200, 0, 150), self.line_width))
-        painter.drawRect(action_margin_w, action_margin_h,
-                        width - 2 * action_margin_w,
-                        height - 2 * action_margin_h)
-        
-        # Title safe (línea punteada)
-        painter.setPen(QPen(QColor(255, 100, 0, 150), self.line_width, Qt.DashLine))
-        painter.drawRect(title_margin_w, title_margin_h,
-                        width - 2 * title_margin_w,
-                        height - 2 * title_margin_h)
-        
-        painter.setPen(old_pen)
+        Las llamadas repetidas al mismo setter dentro de un frame se
+        reducen a la última.
+        """
+        self.scheduler.schedule(setter_name, getattr(self, setter_name), *args)
+    
+    def set_max_fps(self, fps):
+        """Limita los cambios programados por segundo (0 = refresco de pantalla)"""
+        self.scheduler.max_fps = fps or None
     
     def toggle_guide(self, guide_name):
         """Activa/desactiva una guía"""
         if guide_name in self.guides:
-            self.guides[guide_name] = not self.guides[guide_name]
-            self.update()
+            self.set_guide(guide_name, not self.guides[guide_name])
+    
+    def set_guide(self, guide_name, enabled):
+        """Activa o desactiva una guía concreta"""
+        self.state.set_guide(guide_name, enabled)
     
     def set_guide_color(self, color):
         """Establece el color de las guías"""
-        self.guide_color = color
-        self.update()
+        self.state.set_color(color)
     
     def set_line_width(self, width):
         """Establece el grosor de las líneas"""
-        self.line_width = width
-        self.update()
+        self.state.set_line_width(width)
     
     def set_opacity(self, opacity):
         """Establece la opacidad general"""
-        self.window_opacity = opacity
-        alpha = int(255 * opacity)
-        self.guide_color.setAlpha(alpha)
-        self.update()
+        self.state.set_opacity(opacity)
     
     def set_spiral_offset(self, offset):
-        """Establece el desplazamiento horizontal de la espiral (0-14)"""
-        self.spiral_offset_x = offset
-        self.update()
+        """Establece el desplazamiento horizontal de la espiral (0-14, admite decimales)"""
+        self.state.set_spiral(offset, *self.spiral_params()[1:])
+    
+    def set_spiral_orientation(self, rotation, flip_h, flip_v):
+        """Establece la rotación (0/90/180/270) y los volteos de la espiral"""
+        self.state.set_spiral(self.spiral_params()[0], rotation, flip_h, flip_v)
+    
+    def set_grid(self, rows, cols, gutter=0, margin=0, baseline=0):
+        """Establece el grid configurable repintando solo su región"""
+        self.state.set_grid(rows, cols, gutter, margin, baseline)
+    
+    def set_letterbox(self, aspect):
+        """Establece el encuadre de entrega (relación de aspecto, o None para quitarlo)"""
+        self.state.set_letterbox(aspect)
+    
+    def set_fill_opacity(self, opacity):
+        """Establece la opacidad (0-100 %) del sombreado fuera del encuadre"""
+        self.state.set_fill_opacity(opacity)
+    
+    def state_changed(self, changes):
+        """Re-rasteriza y repinta solo lo que cubren los campos que cambiaron
+
+        changes es {campo: valor anterior}. Cada guía se compara con sus
+        parámetros anteriores (grosor, espiral o grid si le afectan): si no
+        cambió, no se toca; si cambió, se dañan su región antigua y la nueva.
+        """
+        state = self.state
+        reason = '+'.join(FIELD_REASONS[field] for field in FIELD_REASONS
+                          if field in changes)
+        
+        if changes.keys() & set(COVERAGE_FIELDS):
+            old_guides = changes.get('guides', state.guides)
+            old_width = changes.get('line_width', state.line_width)
+            old_spiral = changes.get('spiral', state.spiral)
+            old_grid = changes.get('grid', state.grid_params)
+            region = QRegion()
+            for name, enabled in state.guides.items():
+                was_enabled = old_guides[name]
+                if was_enabled and enabled and old_width == state.line_width and \
+                        guide_params(name, old_spiral, old_grid) == \
+                        guide_params(name, state.spiral, state.grid_params):
+                    continue
+                if was_enabled:
+                    region = region.united(self.guide_region(
+                        name, old_width, old_spiral, grid=old_grid))
+                if enabled:
+                    region = region.united(self.guide_region(name))
+            old_regions = changes.get('regions', state.regions)
+            if old_regions or state.regions:
+                region = region.united(self.regions_damage(
+                    old_regions, old_width, old_spiral, old_grid))
+            old_letterbox = changes.get('letterbox', state.letterbox)
+            if old_letterbox != state.letterbox or old_width != state.line_width:
+                region = region.united(self.renderer.frame_lines_region(
+                    self.width(), self.height(), old_letterbox, old_width)).united(
+                    self.renderer.frame_lines_region(
+                        self.width(), self.height(), state.letterbox))
+            self.invalidate_region(region, reason)
+        
+        if 'letterbox' in changes or 'fill_opacity' in changes:
+            # El sombreado no está en la capa: basta repintar lo que deja o
+            # empieza a cubrir (todo, si cambia su opacidad)
+            old_shade = QRegion()
+            if changes.get('letterbox', state.letterbox):
+                old_shade = self.shade_region(changes.get('letterbox', state.letterbox),
+                                              changes.get('fill_opacity', state.fill_opacity))
+            shade = self.shade_region()
+            if 'fill_opacity' in changes:
+                self.repaint_region(old_shade.united(shade), reason)
+            else:
+                self.repaint_region(old_shade.xored(shade), reason)
+            if self.sparse and 'letterbox' not in changes and old_shade != shade:
+                if self._batch_depth:
+                    self._batch_mask = True
+                else:
+                    self.update_mask()
+        
+        if 'color' in changes:
+            # El color solo cambia la tabla con que se compone la capa
+            self.repaint_region(self.active_region(tint=GUIDE_TINT), reason)
+    
+    def regions_damage(self, old_regions, old_width, old_spiral, old_grid):
+        """Lo que cubrían las regiones que cambiaron y lo que cubren ahora
+
+        Una región cambia si se añade, se quita o se mueve, o si cambia el
+        estilo de alguna de sus guías; las demás no se tocan.
+        """
+        state = self.state
+        
+        def restyled(guides):
+            return old_width != state.line_width or any(
+                guide_params(name, old_spiral, old_grid)
+                != guide_params(name, state.spiral, state.grid_params) for name in guides)
+        
+        old_set, new_set = set(old_regions), set(state.regions)
+        stale = tuple(r for r in old_regions if r not in new_set or restyled(r[4]))
+        fresh = tuple(r for r in state.regions if r not in old_set or restyled(r[4]))
+        return self.renderer.regions_region(
+            old_width, regions=stale, spiral=old_spiral, grid=old_grid
+        ).united(self.renderer.regions_region(regions=fresh))
+    
+    # Regiones con guías propias
+    
+    def set_regions(self, regions):
+        """Sustituye las regiones (tuplas (x, y, ancho, alto, guías, aspecto))"""
+        self.state.set_regions(regions)
+    
+    def add_region(self, rect, guides=None, aspect=None):
+        """Añade una región (QRect); sin guías usa las de las regiones nuevas"""
+        if len(self.state.regions) >= MAX_REGIONS:
+            return False
+        if guides is None:
+            guides, aspect = self.region_guides, self.region_aspect
+        region = (rect.x(), rect.y(), rect.width(), rect.height(),
+                  tuple(name for name in GUIDE_NAMES if name in guides), aspect)
+        return self.state.set_regions(self.state.regions + (region,))
+    
+    def remove_region(self, index):
+        regions = self.state.regions
+        self.state.set_regions(regions[:index] + regions[index + 1:])
+    
+    def clear_regions(self):
+        self.state.set_regions(())
+    
+    def set_region_style(self, guides, aspect):
+        """Guías y aspecto (número o None) de las regiones que se dibujen"""
+        self.region_guides = tuple(guides)
+        self.region_aspect = aspect
+    
+    def set_region_drawing(self, enabled):
+        """Activa/desactiva el dibujo de regiones arrastrando con el ratón
+
+        Mientras está activo el overlay recibe el ratón aunque estén activados
+        el clic a través o el modo disperso.
+        """
+        if enabled == self.region_drawing:
+            return
+        self.region_drawing = enabled
+        self.setAttribute(Qt.WA_TransparentForMouseEvents, self.click_through and not enabled)
+        if enabled:
+            self.setCursor(Qt.CrossCursor)
+            if self.sparse:
+                self.clearMask()
+        else:
+            self.unsetCursor()
+            self.cancel_drag()
+            if self.sparse:
+                self.update_mask()
+    
+    def drag_bounds(self):
+        """Área del rectángulo que se está arrastrando, con su trazo"""
+        return self._drag_rect.adjusted(-2, -2, 2, 2)
+    
+    def update_drag(self, pos):
+        """Mueve la esquina del arrastre; repinta el rectángulo anterior y el nuevo"""
+        old = self.drag_bounds()
+        self._drag_rect = QRect(self._drag_start, pos).normalized()
+        self.update(QRegion(old).united(self.drag_bounds()))
+    
+    def cancel_drag(self):
+        if self._drag_start is not None:
+            self._drag_start = None
+            self.update(self.drag_bounds())
+    
+    def paint_drag(self, painter):
+        """Rectángulo del arrastre y, con aspecto, el marco que tendrán las guías"""
+        painter.setPen(QPen(self.guide_color, 1, Qt.DashLine))
+        painter.setBrush(Qt.NoBrush)
+        painter.drawRect(self._drag_rect)
+        if self.region_aspect:
+            rect = self._drag_rect
+            painter.setPen(QPen(self.guide_color, 1))
+            painter.drawRect(frame_rect((rect.x(), rect.y(), rect.width(), rect.height(),
+                                         (), self.region_aspect)))
+    
+    def mousePressEvent(self, event):
+        if self.region_drawing and event.button() == Qt.LeftButton:
+            self._drag_start = event.pos()
+            self.update_drag(event.pos())
+        else:
+            super().mousePressEvent(event)
+    
+    def mouseMoveEvent(self, event):
+        if self._drag_start is not None:
+            self.update_drag(event.pos())
+        else:
+            super().mouseMoveEvent(event)
+    
+    def mouseReleaseEvent(self, event):
+        if self._drag_start is not None and event.button() == Qt.LeftButton:
+            self.update_drag(event.pos())
+            rect = self._drag_rect
+            self.cancel_drag()
+            if rect.width() >= MIN_REGION_SIZE and rect.height() >= MIN_REGION_SIZE:
+                self.add_region(rect)
+        else:
+            super().mouseReleaseEvent(event)
+    
+    def copy_settings(self, other):
+        """Copia las guías y el estilo de otro overlay (p. ej. al conectar una pantalla)"""
+        self.state.copy_from(other.state)
+    
+    def detach_layer(self):
+        """Conserva la capa actual en la caché antes de un cambio grande
+
+        Se usa al cambiar de preset: en vez de re-rasterizar la capa en el
+        sitio, se deja en la caché compartida y el siguiente frame adopta la
+        del preset nuevo si ya estaba rasterizada. No repinta nada: el
+        contenido solo cambia donde lo indiquen los setters que sigan.
+        """
+        self.guide_layer.detach()
+    
+    # Estado completo (presets y cambios por script)
+    
+    def current_state(self):
+        """Estado actual en el formato de los presets (serializable en JSON)"""
+        return self.state.to_dict()
+    
+    def validate_state(self, state):
+        """Comprueba un estado (parcial); ValueError si no es válido"""
+        return self.state.validate(state)
+    
+    def apply_state(self, state, keep_layer=False):
+        """Aplica un estado (parcial) completo con un solo repintado
+
+        Se valida todo antes de tocar nada, así que un estado inválido no
+        deja cambios a medias (lanza ValueError). Solo se invalidan las
+        regiones de los campos que cambian respecto al estado actual.
+        Con keep_layer (cambios de preset) la capa actual se conserva en la
+        caché en vez de re-rasterizarse. Devuelve el conjunto de campos que
+        cambiaron.
+        """
+        self.validate_state(state)
+        if keep_layer:
+            self.detach_layer()
+        with self.batch():
+            return self.state.apply(state)
+    
+    def closeEvent(self, event):
+        """Suelta la capa (y su parte compartida) al cerrar el overlay"""
+        self.guide_layer.release()
+        super().closeEvent(event)
     
     def enable_click_through(self, enabled):
-        """Habilita/deshabilita clic a través"""
-        self.setAttribute(Qt.WA_TransparentForMouseEvents, enabled)
+        """Habilita/deshabilita clic a través (salvo mientras se dibujan regiones)"""
+        self.click_through = enabled
+        self.setAttribute(Qt.WA_TransparentForMouseEvents,
+                          enabled and not self.region_drawing)
     
-    def show_context_menu(self, position):
-        """Muestra menú contextual"""
-        menu = QMenu(self)
+    def create_context_menu(self):
+        """Crea el menú contextual; sus acciones siguen al estado de las guías"""
+        self.context_menu = QMenu(self)
         
         # Opciones de guías
-        guides_menu = menu.addMenu("Guías")
-        
-        for guide_name, guide_label in [
-            ('rule_of_thirds', 'Regla de Tercios'),
-            ('golden_ratio', 'Proporción Áurea'),
-            ('center_lines', 'Líneas Centrales'),
-            ('diagonals', 'Diagonales'),
-            ('golden_spiral', 'Espiral Áurea'),
-            ('grid_4x4', 'Grid 4×4'),
-            ('grid_5x5', 'Grid 5×5'),
-            ('safe_areas', 'Áreas Seguras')
-        ]:
+        guides_menu = self.context_menu.addMenu("Guías")
+        self.guide_actions = {}
+        for guide_name, _, guide_label, _ in GUIDE_DEFINITIONS:
             action = QAction(guide_label, self)
             action.setCheckable(True)
             action.setChecked(self.guides[guide_name])
-            action.triggered.connect(lambda checked, g=guide_name: self.toggle_guide(g))
+            action.triggered.connect(lambda checked, g=guide_name: self.set_guide(g, checked))
             guides_menu.addAction(action)
-        
-        menu.addSeparator()
+            self.guide_actions[guide_name] = action
+        self.state.subscribe('guides', self.sync_guide_actions)
+        
+        # Encuadre de entrega: cambiar de aspecto durante una revisión
+        letterbox_menu = self.context_menu.addMenu("Encuadre")
+        self.letterbox_actions = []
+        for label, aspect in LETTERBOX_ASPECTS:
+            action = QAction(label, self)
+            action.setCheckable(True)
+            action.triggered.connect(lambda checked, a=aspect: self.set_letterbox(a))
+            letterbox_menu.addAction(action)
+            self.letterbox_actions.append((aspect, action))
+        self.sync_letterbox_actions()
+        self.state.subscribe('letterbox', self.sync_letterbox_actions)
+        
+        # Regiones: la que está bajo el cursor o todas
+        self.remove_region_action = QAction("Borrar región", self)
+        self.remove_region_action.triggered.connect(
+            lambda: self.remove_region(self.context_region))
+        self.context_menu.addAction(self.remove_region_action)
+        self.clear_regions_action = QAction("Borrar todas las regiones", self)
+        self.clear_regions_action.triggered.connect(self.clear_regions)
+        self.context_menu.addAction(self.clear_regions_action)
+        
+        self.context_menu.addSeparator()
         
         # Opción de cerrar
         close_action = QAction("Cerrar Overlay", self)
         close_action.triggered.connect(self.hide)
-        menu.addAction(close_action)
-        
-        menu.exec_(self.mapToGlobal(position))
+        self.context_menu.addAction(close_action)
+    
+    def sync_guide_actions(self, changes):
+        """Marca en el menú solo las guías que cambiaron"""
+        old_guides = changes['guides']
+        for guide_name, enabled in self.guides.items():
+            if old_guides[guide_name] != enabled:
+                self.guide_actions[guide_name].setChecked(enabled)
+    
+    def sync_letterbox_actions(self, changes=None):
+        """Marca en el menú el aspecto del encuadre (ninguno si es personalizado)"""
+        for aspect, action in self.letterbox_actions:
+            action.setChecked(aspect == self.letterbox)
+    
+    def show_context_menu(self, position):
+        """Muestra menú contextual"""
+        self.context_region = region_at(self.state.regions, position)
+        self.remove_region_action.setEnabled(self.context_region is not None)
+        self.clear_regions_action.setEnabled(bool(self.state.regions))
+        self.context_menu.exec_(self.mapToGlobal(position))
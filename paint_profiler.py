@@ -0,0 +1,205 @@
+"""
+Perfilado de pintado del overlay
+
+Mide cada paintEvent y cada draw_* del renderizador, cuenta los repintados
+por segundo y su motivo (el setter que los pidió o 'expose' si los pidió el
+sistema) y mantiene un histograma móvil de tiempos de frame. Los datos se
+dibujan como un HUD en una esquina del overlay y se pueden exportar a JSON.
+
+Se activa con la variable de entorno OVERLAY_PROFILE=1 o desde el panel.
+"""
+import json
+import os
+import time
+from collections import Counter, deque
+
+from PyQt5.QtCore import Qt, QRect, QRectF
+from PyQt5.QtGui import QColor, QFont, QPainter
+
+
+# Límites superiores (ms) de cada barra del histograma
+HISTOGRAM_BUCKETS = [1, 2, 4, 8, 16, 33, 66, float('inf')]
+
+# Frames que se conservan para el histograma móvil
+HISTORY_SIZE = 240
+
+# Tamaño y margen del HUD
+HUD_SIZE = (300, 190)
+HUD_MARGIN = 12
+
+
+def profiling_requested():
+    """Indica si la variable de entorno pide activar el perfilado"""
+    return os.environ.get('OVERLAY_PROFILE', '').lower() in ('1', 'true', 'yes', 'on')
+
+
+class GuideTiming:
+    """Acumulado de tiempos de una guía"""
+    __slots__ = ('count', 'total', 'last', 'worst')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.worst = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        self.worst = max(self.worst, seconds)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': self.total * 1000,
+            'mean_ms': self.total * 1000 / self.count if self.count else 0.0,
+            'last_ms': self.last * 1000,
+            'max_ms': self.worst * 1000,
+        }
+
+
+class PaintProfiler:
+    """Estadísticas de repintado del overlay"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        """Descarta todas las medidas"""
+        self.frames = deque(maxlen=HISTORY_SIZE)
+        self.paint_times = deque()  # Instantes de pintado del último segundo
+        self.triggers = Counter()
+        self.guides = {}
+        self.total_paints = 0
+        self._pending = set()
+        self._frame_start = None
+        self._started = time.time()
+
+    def note_trigger(self, reason):
+        """Registra el motivo del próximo repintado (p. ej. el nombre del setter)"""
+        if self.enabled:
+            self._pending.add(reason)
+
+    def begin_paint(self):
+        if self.enabled:
+            self._frame_start = time.perf_counter()
+
+    def end_paint(self):
+        """Cierra la medida del frame en curso"""
+        if not self.enabled or self._frame_start is None:
+            return
+        now = time.perf_counter()
+        self.frames.append(now - self._frame_start)
+        self._frame_start = None
+        self.total_paints += 1
+
+        # Sin un setter pendiente, el repintado lo pidió el sistema
+        reasons = self._pending or {'expose'}
+        self.triggers.update(reasons)
+        self._pending = set()
+
+        self.paint_times.append(now)
+        while self.paint_times and now - self.paint_times[0] > 1.0:
+            self.paint_times.popleft()
+
+    def time_guide(self, guide_name, seconds):
+        """Registra el tiempo de un draw_* de una guía"""
+        timing = self.guides.get(guide_name)
+        if timing is None:
+            timing = self.guides[guide_name] = GuideTiming()
+        timing.add(seconds)
+
+    def paints_per_second(self):
+        now = time.perf_counter()
+        return sum(1 for t in self.paint_times if now - t <= 1.0)
+
+    def histogram(self):
+        """Cuenta de frames por cubeta de HISTOGRAM_BUCKETS"""
+        counts = [0] * len(HISTOGRAM_BUCKETS)
+        for seconds in self.frames:
+            ms = seconds * 1000
+            for i, limit in enumerate(HISTOGRAM_BUCKETS):
+                if ms <= limit:
+                    counts[i] += 1
+                    break
+        return counts
+
+    def frame_stats(self):
+        """Media, p95 y máximo (ms) del histórico de frames"""
+        if not self.frames:
+            return 0.0, 0.0, 0.0
+        ordered = sorted(self.frames)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return (sum(ordered) * 1000 / len(ordered), p95 * 1000, ordered[-1] * 1000)
+
+    def to_dict(self):
+        mean, p95, worst = self.frame_stats()
+        return {
+            'elapsed_s': time.time() - self._started,
+            'total_paints': self.total_paints,
+            'paints_per_second': self.paints_per_second(),
+            'frame_ms': {'mean': mean, 'p95': p95, 'max': worst},
+            'histogram': {
+                ('<=%g ms' % limit if limit != float('inf') else '>%g ms' % HISTOGRAM_BUCKETS[-2]): count
+                for limit, count in zip(HISTOGRAM_BUCKETS, self.histogram())
+            },
+            'triggers': dict(self.triggers),
+            'guides': {name: timing.to_dict() for name, timing in self.guides.items()},
+        }
+
+    def export_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    # HUD
+
+    def hud_rect(self, width, height):
+        """Rectángulo del HUD (esquina inferior izquierda)"""
+        hud_w, hud_h = HUD_SIZE
+        return QRect(HUD_MARGIN, height - hud_h - HUD_MARGIN, hud_w, hud_h)
+
+    def paint_hud(self, painter, rect):
+        """Dibuja el HUD con los datos actuales"""
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        painter.fillRect(rect, QColor(0, 0, 0, 170))
+        painter.setPen(QColor(255, 255, 255, 230))
+        font = QFont('Consolas')
+        font.setStyleHint(QFont.Monospace)
+        font.setPixelSize(11)
+        painter.setFont(font)
+
+        mean, p95, worst = self.frame_stats()
+        lines = [
+            f"paints/s {self.paints_per_second():3d}   total {self.total_paints}",
+            f"frame ms: media {mean:.2f}  p95 {p95:.2f}  max {worst:.1f}",
+        ]
+        top_triggers = ', '.join(f"{name} {count}" for name, count in self.triggers.most_common(2))
+        lines.append(f"motivo: {top_triggers}")
+        slowest = sorted(self.guides.items(), key=lambda item: item[1].last, reverse=True)[:4]
+        for name, timing in slowest:
+            lines.append(f"  {name:<15} {timing.last * 1000:6.2f} ms  x{timing.count}")
+
+        line_h = 14
+        y = rect.top() + 6
+        for line in lines:
+            painter.drawText(QRectF(rect.left() + 8, y, rect.width() - 16, line_h),
+                             Qt.AlignLeft | Qt.AlignVCenter, line)
+            y += line_h
+
+        # Histograma de tiempos de frame
+        counts = self.histogram()
+        peak = max(counts) or 1
+        bar_area_top = y + 4
+        bar_area_h = rect.bottom() - bar_area_top - 16
+        bar_w = (rect.width() - 16) / len(counts)
+        for i, count in enumerate(counts):
+            bar_h = bar_area_h * count / peak
+            x = rect.left() + 8 + i * bar_w
+            painter.fillRect(QRectF(x + 1, bar_area_top + bar_area_h - bar_h, bar_w - 2, bar_h),
+                             QColor(80, 200, 120) if i < 4 else QColor(230, 90, 70))
+            label = '∞' if HISTOGRAM_BUCKETS[i] == float('inf') else '%g' % HISTOGRAM_BUCKETS[i]
+            painter.drawText(QRectF(x, rect.bottom() - 14, bar_w, 12), Qt.AlignCenter, label)
+        painter.restore()
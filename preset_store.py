@@ -0,0 +1,220 @@
+"""
+Biblioteca de presets con nombre
+
+Cada preset guardado vive en su propio archivo JSON dentro del directorio de
+presets, y un índice (index.json) guarda los nombres, el archivo de cada uno
+y el último usado, así que listar los presets no lee ningún cuerpo. Todas las
+escrituras son atómicas: se escribe un archivo temporal en el mismo
+directorio y se sustituye con os.replace, de modo que un cierre a mitad de
+escritura nunca deja un preset o el índice a medias.
+
+Los presets predefinidos forman parte de la biblioteca pero no se escriben
+en disco. El antiguo presets.json (un único preset) se importa la primera
+vez que se abre la biblioteca.
+
+read_index y read_preset leen del disco sin tocar la caché, así que la
+recarga en caliente (ver preset_watcher) puede usarlas desde otro hilo y
+adoptar después el índice leído con adopt_index.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+from overlay_state import GUIDE_NAMES
+
+
+# Versión del formato del índice
+INDEX_VERSION = 1
+
+# Presets predefinidos: nombre -> guías activas (None = todas)
+BUILTIN_PRESETS = {
+    "Fotografía - Tercios": ['rule_of_thirds'],
+    "Fotografía - Áureo": ['golden_ratio', 'golden_spiral'],
+    "Video - Safe Areas": ['safe_areas', 'center_lines'],
+    "Diseño - Grid 4x4": ['grid_4x4'],
+    "Diseño - Grid 5x5": ['grid_5x5'],
+    "Completo - Todo visible": None,
+    "Personalizado": [],
+}
+
+# Nombre con que se importa el antiguo presets.json
+LEGACY_PRESET_NAME = "Guardado"
+
+
+def builtin_config(name):
+    """Configuración de un preset predefinido (solo guías)"""
+    guides = BUILTIN_PRESETS[name]
+    return {'guides': {guide: guides is None or guide in guides
+                       for guide in GUIDE_NAMES}}
+
+
+def empty_index():
+    return {'version': INDEX_VERSION, 'last_used': None, 'presets': {}}
+
+
+def write_json_atomic(path, data):
+    """Escribe JSON en path sin dejar nunca un archivo a medias"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class PresetStore:
+    """Presets con nombre guardados en un directorio con índice"""
+
+    def __init__(self, directory="presets", legacy_file="presets.json"):
+        self.directory = directory
+        self.legacy_file = legacy_file
+        self.index_path = os.path.join(directory, "index.json")
+        self._index = None
+        # Aumenta con cada escritura propia del índice: un índice leído antes
+        # de una escritura ya no vale
+        self.revision = 0
+
+    # Índice
+
+    def read_index(self):
+        """Lee el índice del disco sin usar ni modificar la caché
+
+        Sin índice devuelve la biblioteca vacía; lanza OSError o ValueError
+        si no se puede leer.
+        """
+        index = empty_index()
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                loaded = json.load(f)
+            if not isinstance(loaded, dict):
+                raise ValueError("El índice de presets no es un objeto JSON")
+            index['last_used'] = loaded.get('last_used')
+            index['presets'] = dict(loaded.get('presets', {}))
+        return index
+
+    def _load_index(self):
+        if self._index is not None:
+            return self._index
+        try:
+            self._index = self.read_index()
+        except (OSError, ValueError):
+            self._index = empty_index()  # Índice ilegible: se empieza con la biblioteca vacía
+        return self._index
+
+    def adopt_index(self, index):
+        """Sustituye la caché por un índice leído con read_index (recarga en caliente)"""
+        self._index = index
+
+    def _write_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.revision += 1
+        write_json_atomic(self.index_path, self._load_index())
+
+    def _file_name(self, name):
+        """Archivo de un preset: nombre legible más un hash que lo hace único"""
+        slug = re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')[:40] or 'preset'
+        digest = hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]
+        return f"{slug}-{digest}.json"
+
+    # Consulta
+
+    def names(self):
+        """Predefinidos primero y después los guardados (sin leer sus archivos)"""
+        return list(BUILTIN_PRESETS) + sorted(self._load_index()['presets'],
+                                              key=str.lower)
+
+    def is_builtin(self, name):
+        return name in BUILTIN_PRESETS
+
+    def __contains__(self, name):
+        return self.is_builtin(name) or name in self._load_index()['presets']
+
+    def load(self, name):
+        """Configuración de un preset; KeyError si no existe"""
+        if self.is_builtin(name):
+            return builtin_config(name)
+        return self.read_preset(name)
+
+    def read_preset(self, name, index=None):
+        """Lee del disco un preset guardado, sin validarlo
+
+        Con index (de read_index) no se usa la caché. Lanza KeyError si no
+        está en el índice y OSError o ValueError si no se puede leer.
+        """
+        with open(self.preset_path(name, index), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        if not isinstance(config, dict):
+            raise ValueError(f"El preset '{name}' no es un objeto JSON")
+        return config
+
+    def preset_path(self, name, index=None):
+        """Archivo de un preset guardado; KeyError si no está en el índice"""
+        entry = (self._load_index() if index is None else index)['presets'][name]
+        return os.path.join(self.directory, entry['file'])
+
+    @property
+    def last_used(self):
+        name = self._load_index()['last_used']
+        return name if name in self else None
+
+    # Modificación
+
+    def save(self, name, config):
+        """Guarda (o sobrescribe) un preset con nombre"""
+        if self.is_builtin(name):
+            raise ValueError(f"'{name}' es un preset predefinido")
+        index = self._load_index()
+        entry = index['presets'].get(name) or {'file': self._file_name(name)}
+        os.makedirs(self.directory, exist_ok=True)
+        write_json_atomic(os.path.join(self.directory, entry['file']), config)
+        entry['modified'] = time.time()
+        index['presets'][name] = entry
+        index['last_used'] = name
+        self._write_index()
+
+    def delete(self, name):
+        """Borra un preset guardado"""
+        if self.is_builtin(name):
+            raise ValueError(f"'{name}' es un preset predefinido")
+        index = self._load_index()
+        entry = index['presets'].pop(name)
+        if index['last_used'] == name:
+            index['last_used'] = None
+        self._write_index()
+        try:
+            os.unlink(os.path.join(self.directory, entry['file']))
+        except OSError:
+            pass
+
+    def mark_used(self, name):
+        """Recuerda el último preset aplicado (se restaura al arrancar)"""
+        index = self._load_index()
+        if index['last_used'] != name and name in self:
+            index['last_used'] = name
+            self._write_index()
+
+    def import_legacy(self):
+        """Importa el antiguo presets.json si la biblioteca aún no existe
+
+        Devuelve el nombre con que se importó o None.
+        """
+        if os.path.exists(self.index_path) or not os.path.exists(self.legacy_file):
+            return None
+        try:
+            with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self.save(LEGACY_PRESET_NAME, config)
+        return LEGACY_PRESET_NAME
@@ -0,0 +1,194 @@
+"""
+Recarga en caliente de la biblioteca de presets
+
+Las herramientas del pipeline reescriben presets durante la sesión.
+PresetWatcher vigila con QFileSystemWatcher el directorio de presets, su
+índice y el archivo del preset seleccionado. Los avisos se agrupan: la
+recarga empieza RELOAD_DELAY_MS después del último, así que una herramienta
+que escribe un archivo en varios pasos provoca una sola recarga.
+
+El índice y el preset se leen y validan en un hilo propio. En el hilo de la
+interfaz solo se adopta el índice leído y, si el archivo del preset
+seleccionado cambió (ruta, fecha de modificación o tamaño), se avisa con
+preset_reloaded. Otros cambios del directorio, como el índice al marcar el
+último usado u otro preset guardado, no vuelven a aplicar el preset encima
+de lo que el usuario haya cambiado a mano.
+
+El panel aplica el preset recargado con apply_state: como cualquier cambio
+de estado, solo se re-rasteriza y repinta lo que difiere de lo que está en
+pantalla. Un archivo a medio escribir o no válido se ignora (failed) y se
+conserva lo anterior hasta la siguiente escritura.
+"""
+import os
+
+from PyQt5.QtCore import QFileSystemWatcher, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+from overlay_state import OverlayState
+
+
+# Espera (ms) desde el último aviso del sistema de archivos hasta recargar
+RELOAD_DELAY_MS = 250
+
+
+def file_signature(path):
+    """(ruta, fecha de modificación en ns, tamaño) de un archivo, o None si no existe"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+class ReloadSignals(QObject):
+    # (tarea, índice leído, firma del archivo del preset, configuración o None,
+    # error del preset o "")
+    finished = pyqtSignal(object, object, object, object, str)
+    # (tarea, mensaje) si no se pudo leer el índice
+    failed = pyqtSignal(object, str)
+
+
+class ReloadTask(QRunnable):
+    """Lee el índice y el preset seleccionado y valida el preset, en un hilo del pool"""
+
+    def __init__(self, store, name, revision, generation):
+        super().__init__()
+        self.store = store
+        self.name = name
+        self.revision = revision
+        self.generation = generation
+        self.signals = ReloadSignals()
+
+    def run(self):
+        try:
+            index = self.store.read_index()
+        except (OSError, ValueError) as e:
+            self.signals.failed.emit(self, str(e))
+            return
+        # Un preset roto no impide adoptar el índice (otros presets nuevos)
+        signature, config, error = None, None, ""
+        if self.name in index['presets']:
+            try:
+                # La firma antes de leer: una escritura durante la lectura
+                # deja una firma distinta y provoca otra recarga
+                signature = file_signature(self.store.preset_path(self.name, index))
+                config = self.store.read_preset(self.name, index)
+                # Contra un estado nuevo: solo se comprueba que sea válido
+                OverlayState().validate(config)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                config, error = None, str(e)
+        self.signals.finished.emit(self, index, signature, config, error)
+
+
+class PresetWatcher(QObject):
+    # La lista de presets cambió (añadidos, borrados o renombrados)
+    index_changed = pyqtSignal()
+    # (nombre, configuración ya validada) del preset seleccionado al cambiar su archivo
+    preset_reloaded = pyqtSignal(str, object)
+    # Mensaje si el índice o el preset no se pudieron leer o no son válidos
+    failed = pyqtSignal(str)
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.name = None  # Preset seleccionado (el único que se recarga)
+        self.config = None  # Su última configuración aplicada
+        self.signature = None  # Firma de su archivo cuando se aplicó
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.schedule)
+        self.watcher.fileChanged.connect(self.schedule)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(RELOAD_DELAY_MS)
+        self.timer.timeout.connect(self.reload)
+
+        # Un solo hilo: las recargas no se adelantan unas a otras
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.tasks = set()  # ReloadTask en curso (mantiene vivas sus señales)
+        self.generation = 0
+        self.arm()
+
+    def watch(self, name, config=None):
+        """Sigue el archivo del preset seleccionado en el panel
+
+        config es la configuración que se acaba de aplicar; el archivo tal
+        como está ahora es el de partida, así que solo se recarga cuando cambie.
+        """
+        if name == self.name and config is None:
+            return
+        self.name = name
+        self.config = config
+        self.signature = None
+        if name is not None and not self.store.is_builtin(name):
+            try:
+                self.signature = file_signature(self.store.preset_path(name))
+            except KeyError:
+                pass
+        self.arm()
+
+    def arm(self):
+        """Vigila el directorio, el índice y el archivo del preset seleccionado
+
+        Al sustituir un archivo (escritura atómica) el watcher deja de
+        vigilarlo, así que se vuelve a añadir tras cada aviso.
+        """
+        paths = [self.store.directory, self.store.index_path]
+        if self.name is not None and not self.store.is_builtin(self.name):
+            try:
+                paths.append(self.store.preset_path(self.name))
+            except KeyError:
+                pass
+        watched = set(self.watcher.files() + self.watcher.directories())
+        missing = [path for path in paths if path not in watched and os.path.exists(path)]
+        if missing:
+            self.watcher.addPaths(missing)
+
+    def schedule(self, path=None):
+        """Un aviso del sistema de archivos: recarga cuando dejen de llegar"""
+        # Lo que ya se esté leyendo puede ser anterior a este cambio
+        self.generation += 1
+        self.timer.start()
+
+    def reload(self):
+        """Lee el índice y el preset seleccionado en el pool"""
+        self.arm()
+        task = ReloadTask(self.store, self.name, self.store.revision, self.generation)
+        task.setAutoDelete(False)
+        task.signals.finished.connect(self.task_finished)
+        task.signals.failed.connect(self.task_failed)
+        self.tasks.add(task)
+        self.pool.start(task)
+
+    def task_finished(self, task, index, signature, config, error):
+        self.tasks.discard(task)
+        if task.generation != self.generation or task.name != self.name:
+            return  # Hubo otro aviso o cambió el preset seleccionado mientras tanto
+        if task.revision != self.store.revision:
+            # El índice se escribió desde aquí mientras se leía: leer de nuevo
+            self.schedule()
+            return
+        names = self.store.names()
+        self.store.adopt_index(index)
+        self.arm()
+        if self.store.names() != names:
+            self.index_changed.emit()
+        if signature is None or signature == self.signature:
+            return  # El archivo del preset seleccionado no cambió
+        self.signature = signature
+        if error:
+            self.failed.emit(error)
+        elif config is not None and config != self.config:
+            self.config = config
+            self.preset_reloaded.emit(task.name, config)
+
+    def task_failed(self, task, message):
+        self.tasks.discard(task)
+        if task.generation == self.generation:
+            self.failed.emit(message)
+
+    def close(self):
+        """Deja de vigilar y espera a la lectura en curso"""
+        self.timer.stop()
+        self.generation += 1
+        self.pool.waitForDone()
@@ -0,0 +1,55 @@
+"""
+Medición del arranque (--profile-startup)
+
+Anota el instante en que termina cada fase del arranque, contado desde que
+se cargó main.py, y al final escribe en stderr la duración de cada fase y si
+el primer frame del overlay llegó dentro del presupuesto.
+"""
+import sys
+import time
+
+
+# Presupuesto (ms) desde el lanzamiento hasta el primer frame del overlay
+FIRST_FRAME_BUDGET_MS = 300
+
+# Fase que se compara con el presupuesto
+FIRST_FRAME_PHASE = "primer frame"
+
+
+class StartupProfile:
+    """Marcas de tiempo de las fases del arranque"""
+
+    def __init__(self, enabled=False, start=None):
+        self.enabled = enabled
+        self.start = time.perf_counter() if start is None else start
+        self.phases = []  # (nombre, instante en s)
+
+    def mark(self, name):
+        """Cierra una fase: el tiempo desde la marca anterior es suyo"""
+        if self.enabled:
+            self.phases.append((name, time.perf_counter()))
+
+    def elapsed_ms(self, name):
+        """Tiempo desde el inicio hasta el final de una fase, o None"""
+        for phase, instant in self.phases:
+            if phase == name:
+                return (instant - self.start) * 1000
+        return None
+
+    def report(self, stream=None):
+        """Escribe la tabla de fases (una sola vez)"""
+        if not self.enabled or not self.phases:
+            return
+        stream = stream or sys.stderr
+        print("Arranque (ms)          fase    acumulado", file=stream)
+        previous = self.start
+        for name, instant in self.phases:
+            print(f"  {name:<18} {(instant - previous) * 1000:8.1f} "
+                  f"{(instant - self.start) * 1000:12.1f}", file=stream)
+            previous = instant
+        first_frame = self.elapsed_ms(FIRST_FRAME_PHASE)
+        if first_frame is not None:
+            verdict = "dentro" if first_frame <= FIRST_FRAME_BUDGET_MS else "FUERA"
+            print(f"  Primer frame en {first_frame:.1f} ms: {verdict} del presupuesto "
+                  f"de {FIRST_FRAME_BUDGET_MS} ms", file=stream)
+        self.enabled = False